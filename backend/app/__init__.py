@@ -6,6 +6,10 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # orjson-backed JSON encoding (datetime, ObjectId and bytes built in)
+    from .json_provider import init_json
+    init_json(app)
+    
     # Enable CORS
     CORS(app, origins=["http://localhost:3000"])
     
@@ -15,4 +19,29 @@ def create_app(config_class=Config):
     chat.init_routes(app)
     user.init_routes(app)
     
-    return app 
\ No newline at end of file
+    # gzip/brotli for JSON bodies above COMPRESSION_MIN_SIZE (not SSE streams)
+    from .compression import init_compression
+    init_compression(app)
+    
+    # 503/504 responses for shed, timed-out and degraded-dependency requests
+    from .errors import init_error_handlers
+    init_error_handlers(app)
+    
+    # Register CLI commands (flask ensure-indexes, flask check-query-plans)
+    from .cli import init_cli
+    init_cli(app)
+    
+    # Optional startup check that every query is served by an index; here so
+    # every entrypoint (run.py, wsgi.py, asgi.py) runs it
+    if app.config.get('MONGODB_VERIFY_QUERY_PLANS'):
+        from .services.database_service import db_service
+        problems = db_service.verify_query_plans()
+        if problems:
+            raise SystemExit(f"Query plans without index support: {problems}")
+    
+    return app
+
+def create_asgi_app(config_class=Config):
+    """Create the async (ASGI) app; see app/asgi.py"""
+    from .asgi import create_asgi_app as _create_asgi_app
+    return _create_asgi_app(config_class)
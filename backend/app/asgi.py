@@ -0,0 +1,62 @@
+from quart import Quart
+from quart_cors import cors
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from .config import Config
+
+def create_async_app(config_class=Config):
+    """Create the Quart app serving the async chat routes"""
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+
+    from .json_provider import init_json
+    init_json(app)
+
+    # Enable CORS
+    app = cors(app, allow_origin="http://localhost:3000")
+
+    from .routes import async_chat
+    async_chat.init_routes(app)
+
+    from .errors import init_error_handlers
+    init_error_handlers(app)
+
+    from .services.async_database_service import async_db_service
+
+    @app.after_serving
+    async def close_database():
+        async_db_service.disconnect()
+
+    return app
+
+class AsyncRouteDispatcher:
+    """ASGI app that sends requests to the async app when it has a matching
+    route and falls back to the WSGI (Flask) app, run in a thread pool,
+    for everything else.
+    """
+
+    def __init__(self, async_app, wsgi_app):
+        self.async_app = async_app
+        self.wsgi_app = WsgiToAsgi(wsgi_app)
+        self.url_adapter = async_app.url_map.bind('')
+
+    def handles(self, scope) -> bool:
+        """Check whether the async app has a route for this request"""
+        if scope['type'] != 'http':
+            return scope['type'] in ('lifespan', 'websocket')
+        try:
+            self.url_adapter.match(scope['path'], method=scope['method'])
+            return True
+        except HTTPException:
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if self.handles(scope):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+def create_asgi_app(config_class=Config):
+    """Create the ASGI entrypoint: async chat routes plus the WSGI app"""
+    from . import create_app
+    return AsyncRouteDispatcher(create_async_app(config_class), create_app(config_class))
@@ -0,0 +1,19 @@
+import click
+from .services.database_service import db_service
+
+def init_cli(app):
+    @app.cli.command('ensure-indexes')
+    def ensure_indexes():
+        """Create the MongoDB indexes used by the API"""
+        for name in db_service.ensure_indexes():
+            click.echo(f"ok  {name}")
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if any API query plan uses a COLLSCAN or in-memory SORT"""
+        problems = db_service.verify_query_plans()
+        if problems:
+            for name, stages in problems.items():
+                click.echo(f"FAIL  {name}: {', '.join(stages)}", err=True)
+            raise SystemExit(1)
+        click.echo("All query plans are index-backed")
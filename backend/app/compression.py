@@ -0,0 +1,78 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+def choose_encoding() -> Optional[str]:
+    """Best encoding the client accepts: br (if available), then gzip"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return None
+
+def compress_bytes(data: bytes, encoding: str, config) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESSION_GZIP_LEVEL'])
+
+def compress_stream(chunks: Iterable[bytes], encoding: str, config) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESSION_BROTLI_QUALITY'])
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        # wbits=31: gzip container
+        compressor = zlib.compressobj(config['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+def compress_response(response, config):
+    """Compress a JSON response body if the client accepts it and it is worth it
+
+    Server-Sent Events (and anything already encoded) pass through
+    untouched; streamed JSON is compressed incrementally.
+    """
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers or response.direct_passthrough):
+        return response
+
+    # The body depends on Accept-Encoding whether or not this one is compressed
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, config)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        response.set_data(compress_bytes(data, encoding, config))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """Compress JSON responses above COMPRESSION_MIN_SIZE bytes (brotli when accepted, else gzip)"""
+    @app.after_request
+    def compress(response):
+        return compress_response(response, app.config)
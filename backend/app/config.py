@@ -16,6 +16,22 @@ class Config:
     
     # MongoDB configuration
     MONGODB_URI = os.getenv("MONGODB_URI")
+    # Refuse to start if a query plan needs a collection scan or in-memory sort
+    MONGODB_VERIFY_QUERY_PLANS = os.getenv("MONGODB_VERIFY_QUERY_PLANS", "false").lower() == "true"
+    # Where new conversations keep their messages: "embedded" (an array in the
+    # conversation) or "buckets" (fixed-size documents in message_buckets)
+    MESSAGE_STORAGE_MODE = os.getenv("MESSAGE_STORAGE_MODE", "embedded")
+    MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "100"))
     
     # Gemini API configuration
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") 
\ No newline at end of file
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    
+    # JSON encoding: "fast" (orjson, stdlib fallback) or "default" (framework provider)
+    JSON_PROVIDER = os.getenv("JSON_PROVIDER", "fast")
+    # Conversations with at least this many messages are streamed while encoded
+    JSON_STREAM_MIN_MESSAGES = int(os.getenv("JSON_STREAM_MIN_MESSAGES", "200"))
+    
+    # JSON response compression (brotli when the package is installed, else gzip)
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")) 
\ No newline at end of file
@@ -0,0 +1,37 @@
+import math
+from .services.circuit_breaker import ServiceUnavailableError
+from .services.deadline import DeadlineExceeded
+from .services.llm_dispatcher import LLMOverloadedError, public_error
+
+# Client-facing names of the dependencies behind a circuit breaker
+SERVICE_LABELS = {
+    'mongodb': 'The database',
+    'gemini': 'The AI service',
+}
+
+def retry_after_header(seconds: float):
+    return {'Retry-After': str(max(1, math.ceil(seconds)))}
+
+def llm_overloaded(error: LLMOverloadedError):
+    """503 for a shed LLM call (full queue, provider quota)"""
+    return {'success': False, 'error': public_error(error)}, 503, retry_after_header(error.retry_after)
+
+def deadline_exceeded(error: DeadlineExceeded):
+    """504 for a request that ran out of time"""
+    return {'success': False, 'error': public_error(error)}, 504
+
+def service_unavailable(error: ServiceUnavailableError):
+    """Explicit degraded response while a dependency is down or its circuit is open"""
+    label = SERVICE_LABELS.get(error.service, error.service)
+    return {
+        'success': False,
+        'error': f"{label} is temporarily unavailable. Please try again shortly.",
+        'degraded': True,
+        'service': error.service
+    }, 503, retry_after_header(error.retry_after)
+
+def init_error_handlers(app):
+    """Register the handlers on a Flask or Quart app (both accept dict bodies)"""
+    app.register_error_handler(LLMOverloadedError, llm_overloaded)
+    app.register_error_handler(DeadlineExceeded, deadline_exceeded)
+    app.register_error_handler(ServiceUnavailableError, service_unavailable)
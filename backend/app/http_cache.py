@@ -0,0 +1,39 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+from flask import current_app, request
+
+# Authenticated resources: browsers may keep a copy but must revalidate it
+CACHE_CONTROL = "private, no-cache"
+
+def resource_etag(*parts: Any) -> str:
+    """Opaque tag for a representation, from the values it is built from"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def http_date_value(value: Optional[datetime]) -> Optional[datetime]:
+    """A stored (naive UTC) datetime at HTTP-date precision"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+def is_not_modified(etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Check If-None-Match (or, without it, If-Modified-Since) against the current validators"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return http_date_value(last_modified) <= request.if_modified_since
+    return False
+
+def set_validators(response, etag: str, last_modified: Optional[datetime] = None):
+    """Attach ETag / Last-Modified; the tag is weak so it stays valid for compressed bodies"""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = http_date_value(last_modified)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None):
+    """A 304 response if the client's copy is current, else None"""
+    if not is_not_modified(etag, last_modified):
+        return None
+    return set_validators(current_app.response_class(status=304), etag, last_modified)
@@ -0,0 +1,135 @@
+import base64
+import dataclasses
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from types import GeneratorType
+from typing import Any, Iterator, Union
+from uuid import UUID
+from bson import ObjectId
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib encoder
+    orjson = None
+
+# Size of the chunks yielded by iter_encode
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def default(o: Any) -> Any:
+    """Encode the non-JSON types found in our documents
+
+    Datetimes become ISO 8601 strings (what the routes used to build by
+    hand with .isoformat()), ObjectIds their hex string and bytes base64.
+    """
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (bytes, bytearray, memoryview)):
+        return base64.b64encode(o).decode('ascii')
+    if isinstance(o, (UUID, Decimal)):
+        return str(o)
+    if isinstance(o, GeneratorType):
+        return list(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Encode obj to UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=default, option=option)
+    if indent:
+        return json.dumps(obj, default=default, ensure_ascii=False, indent=2).encode()
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode()
+
+def dumps(obj: Any) -> str:
+    return dumps_bytes(obj).decode()
+
+def _iter_parts(obj: Any) -> Iterator[bytes]:
+    """Encode dicts key by key and sequences item by item
+
+    Items of a list or generator are encoded whole, so a payload like
+    {"conversation": {"messages": <generator>}} costs one encoder call per
+    message and never holds the full document in memory.
+    """
+    if isinstance(obj, dict):
+        yield b'{'
+        for i, (key, value) in enumerate(obj.items()):
+            if i:
+                yield b','
+            yield dumps_bytes(str(key))
+            yield b':'
+            yield from _iter_parts(value)
+        yield b'}'
+    elif isinstance(obj, (list, tuple, GeneratorType)):
+        yield b'['
+        for i, item in enumerate(obj):
+            if i:
+                yield b','
+            yield dumps_bytes(item)
+        yield b']'
+    else:
+        yield dumps_bytes(obj)
+
+def iter_encode(obj: Any, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode obj incrementally, yielding chunks of about chunk_size bytes"""
+    buffer = bytearray()
+    for part in _iter_parts(obj):
+        buffer += part
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b'\n'
+    yield bytes(buffer)
+
+def streaming_response(obj: Any):
+    """JSON response encoded while it is sent; for large payloads like full conversations"""
+    return current_app.response_class(iter_encode(obj), mimetype='application/json')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider using orjson (stdlib json if it is not installed)
+
+    Keys keep their insertion order instead of being sorted, and responses
+    are encoded straight to bytes.
+    """
+
+    sort_keys = False
+    default = staticmethod(default)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            # Explicit encoder options are only supported by the stdlib path
+            return super().dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+# Providers selectable with the JSON_PROVIDER setting; None keeps the framework's own
+JSON_PROVIDERS = {
+    'fast': FastJSONProvider,
+    'default': None,
+}
+
+def init_json(app):
+    """Install the JSON provider named by app.config['JSON_PROVIDER'] (Flask or Quart app)"""
+    name = app.config.get('JSON_PROVIDER', 'fast')
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER '{name}' (expected one of: {', '.join(JSON_PROVIDERS)})")
+    provider_class = JSON_PROVIDERS[name]
+    if provider_class is not None:
+        app.json = provider_class(app)
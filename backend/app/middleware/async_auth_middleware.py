@@ -0,0 +1,35 @@
+from functools import wraps
+from quart import request, g, current_app
+from .auth_middleware import verify_jwt_token
+
+def require_auth_async(f):
+    """Decorator to require JWT authentication on async (Quart) routes"""
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+
+        if not auth_header:
+            return {"error": "No authorization header"}, 401
+
+        try:
+            # Extract token from "Bearer <token>"
+            parts = auth_header.split()
+            if parts[0].lower() != 'bearer' or len(parts) != 2:
+                return {"error": "Invalid authorization header format"}, 401
+
+            token = parts[1]
+            payload, error = verify_jwt_token(token, current_app.config)
+
+            if error:
+                return {"error": error}, 401
+
+            # Add user info to Quart g object
+            g.user = payload
+
+        except Exception as e:
+            return {"error": f"Authentication error: {str(e)}"}, 401
+
+        # Outside the try: errors raised by the view are not auth failures
+        return await f(*args, **kwargs)
+
+    return decorated
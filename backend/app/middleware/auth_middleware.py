@@ -1,45 +1,42 @@
 import jwt
-import requests
+import hashlib
+import os
+import time
 from functools import wraps
 from flask import request, jsonify, g, current_app
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
-import base64
-import json
+from .jwks_store import jwks_store
+from ..services.ttl_cache import TTLCache
 
-# Cache for Auth0 public keys
-AUTH0_PUBLIC_KEYS = None
+# Verified payloads keyed by token digest, kept until the token's exp
+token_cache = TTLCache(maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")))
 
-def get_auth0_public_keys():
-    """Fetch Auth0 public keys for JWT verification"""
-    global AUTH0_PUBLIC_KEYS
-    if AUTH0_PUBLIC_KEYS is None:
-        try:
-            auth0_domain = current_app.config['AUTH0_DOMAIN']
-            jwks_url = f"https://{auth0_domain}/.well-known/jwks.json"
-            response = requests.get(jwks_url)
-            response.raise_for_status()
-            jwks = response.json()
-            AUTH0_PUBLIC_KEYS = {key['kid']: key for key in jwks['keys']}
-        except Exception as e:
-            print(f"Error fetching Auth0 public keys: {e}")
-            AUTH0_PUBLIC_KEYS = {}
-    return AUTH0_PUBLIC_KEYS
+def token_digest(token: str) -> str:
+    """Cache key for a bearer token (the raw token is never stored)"""
+    return hashlib.sha256(token.encode()).hexdigest()
 
-def is_encrypted_jwt(token):
-    """Check if token is an encrypted JWT (JWE)"""
-    try:
-        # Decode header without verification
-        unverified_header = jwt.get_unverified_header(token)
-        return unverified_header.get('enc') is not None
-    except:
-        return False
+def cache_verified_payload(token: str, payload: dict):
+    """Remember a signature-verified payload until the token expires"""
+    exp = payload.get('exp')
+    if isinstance(exp, (int, float)):
+        token_cache.set(token_digest(token), payload, ttl=exp - time.time())
 
-def verify_jwt_token(token):
-    """Verify JWT token from Auth0 (ID token or access token)"""
+def verify_jwt_token(token, config=None):
+    """Verify JWT token from Auth0 (ID token or access token)
+    
+    config defaults to the Flask app config; the ASGI app passes its own.
+    """
+    cached_payload = token_cache.get(token_digest(token))
+    if cached_payload is not None:
+        return cached_payload, None
+    
     try:
+        config = config or current_app.config
+        
+        # Decode token header once (key ID and encryption flag)
+        unverified_header = jwt.get_unverified_header(token)
+        
         # Check if it's an encrypted JWT
-        if is_encrypted_jwt(token):
+        if unverified_header.get('enc') is not None:
             # For encrypted tokens, we'll skip verification for now
             # In production, you'd need to decrypt them properly
             try:
@@ -52,14 +49,12 @@ def verify_jwt_token(token):
             except Exception as e:
                 return None, f"Failed to decode encrypted token: {str(e)}"
         
-        # Decode token header to get key ID
-        unverified_header = jwt.get_unverified_header(token)
         kid = unverified_header.get('kid')
         
         if not kid:
             # Try to decode without key ID (for some access tokens)
             try:
-                auth0_domain = current_app.config['AUTH0_DOMAIN']
+                auth0_domain = config['AUTH0_DOMAIN']
                 # Try with a default public key or skip verification
                 payload = jwt.decode(
                     token,
@@ -70,58 +65,36 @@ def verify_jwt_token(token):
             except Exception as e:
                 return None, f"Failed to decode token without key ID: {str(e)}"
         
-        # Get public keys
-        public_keys = get_auth0_public_keys()
-        if kid not in public_keys:
+        # Get the ready-to-use public key for this kid
+        public_key = jwks_store.get_key(kid, config['AUTH0_DOMAIN'])
+        if public_key is None:
             return None, "Key ID not found"
         
-        # Get the public key
-        public_key = public_keys[kid]
-        
-        # Convert JWK to PEM format
-        def base64url_decode(input_str):
-            # Add padding if necessary
-            rem = len(input_str) % 4
-            if rem > 0:
-                input_str += '=' * (4 - rem)
-            return base64.urlsafe_b64decode(input_str)
-
-        # Extract key components
-        n = int.from_bytes(base64url_decode(public_key['n']), 'big')
-        e = int.from_bytes(base64url_decode(public_key['e']), 'big')
-
-        # Create RSA public key
-        rsa_public_key = rsa.RSAPublicNumbers(e, n).public_key()
-        
-        # Serialize to PEM
-        pem = rsa_public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-        
         # Verify and decode token
-        auth0_domain = current_app.config['AUTH0_DOMAIN']
-        client_id = current_app.config['AUTH0_CLIENT_ID']
+        auth0_domain = config['AUTH0_DOMAIN']
+        client_id = config['AUTH0_CLIENT_ID']
         
         # Try to decode as ID token first (with client ID as audience) - this is most common
         try:
             payload = jwt.decode(
                 token,
-                pem,
+                public_key,
                 algorithms=['RS256'],
                 audience=client_id,
                 issuer=f"https://{auth0_domain}/"
             )
+            cache_verified_payload(token, payload)
             return payload, None
         except jwt.InvalidAudienceError:
             # If that fails, try without audience validation (for some tokens)
             try:
                 payload = jwt.decode(
                     token,
-                    pem,
+                    public_key,
                     algorithms=['RS256'],
                     issuer=f"https://{auth0_domain}/"
                 )
+                cache_verified_payload(token, payload)
                 return payload, None
             except Exception as e:
                 return None, f"Token verification failed: {str(e)}"
@@ -157,9 +130,11 @@ def require_auth(f):
             
             # Add user info to Flask g object
             g.user = payload
-            return f(*args, **kwargs)
             
         except Exception as e:
             return {"error": f"Authentication error: {str(e)}"}, 401
+        
+        # Outside the try: errors raised by the view are not auth failures
+        return f(*args, **kwargs)
     
     return decorated 
\ No newline at end of file
@@ -0,0 +1,29 @@
+import asyncio
+from functools import wraps
+from ..services.deadline import DeadlineExceeded, deadline_scope, route_deadline
+
+def with_deadline(name: str = 'default'):
+    """Decorator giving a route a time budget (see ROUTE_DEADLINES)
+
+    Downstream Gemini and Mongo calls get the remaining budget as their
+    timeout and are not started once it is spent. Async (Quart) views are
+    cancelled outright when the deadline passes.
+    """
+    def decorator(f):
+        if asyncio.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_decorated(*args, **kwargs):
+                seconds = route_deadline(name)
+                with deadline_scope(seconds):
+                    try:
+                        return await asyncio.wait_for(f(*args, **kwargs), seconds)
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded("Request deadline exceeded")
+            return async_decorated
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with deadline_scope(route_deadline(name)):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
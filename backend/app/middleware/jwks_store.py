@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from jwt.algorithms import RSAAlgorithm
+
+class JWKSKeyStore:
+    """Cache of Auth0 signing keys as ready-to-use public key objects
+
+    Keys are parsed from the JWKS once per fetch and kept per `kid`. The set
+    is refreshed when older than `ttl` seconds, or when a token names an
+    unknown `kid` (at most once per `miss_refresh_interval` seconds, so
+    forged kids cannot hammer Auth0). A failed fetch keeps the previous keys
+    instead of caching an empty set.
+    """
+
+    def __init__(self, ttl: float = 3600, miss_refresh_interval: float = 60, timeout: float = 5):
+        self.ttl = ttl
+        self.miss_refresh_interval = miss_refresh_interval
+        self.timeout = timeout
+        self._keys: Dict[str, Any] = {}
+        self._jwks_url: Optional[str] = None
+        self._fetched_at = float("-inf")
+        self._last_attempt = float("-inf")
+        self._lock = threading.Lock()
+
+    def get_key(self, kid: str, auth0_domain: str) -> Optional[Any]:
+        """Get the public key for a token's kid, refreshing the JWKS if needed"""
+        jwks_url = f"https://{auth0_domain}/.well-known/jwks.json"
+        now = time.monotonic()
+
+        # With no usable keys every login fails, so retry sooner
+        min_interval = self.miss_refresh_interval if self._keys else min(5.0, self.miss_refresh_interval)
+        if jwks_url != self._jwks_url or now - self._fetched_at >= self.ttl or kid not in self._keys:
+            self._refresh(jwks_url, min_interval)
+
+        return self._keys.get(kid)
+
+    def _refresh(self, jwks_url: str, min_interval: float):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_attempt < min_interval:
+                return
+            self._last_attempt = now
+            try:
+                response = requests.get(jwks_url, timeout=self.timeout)
+                response.raise_for_status()
+                jwks = response.json()
+                keys = {
+                    key['kid']: RSAAlgorithm.from_jwk(json.dumps(key))
+                    for key in jwks['keys']
+                    if key.get('kty') == 'RSA' and 'kid' in key
+                }
+            except Exception as e:
+                print(f"Error fetching Auth0 public keys: {e}")
+                return
+            self._keys = keys
+            self._jwks_url = jwks_url
+            self._fetched_at = now
+
+    def reset_after_fork(self):
+        """Take a fresh lock in a forked child; parsed keys are immutable and stay"""
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forget all cached keys"""
+        with self._lock:
+            self._keys = {}
+            self._jwks_url = None
+            self._fetched_at = float("-inf")
+            self._last_attempt = float("-inf")
+
+# Global JWKS key store
+jwks_store = JWKSKeyStore(
+    ttl=float(os.getenv("AUTH0_JWKS_TTL", "3600")),
+    miss_refresh_interval=float(os.getenv("AUTH0_JWKS_MISS_REFRESH_INTERVAL", "60")),
+    timeout=float(os.getenv("AUTH0_JWKS_TIMEOUT", "5"))
+)
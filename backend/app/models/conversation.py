@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 class Message:
+    __slots__ = ('content', 'role', 'timestamp')
+    
     def __init__(self, content: str, role: str, timestamp: Optional[datetime] = None):
         self.content = content
         self.role = role  # 'user' or 'assistant'
@@ -23,23 +25,80 @@ class Message:
         )
 
 class Conversation:
+    """A chat conversation
+    
+    Messages loaded from the database stay as raw documents until
+    `messages` is first read, so callers that only need metadata never
+    build a Message per stored message. A conversation may hold only a
+    window of its transcript: `messages[0]` is message number
+    `message_offset` of `message_count`.
+    """
+    __slots__ = (
+        'id', 'user_id', 'title', 'message_count', 'message_offset', 'summary', 'summarized_count',
+        'created_at', 'updated_at', '_messages', '_raw_messages'
+    )
+    
     def __init__(self, user_id: str, title: str = "New Conversation"):
+        self.id = None
         self.user_id = user_id
         self.title = title
-        self.messages: List[Message] = []
+        self._messages: Optional[List[Message]] = []
+        self._raw_messages: Optional[List[Dict[str, Any]]] = None
+        self.message_count = 0
+        self.message_offset = 0
+        # Rolling summary of the first summarized_count messages (long transcripts)
+        self.summary = ""
+        self.summarized_count = 0
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
     
-    def add_message(self, content: str, role: str):
+    @property
+    def messages(self) -> List[Message]:
+        """Messages, decoded from the stored documents on first access"""
+        if self._messages is None:
+            self._messages = [Message.from_dict(msg) for msg in self._raw_messages]
+            self._raw_messages = None
+        return self._messages
+    
+    @messages.setter
+    def messages(self, messages: List[Message]):
+        self._messages = messages
+        self._raw_messages = None
+    
+    def loaded_count(self) -> int:
+        """Number of messages held, without decoding them"""
+        return len(self._messages if self._messages is not None else self._raw_messages)
+    
+    @property
+    def has_more_before(self) -> bool:
+        return self.message_offset > 0
+    
+    @property
+    def has_more_after(self) -> bool:
+        return self.message_offset + self.loaded_count() < self.message_count
+    
+    def add_message(self, content: str, role: str) -> Message:
         message = Message(content, role)
         self.messages.append(message)
+        self.message_count = self.message_offset + len(self.messages)
         self.updated_at = datetime.utcnow()
+        return message
     
     def to_dict(self) -> Dict[str, Any]:
+        if self.has_more_before or self.has_more_after:
+            raise ValueError("Cannot serialize a conversation loaded as a message window")
+        if self._messages is None:
+            # Not decoded yet: write the stored documents back unchanged
+            messages = list(self._raw_messages)
+        else:
+            messages = [msg.to_dict() for msg in self._messages]
         return {
             'user_id': self.user_id,
             'title': self.title,
-            'messages': [msg.to_dict() for msg in self.messages],
+            'messages': messages,
+            'message_count': len(messages),
+            'summary': self.summary,
+            'summarized_count': self.summarized_count,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -50,7 +109,13 @@ class Conversation:
             user_id=data['user_id'],
             title=data.get('title', 'New Conversation')
         )
-        conv.messages = [Message.from_dict(msg) for msg in data.get('messages', [])]
+        conv.id = data.get('_id')
+        conv._messages = None
+        conv._raw_messages = data.get('messages') or []
+        conv.message_count = data.get('message_count', len(conv._raw_messages))
+        conv.message_offset = data.get('message_offset', 0)
+        conv.summary = data.get('summary', '')
+        conv.summarized_count = data.get('summarized_count', 0)
         conv.created_at = data.get('created_at', datetime.utcnow())
         conv.updated_at = data.get('updated_at', datetime.utcnow())
-        return conv 
\ No newline at end of file
+        return conv
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from .conversation import Message
+
+class RoleplaySession:
+    """Server-side state of a roleplay: setup prompt, profile and transcript"""
+
+    def __init__(self, user_id: str, profile: Dict[str, Any], roleplay_prompt: str):
+        self.id = None
+        self.user_id = user_id
+        self.profile = profile
+        self.roleplay_prompt = roleplay_prompt
+        self.messages: List[Message] = []
+        self.message_count = 0
+        # Rolling summary of the first summarized_count messages (long transcripts)
+        self.summary = ""
+        self.summarized_count = 0
+        self.status = 'active'  # 'active' or 'ended'
+        self.critique: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+
+    def add_message(self, content: str, role: str) -> Message:
+        message = Message(content, role)
+        self.messages.append(message)
+        self.message_count = len(self.messages)
+        self.updated_at = datetime.utcnow()
+        return message
+
+    def history(self) -> List[Dict[str, str]]:
+        """Transcript in the {'role', 'content'} shape GeminiService expects"""
+        return [{'role': msg.role, 'content': msg.content} for msg in self.messages]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user_id': self.user_id,
+            'profile': self.profile,
+            'roleplay_prompt': self.roleplay_prompt,
+            'messages': [msg.to_dict() for msg in self.messages],
+            'message_count': len(self.messages),
+            'summary': self.summary,
+            'summarized_count': self.summarized_count,
+            'status': self.status,
+            'critique': self.critique,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RoleplaySession':
+        session = cls(
+            user_id=data['user_id'],
+            profile=data.get('profile', {}),
+            roleplay_prompt=data.get('roleplay_prompt', '')
+        )
+        session.id = data.get('_id')
+        session.messages = [Message.from_dict(msg) for msg in data.get('messages', [])]
+        session.message_count = data.get('message_count', len(session.messages))
+        session.summary = data.get('summary', '')
+        session.summarized_count = data.get('summarized_count', 0)
+        session.status = data.get('status', 'active')
+        session.critique = data.get('critique')
+        session.created_at = data.get('created_at', datetime.utcnow())
+        session.updated_at = data.get('updated_at', datetime.utcnow())
+        return session
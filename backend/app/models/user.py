@@ -1,5 +1,10 @@
 from datetime import datetime
 from typing import Optional, Dict, Any, List
+import hashlib
+import json
+
+# User fields that mirror Auth0 ID token claims
+CLAIM_FIELDS = ('name', 'email', 'username', 'picture')
 
 class User:
     def __init__(self, auth0_id: str, name: str, email: str, username: str, 
@@ -13,6 +18,14 @@ class User:
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
     
+    def claims(self) -> Dict[str, Any]:
+        """The Auth0-sourced fields of this user"""
+        return {field: getattr(self, field) for field in CLAIM_FIELDS}
+    
+    def claims_hash(self) -> str:
+        """Stable fingerprint of the Auth0 claims, stored to detect changes"""
+        return hashlib.sha256(json.dumps(self.claims(), sort_keys=True).encode()).hexdigest()
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             'auth0_id': self.auth0_id,
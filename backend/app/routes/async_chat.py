@@ -0,0 +1,418 @@
+from quart import request, jsonify, g, Response
+from ..middleware.async_auth_middleware import require_auth_async
+from ..middleware.deadline_middleware import with_deadline
+from ..services.gemini_service import gemini_service
+from ..services.async_database_service import async_db_service
+from ..services.context_manager import context_manager
+from ..models.conversation import Conversation
+from ..models.roleplay_session import RoleplaySession
+from ..services.llm_dispatcher import public_error
+from ..services.deadline import current_deadline
+from ..services.database_service import PROPAGATED_ERRORS
+from .chat import (
+    ROLEPLAY_PROFILE_FIELDS, message_not_saved, missing_fields_response, persistence_error_event, sse_event
+)
+
+def sse_response(events) -> Response:
+    """Wrap an async event generator in a non-buffered text/event-stream response
+
+    The generator should close the upstream stream it reads when it ends.
+    """
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None  # Streams outlive Quart's default response timeout
+    return response
+
+async def load_conversation_for_message(conversation_id: str, user_id: str):
+    """Get or create the conversation a new message is posted to
+
+    Only the messages not yet covered by the rolling summary are loaded.
+    Returns (conversation_id, conversation, error_response)
+    """
+    conversation = await async_db_service.get_conversation_window(conversation_id, since_summary=True)
+    if not conversation:
+        conversation = Conversation(user_id=user_id, title="New Conversation")
+        conversation_id = await async_db_service.create_conversation(conversation)
+        conversation = await async_db_service.get_conversation_window(conversation_id, since_summary=True)
+
+    if not conversation:
+        return conversation_id, None, (jsonify({"error": "Failed to create conversation"}), 500)
+
+    if conversation.user_id != user_id:
+        return conversation_id, None, (jsonify({"error": "Unauthorized"}), 403)
+
+    return conversation_id, conversation, None
+
+async def create_roleplay_session(user_id: str, profile, roleplay_prompt: str, opening: str):
+    """Store a new roleplay session with its opening line; returns its id or None"""
+    session = RoleplaySession(user_id=user_id, profile=profile, roleplay_prompt=roleplay_prompt)
+    session.add_message(opening, 'assistant')
+    return await async_db_service.create_roleplay_session(session)
+
+async def load_active_roleplay_session(session_id: str, user_id: str):
+    """Load a roleplay session the user owns and can still post to
+
+    Returns (session, error_response)
+    """
+    session = await async_db_service.get_roleplay_session(session_id)
+    if not session:
+        return None, (jsonify({'success': False, 'error': 'Roleplay session not found'}), 404)
+
+    if session.user_id != user_id:
+        return None, (jsonify({'success': False, 'error': 'Unauthorized'}), 403)
+
+    if session.status != 'active':
+        return None, (jsonify({'success': False, 'error': 'Roleplay session has ended'}), 409)
+
+    return session, None
+
+def init_routes(app):
+    """Register async versions of the chat routes that wait on Gemini
+
+    Request and response shapes match app/routes/chat.py.
+    """
+
+    # Send message in conversation
+    @app.route('/api/chat/conversations/<conversation_id>/messages', methods=['POST'])
+    @with_deadline('chat_message')
+    @require_auth_async
+    async def send_message(conversation_id):
+        """Send a message in a conversation"""
+        user_id = g.user.get("sub")
+        data = await request.get_json()
+        message_content = data.get("message") if data else None
+
+        if not message_content:
+            return jsonify({"error": "Message content is required"}), 400
+
+        conversation_id, conversation, error_response = await load_conversation_for_message(conversation_id, user_id)
+        if error_response:
+            return error_response
+
+        user_message = conversation.add_message(message_content, "user")
+        messages = [{"role": msg.role, "content": msg.content} for msg in conversation.messages]
+        context = await context_manager.prepare_async(
+            messages, conversation.summary, conversation.summarized_count, gemini_service.summarize_messages_async,
+            offset=conversation.message_offset
+        )
+
+        gemini_response = await gemini_service.generate_response_async(context.messages(), conversation_id)
+
+        if gemini_response["success"]:
+            assistant_message = conversation.add_message(gemini_response["response"], "assistant")
+            if not await async_db_service.append_messages(conversation_id, [user_message, assistant_message], context.summary_fields()):
+                return jsonify(message_not_saved(gemini_response["response"], conversation_id=conversation_id)), 500
+
+            return jsonify({
+                "success": True,
+                "response": gemini_response["response"],
+                "conversation_id": conversation_id,
+                "model": gemini_response["model"]
+            })
+        else:
+            return jsonify({"error": f"Failed to generate response: {gemini_response['error']}"}), 500
+
+    # Stream a message response in conversation
+    @app.route('/api/chat/conversations/<conversation_id>/messages/stream', methods=['POST'])
+    @with_deadline('chat_message')
+    @require_auth_async
+    async def stream_message(conversation_id):
+        """Send a message and stream the reply as Server-Sent Events"""
+        user_id = g.user.get("sub")
+        data = await request.get_json()
+        message_content = data.get("message") if data else None
+
+        if not message_content:
+            return jsonify({"error": "Message content is required"}), 400
+
+        conversation_id, conversation, error_response = await load_conversation_for_message(conversation_id, user_id)
+        if error_response:
+            return error_response
+
+        user_message = conversation.add_message(message_content, "user")
+        messages = [{"role": msg.role, "content": msg.content} for msg in conversation.messages]
+        context = await context_manager.prepare_async(
+            messages, conversation.summary, conversation.summarized_count, gemini_service.summarize_messages_async,
+            offset=conversation.message_offset
+        )
+
+        # Admission (circuit, queue) is decided before the response starts, so shedding is a 503
+        deadline = current_deadline()
+        stream = await gemini_service.stream_text_async(gemini_service.to_gemini_messages(context.messages()), deadline)
+
+        async def events():
+            chunks = []
+            try:
+                async for text in stream:
+                    chunks.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                print(f"Streaming generation failed: {e}")
+                yield sse_event("error", {"error": f"Failed to generate response: {public_error(e)}"})
+                return
+            finally:
+                await stream.aclose()
+
+            full_response = "".join(chunks)
+            assistant_message = conversation.add_message(full_response, "assistant")
+            try:
+                stored = await async_db_service.append_messages(conversation_id, [user_message, assistant_message], context.summary_fields())
+            except PROPAGATED_ERRORS as e:
+                yield persistence_error_event(e, response=full_response, conversation_id=conversation_id)
+                return
+            if not stored:
+                yield sse_event("error", message_not_saved(full_response, conversation_id=conversation_id))
+                return
+
+            yield sse_event("done", {
+                "success": True,
+                "response": full_response,
+                "conversation_id": conversation_id,
+                "model": "gemini-2.5-flash"
+            })
+
+        return sse_response(events())
+
+    # Generate single response
+    @app.route('/api/chat/generate', methods=['POST'])
+    @with_deadline('generate')
+    @require_auth_async
+    async def generate_response():
+        """Generate a single response without conversation context"""
+        data = await request.get_json()
+        prompt = data.get("prompt") if data else None
+
+        if not prompt:
+            return jsonify({"error": "Prompt is required"}), 400
+
+        response = await gemini_service.generate_single_response_async(prompt)
+
+        if response["success"]:
+            return jsonify({
+                "success": True,
+                "response": response["response"],
+                "model": response["model"]
+            })
+        else:
+            return jsonify({"error": f"Failed to generate response: {response['error']}"}), 500
+
+    # Start roleplay session with comprehensive profile
+    @app.route('/api/chat/start_roleplay', methods=['POST'])
+    @with_deadline('start_roleplay')
+    @require_auth_async
+    async def start_roleplay():
+        """Start a new roleplay session based on comprehensive user profile"""
+        data = await request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        error_response = missing_fields_response(data, ROLEPLAY_PROFILE_FIELDS)
+        if error_response:
+            return error_response
+
+        result = await gemini_service.generate_scenario_and_roleplay_async(data)
+
+        if result['success']:
+            result['profile'] = data
+            result['session_id'] = await create_roleplay_session(
+                g.user.get("sub"), data, result['roleplay_prompt'], result['scenario_and_response']
+            )
+            if not result['session_id']:
+                return jsonify({'success': False, 'error': 'Failed to create roleplay session'}), 500
+
+        return jsonify(result)
+
+    # Stream the opening of a roleplay session
+    @app.route('/api/chat/start_roleplay/stream', methods=['POST'])
+    @with_deadline('start_roleplay')
+    @require_auth_async
+    async def stream_start_roleplay():
+        """Start a roleplay session and stream the opening as Server-Sent Events"""
+        user_id = g.user.get("sub")
+        data = await request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        error_response = missing_fields_response(data, ROLEPLAY_PROFILE_FIELDS)
+        if error_response:
+            return error_response
+
+        roleplay_prompt = gemini_service.build_roleplay_prompt(data)
+
+        deadline = current_deadline()
+        stream = await gemini_service.stream_text_async(roleplay_prompt, deadline)
+
+        async def events():
+            chunks = []
+            try:
+                async for text in stream:
+                    chunks.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                print(f"Streaming generation failed: {e}")
+                yield sse_event("error", {"success": False, "error": public_error(e)})
+                return
+            finally:
+                await stream.aclose()
+
+            opening = "".join(chunks).strip()
+            try:
+                session_id = await create_roleplay_session(user_id, data, roleplay_prompt, opening)
+            except PROPAGATED_ERRORS as e:
+                yield persistence_error_event(e, scenario_and_response=opening)
+                return
+            if not session_id:
+                yield sse_event("error", {'success': False, 'error': 'Failed to create roleplay session'})
+                return
+            yield sse_event("done", {
+                'success': True,
+                'scenario_and_response': opening,
+                'roleplay_prompt': roleplay_prompt,
+                'model': 'gemini-2.5-flash',
+                'profile': data,
+                'session_id': session_id
+            })
+
+        return sse_response(events())
+
+    # Continue roleplay conversation
+    @app.route('/api/chat/continue_roleplay', methods=['POST'])
+    @with_deadline('continue_roleplay')
+    @require_auth_async
+    async def continue_roleplay():
+        """Continue an ongoing roleplay conversation"""
+        data = await request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        if 'session_id' in data:
+            error_response = missing_fields_response(data, ['session_id', 'message'])
+            if error_response:
+                return error_response
+
+            session, error_response = await load_active_roleplay_session(data['session_id'], g.user.get("sub"))
+            if error_response:
+                return error_response
+
+            user_message = session.add_message(data['message'], 'user')
+            context = await context_manager.prepare_async(
+                session.history(), session.summary, session.summarized_count, gemini_service.summarize_messages_async
+            )
+            result = await gemini_service.continue_roleplay_async(session.roleplay_prompt, context.recent, context.summary)
+            if result['success']:
+                assistant_message = session.add_message(result['response'], 'assistant')
+                await async_db_service.append_roleplay_messages(
+                    data['session_id'], [user_message, assistant_message], context.summary_fields()
+                )
+                result['session_id'] = data['session_id']
+            return jsonify(result)
+
+        error_response = missing_fields_response(data, ['roleplay_context', 'conversation_history'])
+        if error_response:
+            return error_response
+
+        result = await gemini_service.continue_roleplay_async(
+            data['roleplay_context'],
+            data['conversation_history']
+        )
+        return jsonify(result)
+
+    # Stream the next turn of a roleplay conversation
+    @app.route('/api/chat/continue_roleplay/stream', methods=['POST'])
+    @with_deadline('continue_roleplay')
+    @require_auth_async
+    async def stream_continue_roleplay():
+        """Continue a roleplay conversation and stream the reply as Server-Sent Events"""
+        data = await request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        session = None
+        if 'session_id' in data:
+            error_response = missing_fields_response(data, ['session_id', 'message'])
+            if error_response:
+                return error_response
+
+            session, error_response = await load_active_roleplay_session(data['session_id'], g.user.get("sub"))
+            if error_response:
+                return error_response
+
+            session_id = data['session_id']
+            user_message = session.add_message(data['message'], 'user')
+            context = await context_manager.prepare_async(
+                session.history(), session.summary, session.summarized_count, gemini_service.summarize_messages_async
+            )
+            full_prompt = gemini_service.build_continue_prompt(session.roleplay_prompt, context.recent, context.summary)
+        else:
+            error_response = missing_fields_response(data, ['roleplay_context', 'conversation_history'])
+            if error_response:
+                return error_response
+
+            full_prompt = gemini_service.build_continue_prompt(data['roleplay_context'], data['conversation_history'])
+
+        deadline = current_deadline()
+        stream = await gemini_service.stream_text_async(full_prompt, deadline)
+
+        async def events():
+            chunks = []
+            try:
+                async for text in stream:
+                    chunks.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                print(f"Streaming generation failed: {e}")
+                yield sse_event("error", {"success": False, "error": public_error(e)})
+                return
+            finally:
+                await stream.aclose()
+
+            result = {
+                'success': True,
+                'response': "".join(chunks).strip(),
+                'model': 'gemini-2.5-flash'
+            }
+            if session is not None:
+                assistant_message = session.add_message(result['response'], 'assistant')
+                try:
+                    await async_db_service.append_roleplay_messages(
+                        session_id, [user_message, assistant_message], context.summary_fields()
+                    )
+                except PROPAGATED_ERRORS as e:
+                    yield persistence_error_event(e, response=result['response'], session_id=session_id)
+                    return
+                result['session_id'] = session_id
+            yield sse_event("done", result)
+
+        return sse_response(events())
+
+    # End roleplay and get comprehensive critique
+    @app.route('/api/chat/end_roleplay', methods=['POST'])
+    @with_deadline('end_roleplay')
+    @require_auth_async
+    async def end_roleplay():
+        """End roleplay session and provide comprehensive feedback"""
+        data = await request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        if 'session_id' in data:
+            session, error_response = await load_active_roleplay_session(data['session_id'], g.user.get("sub"))
+            if error_response:
+                return error_response
+
+            result = await gemini_service.end_roleplay_and_critique_async(session.profile, session.history())
+            if result['success']:
+                await async_db_service.end_roleplay_session(data['session_id'], result['critique'])
+                result['session_id'] = data['session_id']
+            return jsonify(result)
+
+        error_response = missing_fields_response(data, ['profile', 'conversation_history'])
+        if error_response:
+            return error_response
+
+        result = await gemini_service.end_roleplay_and_critique_async(
+            data['profile'],
+            data['conversation_history']
+        )
+        return jsonify(result)
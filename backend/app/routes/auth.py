@@ -23,22 +23,19 @@ def init_routes(app):
             picture=user.get("picture")
         )
         
-        # Use upsert to create or update user
-        success = db_service.upsert_user(user_obj)
-        if not success:
+        # One round trip; unchanged claims are not rewritten
+        db_user = db_service.sync_user(user_obj)
+        if not db_user:
             return jsonify({"error": "Failed to sync user data with database"}), 500
         
-        # Get the user from database to ensure we have the latest data
-        db_user = db_service.get_user_by_auth0_id(user.get("sub"))
-        
         return jsonify({
             "user_id": user.get("sub"),
             "name": user.get("name"),
             "email": user.get("email"),
             "username": user.get("username"),
             "picture": user.get("picture"),
-            "created_at": db_user.created_at.isoformat() if db_user and hasattr(db_user, 'created_at') else None,
-            "updated_at": db_user.updated_at.isoformat() if db_user and hasattr(db_user, 'updated_at') else None
+            "created_at": db_user.created_at,
+            "updated_at": db_user.updated_at
         })
 
     # Public endpoint
@@ -99,21 +96,19 @@ def init_routes(app):
             picture=user.get("picture")
         )
         
-        success = db_service.upsert_user(user_obj)
-        if not success:
+        # Returns the stored user; unchanged claims are not rewritten
+        db_user = db_service.sync_user(user_obj)
+        if not db_user:
             return jsonify({"error": "Failed to sync user data"}), 500
         
-        # Get the synced user data
-        db_user = db_service.get_user_by_auth0_id(user.get("sub"))
-        
         return jsonify({
             "user_id": user.get("sub"),
             "name": user.get("name"),
             "email": user.get("email"),
             "username": user.get("username"),
             "picture": user.get("picture"),
-            "created_at": db_user.created_at.isoformat() if db_user and hasattr(db_user, 'created_at') else None,
-            "updated_at": db_user.updated_at.isoformat() if db_user and hasattr(db_user, 'updated_at') else None,
+            "created_at": db_user.created_at,
+            "updated_at": db_user.updated_at,
             "synced": True
         })
 
@@ -1,33 +1,188 @@
-from flask import request, jsonify, g
+from flask import request, jsonify, g, Response, stream_with_context, current_app
 from ..middleware.auth_middleware import require_auth
+from ..middleware.deadline_middleware import with_deadline
 from ..services.gemini_service import gemini_service
-from ..services.database_service import db_service
+from ..services.database_service import db_service, PROPAGATED_ERRORS
+from ..services.context_manager import context_manager
+from ..services.llm_dispatcher import public_error
+from ..services.deadline import current_deadline
+from ..services.circuit_breaker import ServiceUnavailableError
 from ..models.conversation import Conversation, Message
+from ..models.roleplay_session import RoleplaySession
+from ..json_provider import dumps, streaming_response
+from ..http_cache import not_modified_response, resource_etag, set_validators
+from ..errors import deadline_exceeded, service_unavailable
+from datetime import datetime, timezone
+
+# Page size limits for conversation listings
+DEFAULT_CONVERSATIONS_PAGE_SIZE = 20
+MAX_CONVERSATIONS_PAGE_SIZE = 100
+
+# Page size limits for the messages of one conversation
+DEFAULT_MESSAGES_PAGE_SIZE = 50
+MAX_MESSAGES_PAGE_SIZE = 200
+
+# Profile fields required to start a roleplay session
+ROLEPLAY_PROFILE_FIELDS = [
+    'scenario_type', 'relationship', 'communication_style', 
+    'job_level', 'industry', 'specific_goal', 'challenge_level', 
+    'time_constraint', 'stakes', 'personal_style', 'past_experience'
+]
+
+def sse_event(event: str, data) -> str:
+    """Format a Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+def message_not_saved(response: str, **fields):
+    """Body reporting a generated reply whose turn could not be stored
+    
+    The reply is included so the client does not lose it.
+    """
+    return {'success': False, 'error': 'Failed to save the message', 'response': response, **fields}
+
+def persistence_error_event(error: Exception, **fields) -> str:
+    """SSE error event for a reply that was generated but could not be stored
+    
+    Carries the body the JSON routes answer with (`degraded` and `service`
+    for an unavailable dependency) plus `fields`, e.g. the generated reply.
+    """
+    handler = service_unavailable if isinstance(error, ServiceUnavailableError) else deadline_exceeded
+    body = handler(error)[0]
+    return sse_event("error", {**body, **fields})
+
+def sse_response(events, stream=None) -> Response:
+    """Wrap an event generator in a non-buffered text/event-stream response
+    
+    `stream` is the upstream stream the events read; it is closed with the
+    response, so its dispatcher slot is released even if the events never
+    start (client gone before the first byte).
+    """
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    if stream is not None:
+        response.call_on_close(stream.close)
+    return response
+
+def missing_fields_response(data, required_fields):
+    """Return a 400 response if any required field is absent, else None
+    
+    The body is a plain dict so the async (Quart) routes can share this.
+    """
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        return {
+            'success': False,
+            'error': f'Missing required fields: {", ".join(missing_fields)}'
+        }, 400
+    return None
+
+def parse_message_cursor(value):
+    """Parse a before/after message cursor: an index or an ISO 8601 timestamp
+    
+    Raises ValueError for anything else.
+    """
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid message cursor: {value}")
+    # Stored timestamps are naive UTC
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def load_conversation_for_message(conversation_id: str, user_id: str):
+    """Get or create the conversation a new message is posted to
+    
+    Only the messages not yet covered by the rolling summary are loaded.
+    Returns (conversation_id, conversation, error_response)
+    """
+    conversation = db_service.get_conversation_window(conversation_id, since_summary=True)
+    if not conversation:
+        # Create new conversation
+        conversation = Conversation(user_id=user_id, title="New Conversation")
+        conversation_id = db_service.create_conversation(conversation)
+        conversation = db_service.get_conversation_window(conversation_id, since_summary=True)
+    
+    if not conversation:
+        return conversation_id, None, (jsonify({"error": "Failed to create conversation"}), 500)
+    
+    if conversation.user_id != user_id:
+        return conversation_id, None, (jsonify({"error": "Unauthorized"}), 403)
+    
+    return conversation_id, conversation, None
+
+def create_roleplay_session(user_id: str, profile, roleplay_prompt: str, opening: str):
+    """Store a new roleplay session with its opening line; returns its id or None"""
+    session = RoleplaySession(user_id=user_id, profile=profile, roleplay_prompt=roleplay_prompt)
+    session.add_message(opening, 'assistant')
+    return db_service.create_roleplay_session(session)
+
+def load_active_roleplay_session(session_id: str, user_id: str):
+    """Load a roleplay session the user owns and can still post to
+    
+    Returns (session, error_response)
+    """
+    session = db_service.get_roleplay_session(session_id)
+    if not session:
+        return None, (jsonify({'success': False, 'error': 'Roleplay session not found'}), 404)
+    
+    if session.user_id != user_id:
+        return None, (jsonify({'success': False, 'error': 'Unauthorized'}), 403)
+    
+    if session.status != 'active':
+        return None, (jsonify({'success': False, 'error': 'Roleplay session has ended'}), 409)
+    
+    return session, None
 
 def init_routes(app):
     # Get all conversations
     @app.route('/api/chat/conversations', methods=['GET'])
+    @with_deadline('default')
     @require_auth
     def get_conversations():
-        """Get all conversations for the authenticated user"""
+        """Get a page of conversation summaries for the authenticated user"""
         user_id = g.user.get("sub")
-        conversations = db_service.get_user_conversations(user_id)
+        limit = request.args.get("limit", DEFAULT_CONVERSATIONS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_CONVERSATIONS_PAGE_SIZE))
+        cursor = request.args.get("cursor")
         
-        return jsonify({
+        try:
+            conversations, next_cursor = db_service.get_user_conversation_summaries(user_id, limit, cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Summaries carry no messages, so an unchanged page costs one cheap query
+        etag = resource_etag(user_id, request.query_string, next_cursor, *(
+            (conv["id"], conv["title"], conv["updated_at"], conv["message_count"]) for conv in conversations
+        ))
+        not_modified = not_modified_response(etag)
+        if not_modified:
+            return not_modified
+        
+        response = jsonify({
             "conversations": [
                 {
-                    "id": str(conv.id) if hasattr(conv, 'id') else None,
-                    "title": conv.title,
-                    "created_at": conv.created_at.isoformat(),
-                    "updated_at": conv.updated_at.isoformat(),
-                    "message_count": len(conv.messages)
+                    "id": conv["id"],
+                    "title": conv["title"],
+                    "created_at": conv["created_at"],
+                    "updated_at": conv["updated_at"],
+                    "message_count": conv["message_count"]
                 }
                 for conv in conversations
-            ]
+            ],
+            "next_cursor": next_cursor
         })
+        return set_validators(response, etag)
 
     # Create new conversation
     @app.route('/api/chat/conversations', methods=['POST'])
+    @with_deadline('default')
     @require_auth
     def create_conversation():
         """Create a new conversation"""
@@ -49,47 +204,82 @@ def init_routes(app):
 
     # Get specific conversation
     @app.route('/api/chat/conversations/<conversation_id>', methods=['GET'])
+    @with_deadline('default')
     @require_auth
     def get_conversation(conversation_id):
-        """Get a specific conversation"""
+        """Get a conversation with one page of its messages
+        
+        Returns the newest `limit` messages, or the page before/after a
+        message index or timestamp (`before`, `after`).
+        """
         user_id = g.user.get("sub")
-        conversation = db_service.get_conversation(conversation_id)
+        limit = request.args.get("limit", DEFAULT_MESSAGES_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_MESSAGES_PAGE_SIZE))
+        try:
+            before = parse_message_cursor(request.args.get("before"))
+            after = parse_message_cursor(request.args.get("after"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if before is not None and after is not None:
+            return jsonify({"error": "Use either before or after, not both"}), 400
         
-        if not conversation:
+        # Validate the client's copy from metadata alone, before touching messages
+        meta = db_service.get_conversation_meta(conversation_id)
+        
+        if not meta:
             return jsonify({"error": "Conversation not found"}), 404
         
-        if conversation.user_id != user_id:
+        if meta.get("user_id") != user_id:
             return jsonify({"error": "Unauthorized"}), 403
         
-        return jsonify({
+        last_modified = meta.get("updated_at")
+        etag = resource_etag(
+            conversation_id, meta.get("title"), last_modified, meta.get("message_count"), request.query_string
+        )
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        conversation = db_service.get_conversation_window(conversation_id, limit, before=before, after=after)
+        
+        if not conversation:
+            return jsonify({"error": "Conversation not found"}), 404
+        
+        # Long pages are encoded message by message as they are sent
+        loaded = conversation.loaded_count()
+        stream = loaded >= current_app.config.get("JSON_STREAM_MIN_MESSAGES", 200)
+        messages = (msg.to_dict() for msg in conversation.messages)
+        payload = {
             "conversation": {
                 "id": conversation_id,
                 "title": conversation.title,
-                "messages": [
-                    {
-                        "content": msg.content,
-                        "role": msg.role,
-                        "timestamp": msg.timestamp.isoformat()
-                    }
-                    for msg in conversation.messages
-                ],
-                "created_at": conversation.created_at.isoformat(),
-                "updated_at": conversation.updated_at.isoformat()
+                "messages": messages if stream else list(messages),
+                "message_count": conversation.message_count,
+                "start_index": conversation.message_offset,
+                # Pass as `before` / `after` to load the neighbouring pages
+                "before_cursor": conversation.message_offset if conversation.has_more_before else None,
+                "after_cursor": conversation.message_offset + loaded - 1 if conversation.has_more_after else None,
+                "created_at": conversation.created_at,
+                "updated_at": conversation.updated_at
             }
-        })
+        }
+        
+        response = streaming_response(payload) if stream else jsonify(payload)
+        return set_validators(response, etag, last_modified)
 
     # Delete conversation
     @app.route('/api/chat/conversations/<conversation_id>', methods=['DELETE'])
+    @with_deadline('default')
     @require_auth
     def delete_conversation(conversation_id):
         """Delete a conversation"""
         user_id = g.user.get("sub")
-        conversation = db_service.get_conversation(conversation_id)
+        owner_id = db_service.get_conversation_owner(conversation_id)
         
-        if not conversation:
+        if not owner_id:
             return jsonify({"error": "Conversation not found"}), 404
         
-        if conversation.user_id != user_id:
+        if owner_id != user_id:
             return jsonify({"error": "Unauthorized"}), 403
         
         success = db_service.delete_conversation(conversation_id)
@@ -101,6 +291,7 @@ def init_routes(app):
 
     # Send message in conversation
     @app.route('/api/chat/conversations/<conversation_id>/messages', methods=['POST'])
+    @with_deadline('chat_message')
     @require_auth
     def send_message(conversation_id):
         """Send a message in a conversation"""
@@ -112,18 +303,12 @@ def init_routes(app):
             return jsonify({"error": "Message content is required"}), 400
         
         # Get or create conversation
-        conversation = db_service.get_conversation(conversation_id)
-        if not conversation:
-            # Create new conversation
-            conversation = Conversation(user_id=user_id, title="New Conversation")
-            conversation_id = db_service.create_conversation(conversation)
-            conversation = db_service.get_conversation(conversation_id)
-        
-        if conversation.user_id != user_id:
-            return jsonify({"error": "Unauthorized"}), 403
+        conversation_id, conversation, error_response = load_conversation_for_message(conversation_id, user_id)
+        if error_response:
+            return error_response
         
         # Add user message
-        conversation.add_message(message_content, "user")
+        user_message = conversation.add_message(message_content, "user")
         
         # Prepare messages for Gemini API
         messages = [
@@ -134,15 +319,22 @@ def init_routes(app):
             for msg in conversation.messages
         ]
         
+        # Send recent turns verbatim and fold older ones into the stored summary
+        context = context_manager.prepare(
+            messages, conversation.summary, conversation.summarized_count, gemini_service.summarize_messages,
+            offset=conversation.message_offset
+        )
+        
         # Generate response from Gemini
-        gemini_response = gemini_service.generate_response(messages, conversation_id)
+        gemini_response = gemini_service.generate_response(context.messages(), conversation_id)
         
         if gemini_response["success"]:
             # Add assistant response to conversation
-            conversation.add_message(gemini_response["response"], "assistant")
+            assistant_message = conversation.add_message(gemini_response["response"], "assistant")
             
-            # Update conversation in database
-            db_service.update_conversation(conversation_id, conversation)
+            # Append the new turn without rewriting earlier messages
+            if not db_service.append_messages(conversation_id, [user_message, assistant_message], context.summary_fields()):
+                return jsonify(message_not_saved(gemini_response["response"], conversation_id=conversation_id)), 500
             
             return jsonify({
                 "success": True,
@@ -153,8 +345,76 @@ def init_routes(app):
         else:
             return jsonify({"error": f"Failed to generate response: {gemini_response['error']}"}), 500
 
+    # Stream a message response in conversation
+    @app.route('/api/chat/conversations/<conversation_id>/messages/stream', methods=['POST'])
+    @with_deadline('chat_message')
+    @require_auth
+    def stream_message(conversation_id):
+        """Send a message and stream the reply as Server-Sent Events"""
+        user_id = g.user.get("sub")
+        data = request.get_json()
+        message_content = data.get("message") if data else None
+        
+        if not message_content:
+            return jsonify({"error": "Message content is required"}), 400
+        
+        conversation_id, conversation, error_response = load_conversation_for_message(conversation_id, user_id)
+        if error_response:
+            return error_response
+        
+        user_message = conversation.add_message(message_content, "user")
+        messages = [
+            {
+                "role": msg.role,
+                "content": msg.content
+            }
+            for msg in conversation.messages
+        ]
+        context = context_manager.prepare(
+            messages, conversation.summary, conversation.summarized_count, gemini_service.summarize_messages,
+            offset=conversation.message_offset
+        )
+        
+        # The stream outlives the view; it keeps the request's deadline.
+        # Admission (circuit, queue) is decided here, so shedding is a 503
+        deadline = current_deadline()
+        stream = gemini_service.stream_response(context.messages(), deadline)
+        
+        def events():
+            chunks = []
+            try:
+                for text in stream:
+                    chunks.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                print(f"Streaming generation failed: {e}")
+                yield sse_event("error", {"error": f"Failed to generate response: {public_error(e)}"})
+                return
+            
+            # Persist the assembled reply once the stream has finished
+            full_response = "".join(chunks)
+            assistant_message = conversation.add_message(full_response, "assistant")
+            try:
+                stored = db_service.append_messages(conversation_id, [user_message, assistant_message], context.summary_fields())
+            except PROPAGATED_ERRORS as e:
+                yield persistence_error_event(e, response=full_response, conversation_id=conversation_id)
+                return
+            if not stored:
+                yield sse_event("error", message_not_saved(full_response, conversation_id=conversation_id))
+                return
+            
+            yield sse_event("done", {
+                "success": True,
+                "response": full_response,
+                "conversation_id": conversation_id,
+                "model": "gemini-2.5-flash"
+            })
+        
+        return sse_response(events(), stream)
+
     # Generate single response
     @app.route('/api/chat/generate', methods=['POST'])
+    @with_deadline('generate')
     @require_auth
     def generate_response():
         """Generate a single response without conversation context"""
@@ -177,6 +437,7 @@ def init_routes(app):
 
     # NEW: Start roleplay session with comprehensive profile
     @app.route('/api/chat/start_roleplay', methods=['POST'])
+    @with_deadline('start_roleplay')
     @require_auth
     def start_roleplay():
         """Start a new roleplay session based on comprehensive user profile"""
@@ -185,43 +446,65 @@ def init_routes(app):
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
         # New comprehensive required fields
-        required_fields = [
-            'scenario_type', 'relationship', 'communication_style', 
-            'job_level', 'industry', 'specific_goal', 'challenge_level', 
-            'time_constraint', 'stakes', 'personal_style', 'past_experience'
-        ]
-        
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({
-                'success': False, 
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
+        error_response = missing_fields_response(data, ROLEPLAY_PROFILE_FIELDS)
+        if error_response:
+            return error_response
 
         result = gemini_service.generate_scenario_and_roleplay(data)
         
         if result['success']:
             # Store the roleplay context in the response for continued conversation
             result['profile'] = data  # Include the original profile for later use
+            # Keep the setup prompt and transcript server-side so later turns
+            # only need to send the session id and the new message
+            result['session_id'] = create_roleplay_session(
+                g.user.get("sub"), data, result['roleplay_prompt'], result['scenario_and_response']
+            )
+            if not result['session_id']:
+                # Later turns would all fail without a stored session
+                return jsonify({'success': False, 'error': 'Failed to create roleplay session'}), 500
             
         return jsonify(result)
 
     # NEW: Continue roleplay conversation
     @app.route('/api/chat/continue_roleplay', methods=['POST'])
+    @with_deadline('continue_roleplay')
     @require_auth  
     def continue_roleplay():
-        """Continue an ongoing roleplay conversation"""
+        """Continue an ongoing roleplay conversation
+        
+        Send {session_id, message}; the legacy {roleplay_context,
+        conversation_history} body is still accepted.
+        """
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
-        required_fields = ['roleplay_context', 'conversation_history']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
+        if 'session_id' in data:
+            error_response = missing_fields_response(data, ['session_id', 'message'])
+            if error_response:
+                return error_response
+
+            session, error_response = load_active_roleplay_session(data['session_id'], g.user.get("sub"))
+            if error_response:
+                return error_response
+
+            user_message = session.add_message(data['message'], 'user')
+            context = context_manager.prepare(
+                session.history(), session.summary, session.summarized_count, gemini_service.summarize_messages
+            )
+            result = gemini_service.continue_roleplay(session.roleplay_prompt, context.recent, context.summary)
+            if result['success']:
+                assistant_message = session.add_message(result['response'], 'assistant')
+                db_service.append_roleplay_messages(
+                    data['session_id'], [user_message, assistant_message], context.summary_fields()
+                )
+                result['session_id'] = data['session_id']
+            return jsonify(result)
+
+        error_response = missing_fields_response(data, ['roleplay_context', 'conversation_history'])
+        if error_response:
+            return error_response
 
         result = gemini_service.continue_roleplay(
             data['roleplay_context'], 
@@ -229,22 +512,154 @@ def init_routes(app):
         )
         return jsonify(result)
 
+    # Stream the opening of a roleplay session
+    @app.route('/api/chat/start_roleplay/stream', methods=['POST'])
+    @with_deadline('start_roleplay')
+    @require_auth
+    def stream_start_roleplay():
+        """Start a roleplay session and stream the opening as Server-Sent Events"""
+        user_id = g.user.get("sub")
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        error_response = missing_fields_response(data, ROLEPLAY_PROFILE_FIELDS)
+        if error_response:
+            return error_response
+
+        roleplay_prompt = gemini_service.build_roleplay_prompt(data)
+        deadline = current_deadline()
+        stream = gemini_service.stream_text(roleplay_prompt, deadline)
+
+        def events():
+            chunks = []
+            try:
+                for text in stream:
+                    chunks.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                print(f"Streaming generation failed: {e}")
+                yield sse_event("error", {"success": False, "error": public_error(e)})
+                return
+
+            opening = "".join(chunks).strip()
+            try:
+                session_id = create_roleplay_session(user_id, data, roleplay_prompt, opening)
+            except PROPAGATED_ERRORS as e:
+                yield persistence_error_event(e, scenario_and_response=opening)
+                return
+            if not session_id:
+                yield sse_event("error", {'success': False, 'error': 'Failed to create roleplay session'})
+                return
+            yield sse_event("done", {
+                'success': True,
+                'scenario_and_response': opening,
+                'roleplay_prompt': roleplay_prompt,
+                'model': 'gemini-2.5-flash',
+                'profile': data,
+                'session_id': session_id
+            })
+
+        return sse_response(events(), stream)
+
+    # Stream the next turn of a roleplay conversation
+    @app.route('/api/chat/continue_roleplay/stream', methods=['POST'])
+    @with_deadline('continue_roleplay')
+    @require_auth
+    def stream_continue_roleplay():
+        """Continue a roleplay conversation and stream the reply as Server-Sent Events"""
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+        session = None
+        if 'session_id' in data:
+            error_response = missing_fields_response(data, ['session_id', 'message'])
+            if error_response:
+                return error_response
+
+            session, error_response = load_active_roleplay_session(data['session_id'], g.user.get("sub"))
+            if error_response:
+                return error_response
+
+            session_id = data['session_id']
+            user_message = session.add_message(data['message'], 'user')
+            context = context_manager.prepare(
+                session.history(), session.summary, session.summarized_count, gemini_service.summarize_messages
+            )
+            roleplay_context = session.roleplay_prompt
+            conversation_history = context.recent
+            summary = context.summary
+        else:
+            error_response = missing_fields_response(data, ['roleplay_context', 'conversation_history'])
+            if error_response:
+                return error_response
+
+            roleplay_context = data['roleplay_context']
+            conversation_history = data['conversation_history']
+            summary = None
+
+        deadline = current_deadline()
+        stream = gemini_service.stream_continue_roleplay(roleplay_context, conversation_history, summary, deadline)
+
+        def events():
+            chunks = []
+            try:
+                for text in stream:
+                    chunks.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                print(f"Streaming generation failed: {e}")
+                yield sse_event("error", {"success": False, "error": public_error(e)})
+                return
+
+            result = {
+                'success': True,
+                'response': "".join(chunks).strip(),
+                'model': 'gemini-2.5-flash'
+            }
+            if session is not None:
+                assistant_message = session.add_message(result['response'], 'assistant')
+                try:
+                    db_service.append_roleplay_messages(
+                        session_id, [user_message, assistant_message], context.summary_fields()
+                    )
+                except PROPAGATED_ERRORS as e:
+                    yield persistence_error_event(e, response=result['response'], session_id=session_id)
+                    return
+                result['session_id'] = session_id
+            yield sse_event("done", result)
+
+        return sse_response(events(), stream)
+
     # NEW: End roleplay and get comprehensive critique
     @app.route('/api/chat/end_roleplay', methods=['POST'])
+    @with_deadline('end_roleplay')
     @require_auth
     def end_roleplay():
-        """End roleplay session and provide comprehensive feedback"""
+        """End roleplay session and provide comprehensive feedback
+        
+        Send {session_id}; the legacy {profile, conversation_history} body
+        is still accepted.
+        """
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
-        required_fields = ['profile', 'conversation_history']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
+        if 'session_id' in data:
+            session, error_response = load_active_roleplay_session(data['session_id'], g.user.get("sub"))
+            if error_response:
+                return error_response
+
+            result = gemini_service.end_roleplay_and_critique(session.profile, session.history())
+            if result['success']:
+                db_service.end_roleplay_session(data['session_id'], result['critique'])
+                result['session_id'] = data['session_id']
+            return jsonify(result)
+
+        error_response = missing_fields_response(data, ['profile', 'conversation_history'])
+        if error_response:
+            return error_response
 
         result = gemini_service.end_roleplay_and_critique(
             data['profile'], 
@@ -254,6 +669,7 @@ def init_routes(app):
 
     # BACKWARD COMPATIBILITY: Keep old generate_scenario endpoint
     @app.route('/api/chat/generate_scenario', methods=['POST'])
+    @with_deadline('start_roleplay')
     @require_auth
     def generate_scenario():
         """DEPRECATED: Generate a workplace scenario based on user profile (old format)"""
@@ -278,6 +694,7 @@ def init_routes(app):
 
     # BACKWARD COMPATIBILITY: Keep old critique_response endpoint  
     @app.route('/api/chat/critique_response', methods=['POST'])
+    @with_deadline('end_roleplay')
     @require_auth
     def critique_response():
         """DEPRECATED: Critique a user's response to a scenario (old format)"""
@@ -1,6 +1,28 @@
 from flask import request, jsonify, g
-from ..middleware.auth_middleware import require_auth
+from ..middleware.auth_middleware import require_auth, token_cache
 from ..services.database_service import db_service
+from ..services.gemini_service import gemini_service
+from datetime import datetime
+
+def public_breaker_state(snapshot):
+    """Circuit breaker state without error text or counters"""
+    return {
+        "state": snapshot["state"],
+        "retry_in_seconds": snapshot["retry_in_seconds"]
+    }
+
+def public_database_health(health):
+    """Database health for unauthenticated probes
+    
+    Driver errors name hosts, so they and the internal counters are only
+    reported by the authenticated metrics endpoint.
+    """
+    return {
+        "state": health["state"],
+        "connected": health["connected"],
+        "last_check": health["last_check"],
+        "circuit_breaker": public_breaker_state(health["circuit_breaker"])
+    }
 
 def init_routes(app):
     # Post data endpoint
@@ -84,9 +106,48 @@ def init_routes(app):
     # Health check endpoint
     @app.route('/api/user/health', methods=['GET'])
     def health_check():
-        """Health check endpoint"""
+        """Health check endpoint; status is "degraded" while a dependency circuit is open"""
+        database = public_database_health(db_service.get_health())
+        circuit_breakers = {
+            "mongodb": database["circuit_breaker"],
+            "gemini": public_breaker_state(gemini_service.breaker.snapshot())
+        }
+        degraded = any(breaker["state"] != "closed" for breaker in circuit_breakers.values())
         return jsonify({
-            "status": "healthy",
+            "status": "degraded" if degraded else "healthy",
             "service": "Flask API",
-            "timestamp": "2024-01-01T00:00:00Z"
-        }) 
\ No newline at end of file
+            "database": database,
+            "circuit_breakers": circuit_breakers,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        })
+
+    # Metrics endpoint
+    @app.route('/api/user/metrics', methods=['GET'])
+    @require_auth
+    def metrics():
+        """Cache and connection counters for monitoring, with the last errors seen"""
+        return jsonify({
+            "auth_token_cache": token_cache.stats(),
+            "user_cache": db_service.user_cache.stats(),
+            "response_cache": gemini_service.response_cache.stats(),
+            "single_flight": gemini_service.single_flight.stats(),
+            "llm_dispatcher": gemini_service.dispatcher.stats(),
+            "database": db_service.get_health(),
+            "gemini_circuit_breaker": gemini_service.breaker.snapshot()
+        })
+
+    # Readiness probe endpoint
+    @app.route('/api/user/ready', methods=['GET'])
+    def readiness_check():
+        """Readiness probe: 503 unless the database is healthy and its circuit closed"""
+        # The client is created lazily; connect here so a fresh worker can become ready
+        try:
+            db_service.ensure_connection()
+        except Exception:
+            pass  # Reported through the health state below
+        database = public_database_health(db_service.get_health())
+        ready = database["state"] == "healthy" and database["circuit_breaker"]["state"] == "closed"
+        return jsonify({
+            "ready": ready,
+            "database": database
+        }), 200 if ready else 503 
\ No newline at end of file
@@ -0,0 +1,268 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from ..models.conversation import Conversation, Message
+from ..models.roleplay_session import RoleplaySession
+from . import message_buckets
+from .database_service import (
+    PROPAGATED_ERRORS, MessageCursor, connection_options, guarded_operation, message_window_pipeline
+)
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ReturnDocument
+import os
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+class AsyncDatabaseService:
+    """Motor-backed counterpart of DatabaseService for the ASGI app
+
+    Only the conversation operations used by the async chat routes are
+    mirrored here; everything else is served by the WSGI app.
+    """
+
+    def __init__(self, mongo_uri: Optional[str] = None):
+        self.mongo_uri = mongo_uri or os.getenv("MONGODB_URI")
+        self.client: Optional["AsyncIOMotorClient"] = None
+        self.conversations_collection: Optional["AsyncIOMotorCollection"] = None
+        self.message_buckets_collection: Optional["AsyncIOMotorCollection"] = None
+        self.roleplay_sessions_collection: Optional["AsyncIOMotorCollection"] = None
+
+    def connect(self):
+        """Create the Motor client (connections are opened lazily by the driver)"""
+        if self.client is None:
+            # Deferred so importing the app does not pay for Motor
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self.client = AsyncIOMotorClient(self.mongo_uri, **connection_options())
+            db = self.client.get_database()
+            self.conversations_collection = db.conversations
+            self.message_buckets_collection = db[message_buckets.BUCKETS_COLLECTION]
+            self.roleplay_sessions_collection = db.roleplay_sessions
+
+    def reset_after_fork(self):
+        """Forget a client inherited from the parent process (it belongs to the parent's event loop)"""
+        self.client = None
+        self.conversations_collection = None
+        self.message_buckets_collection = None
+        self.roleplay_sessions_collection = None
+
+    def operation(self):
+        """Context manager wrapping one operation in the shared MongoDB circuit breaker"""
+        return guarded_operation(self.connect)
+
+    def disconnect(self):
+        """Close the Motor client"""
+        if self.client:
+            self.client.close()
+            self.client = None
+            self.conversations_collection = None
+            self.message_buckets_collection = None
+            self.roleplay_sessions_collection = None
+
+    # Conversation operations
+    async def create_conversation(self, conversation: Conversation) -> Optional[str]:
+        """Create a new conversation, stored as MESSAGE_STORAGE_MODE says"""
+        try:
+            with self.operation():
+                conversation_data = conversation.to_dict()
+                if message_buckets.storage_mode() != message_buckets.STORAGE_BUCKETS:
+                    result = await self.conversations_collection.insert_one(conversation_data)
+                    return str(result.inserted_id)
+
+                messages = conversation_data.pop("messages", [])
+                bucket_size = message_buckets.default_bucket_size()
+                conversation_data.update(message_buckets.bucketed_conversation_fields(len(messages), bucket_size))
+                result = await self.conversations_collection.insert_one(conversation_data)
+                if messages:
+                    await self.message_buckets_collection.insert_many(
+                        message_buckets.bucket_documents(result.inserted_id, messages, bucket_size)
+                    )
+                return str(result.inserted_id)
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error creating conversation: {e}")
+            return None
+
+    async def get_conversation_window(self, conversation_id: str, limit: int = 50,
+                                      before: Optional[MessageCursor] = None, after: Optional[MessageCursor] = None,
+                                      since_summary: bool = False) -> Optional[Conversation]:
+        """Get a conversation holding one range of its messages (see message_window_pipeline)"""
+        try:
+            with self.operation():
+                cursor = self.conversations_collection.aggregate(
+                    message_window_pipeline(ObjectId(conversation_id), limit, before, after, since_summary)
+                )
+                documents = await cursor.to_list(length=1)
+                if not documents:
+                    return None
+                conversation_data = documents[0]
+                if message_buckets.is_bucketed(conversation_data):
+                    start, end = conversation_data["message_offset"], conversation_data["message_end"]
+                    cursor = after if after is not None else before
+                    if not since_summary and isinstance(cursor, datetime):
+                        position = await self._bucket_position(conversation_data["_id"], cursor, inclusive=after is not None)
+                        start, end = message_buckets.timestamp_window(
+                            position, conversation_data["message_count"], limit, after is not None
+                        )
+                    conversation_data["message_offset"] = start
+                    conversation_data["messages"] = await self._read_bucket_messages(conversation_data, start, end)
+                return Conversation.from_dict(conversation_data)
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error getting conversation messages: {e}")
+            return None
+
+    async def _read_bucket_messages(self, conversation_data: Dict[str, Any], start: int, end: int) -> List[Dict[str, Any]]:
+        """Messages [start, end) of a bucketed conversation, read from the buckets holding them"""
+        if end <= start:
+            return []
+        cursor = self.message_buckets_collection.find(
+            message_buckets.bucket_range_filter(
+                conversation_data["_id"], start, end,
+                conversation_data["bucket_size"], conversation_data.get("tail_bucket_seq")
+            ),
+            {"messages": 1}
+        ).sort("bucket_seq", 1)
+        return message_buckets.messages_in_range(await cursor.to_list(length=None), start, end)
+
+    async def _bucket_position(self, conversation_id: ObjectId, timestamp: datetime, inclusive: bool) -> int:
+        """Number of messages before (or, if inclusive, at or before) a timestamp in a bucketed conversation"""
+        cursor = self.message_buckets_collection.aggregate(
+            message_buckets.timestamp_position_pipeline(conversation_id, timestamp, inclusive)
+        )
+        documents = await cursor.to_list(length=1)
+        return documents[0]["position"] if documents else 0
+
+    async def append_messages(self, conversation_id: str, messages: List[Message],
+                                    set_fields: Optional[Dict[str, Any]] = None) -> bool:
+        """Atomically append messages to a conversation without rewriting earlier ones
+
+        set_fields are written in the same update (e.g. the rolling summary).
+        The storage MESSAGE_STORAGE_MODE selects is tried first.
+        """
+        try:
+            with self.operation():
+                new_messages = [msg.to_dict() for msg in messages]
+                attempts = [self._append_embedded, self._append_to_buckets]
+                if message_buckets.storage_mode() == message_buckets.STORAGE_BUCKETS:
+                    attempts.reverse()
+                for attempt in attempts:
+                    appended = await attempt(ObjectId(conversation_id), new_messages, set_fields)
+                    if appended is not None:
+                        return appended
+                return False
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error appending messages: {e}")
+            return False
+
+    async def _append_embedded(self, conversation_id: ObjectId, new_messages: List[Dict[str, Any]],
+                               set_fields: Optional[Dict[str, Any]]) -> Optional[bool]:
+        """Push onto the embedded array; None if the conversation is bucketed (or missing)"""
+        now = datetime.utcnow()
+        result = await self.conversations_collection.update_one(
+            message_buckets.embedded_append_filter(conversation_id),
+            message_buckets.embedded_append_update(new_messages, set_fields, now)
+        )
+        if result.matched_count == 0:
+            # Documents written before message_count existed
+            result = await self.conversations_collection.update_one(
+                message_buckets.embedded_append_filter(conversation_id, counted=False),
+                message_buckets.legacy_embedded_append_update(new_messages, set_fields, now)
+            )
+        if result.matched_count == 0:
+            return None
+        return result.modified_count > 0
+
+    async def _append_to_buckets(self, conversation_id: ObjectId, new_messages: List[Dict[str, Any]],
+                                 set_fields: Optional[Dict[str, Any]]) -> Optional[bool]:
+        """Claim the next message indexes, then write the messages into their buckets
+
+        None if the conversation is not bucketed (or missing); see
+        DatabaseService._append_to_buckets.
+        """
+        reserved = await self.conversations_collection.find_one_and_update(
+            message_buckets.bucketed_filter(conversation_id),
+            message_buckets.reserve_messages_update(len(new_messages), set_fields, datetime.utcnow()),
+            projection=message_buckets.RESERVE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if reserved is None:
+            return None
+        await self.message_buckets_collection.bulk_write(
+            message_buckets.reserved_append_operations(conversation_id, new_messages, reserved)
+        )
+        return True
+
+    # Roleplay session operations
+    async def create_roleplay_session(self, session: RoleplaySession) -> Optional[str]:
+        """Create a new roleplay session"""
+        try:
+            with self.operation():
+                result = await self.roleplay_sessions_collection.insert_one(session.to_dict())
+                return str(result.inserted_id)
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error creating roleplay session: {e}")
+            return None
+
+    async def get_roleplay_session(self, session_id: str) -> Optional[RoleplaySession]:
+        """Get a specific roleplay session"""
+        try:
+            with self.operation():
+                session_data = await self.roleplay_sessions_collection.find_one(
+                    {"_id": ObjectId(session_id)}
+                )
+                if session_data:
+                    return RoleplaySession.from_dict(session_data)
+                return None
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error getting roleplay session: {e}")
+            return None
+
+    async def append_roleplay_messages(self, session_id: str, messages: List[Message],
+                                             set_fields: Optional[Dict[str, Any]] = None) -> bool:
+        """Atomically append messages to a roleplay session transcript
+
+        set_fields are written in the same update (e.g. the rolling summary).
+        """
+        try:
+            with self.operation():
+                result = await self.roleplay_sessions_collection.update_one(
+                    {"_id": ObjectId(session_id)},
+                    {
+                        "$push": {"messages": {"$each": [msg.to_dict() for msg in messages]}},
+                        "$set": {**(set_fields or {}), "updated_at": datetime.utcnow()},
+                        "$inc": {"message_count": len(messages)}
+                    }
+                )
+                return result.modified_count > 0
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error appending roleplay messages: {e}")
+            return False
+
+    async def end_roleplay_session(self, session_id: str, critique: str) -> bool:
+        """Mark a roleplay session as ended and store its critique"""
+        try:
+            with self.operation():
+                result = await self.roleplay_sessions_collection.update_one(
+                    {"_id": ObjectId(session_id)},
+                    {"$set": {"status": "ended", "critique": critique, "updated_at": datetime.utcnow()}}
+                )
+                return result.modified_count > 0
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error ending roleplay session: {e}")
+            return False
+
+# Global async database service instance (client is created on first use,
+# inside the event loop that serves requests)
+async_db_service = AsyncDatabaseService()
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+class ServiceUnavailableError(Exception):
+    """Raised instead of calling a dependency whose circuit is open, or when
+    a call to it fails for availability reasons (unreachable, timed out)
+
+    `service` names the dependency; `retry_after` is a hint in seconds.
+    """
+
+    def __init__(self, service: str, message: Optional[str] = None, retry_after: float = 1.0):
+        super().__init__(message or f"{service} is unavailable")
+        self.service = service
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Per-dependency circuit breaker (closed / open / half-open)
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately with ServiceUnavailableError instead of waiting
+    on timeouts. After `recovery_timeout` seconds up to `half_open_max_calls`
+    probe calls are let through; a success closes the circuit, a failure
+    opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Admit a call or raise ServiceUnavailableError without touching the dependency"""
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < self.recovery_timeout:
+                    self.rejected += 1
+                    raise ServiceUnavailableError(self.name, retry_after=self.recovery_timeout - waited)
+                self.state = self.HALF_OPEN
+                self._probes = 0
+                print(f"Circuit '{self.name}' half-open, probing")
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise ServiceUnavailableError(self.name)
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                print(f"Circuit '{self.name}' closed")
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self.consecutive_failures += 1
+            if error is not None:
+                self.last_error = str(error)
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    print(f"Circuit '{self.name}' opened: {self.last_error}")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """The call ended without telling us anything about the dependency's health"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    @contextmanager
+    def guard(self, is_failure: Callable[[BaseException], bool] = lambda e: True,
+              is_neutral: Callable[[BaseException], bool] = lambda e: False):
+        """Run the block as one call through the breaker
+
+        Exceptions for which is_failure is true count against the
+        dependency; is_neutral ones (e.g. our own deadline) count as
+        neither; any other exception means the dependency answered.
+        """
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_neutral(e):
+                self.record_neutral()
+            elif is_failure(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            # Cancellation or a closed stream generator
+            self.record_neutral()
+            raise
+        else:
+            self.record_success()
+
+    def call(self, fn: Callable[[], Any], **kwargs) -> Any:
+        with self.guard(**kwargs):
+            return fn()
+
+    def reset_after_fork(self):
+        """Start closed with a fresh lock in a forked child"""
+        self.__init__(self.name, self.failure_threshold, self.recovery_timeout, self.half_open_max_calls)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self.state
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = max(0.0, round(self.recovery_timeout - (time.monotonic() - self.opened_at), 2))
+            return {
+                "state": state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in_seconds": retry_in,
+                "last_error": self.last_error,
+            }
+
+def create_circuit_breaker(name: str) -> CircuitBreaker:
+    """Build a breaker configured from <NAME>_BREAKER_* environment settings"""
+    prefix = f"{name.upper()}_BREAKER"
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv(f"{prefix}_FAILURE_THRESHOLD", "5")),
+        recovery_timeout=float(os.getenv(f"{prefix}_RECOVERY_TIMEOUT", "30")),
+    )
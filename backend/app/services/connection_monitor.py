@@ -0,0 +1,95 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+class ConnectionMonitor:
+    """Background health monitor for a database connection
+
+    A daemon thread calls `ping` every `interval` seconds and caches the
+    outcome, so request paths can consult the connection state without a
+    round trip of their own.
+    """
+
+    UNKNOWN = "unknown"
+    HEALTHY = "healthy"
+    UNHEALTHY = "unhealthy"
+
+    def __init__(self, ping: Callable[[], Any], interval: float = 10.0, name: str = "mongodb"):
+        self.ping = ping
+        self.interval = interval
+        self.name = name
+        self.state = self.UNKNOWN
+        self.last_rtt_ms: Optional[float] = None
+        self.last_check: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.reconnect_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.state == self.HEALTHY
+
+    def start(self):
+        """Start the background check loop (no-op if already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        # Fresh event per thread so a stopped loop can never be revived
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name=f"{self.name}-health-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background check loop"""
+        self._stop.set()
+        self._thread = None
+
+    def check_now(self) -> bool:
+        """Run one health check synchronously and record the result"""
+        started = time.perf_counter()
+        try:
+            self.ping()
+        except Exception as e:
+            with self._lock:
+                if self.state != self.UNHEALTHY:
+                    print(f"{self.name} health check failed: {e}")
+                self.state = self.UNHEALTHY
+                self.last_error = str(e)
+                self.consecutive_failures += 1
+                self.last_check = datetime.utcnow()
+            return False
+
+        with self._lock:
+            if self.state == self.UNHEALTHY:
+                print(f"{self.name} connection recovered")
+            self.state = self.HEALTHY
+            self.last_rtt_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.last_error = None
+            self.consecutive_failures = 0
+            self.last_check = datetime.utcnow()
+        return True
+
+    def record_reconnect(self):
+        with self._lock:
+            self.reconnect_count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current health state for readiness probes"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "last_rtt_ms": self.last_rtt_ms,
+                "last_check": self.last_check.isoformat() if self.last_check else None,
+                "last_error": self.last_error,
+                "consecutive_failures": self.consecutive_failures,
+                "reconnect_count": self.reconnect_count,
+            }
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            self.check_now()
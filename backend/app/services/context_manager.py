@@ -0,0 +1,121 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+class ContextPlan:
+    """What to send to the model for one turn of a long conversation
+
+    `recent` holds the newest messages, sent verbatim. `evicted` holds the
+    messages that no longer fit the budget and still have to be folded into
+    the rolling `summary`. `summarized_count` is how many leading messages
+    of the stored transcript the summary covers.
+    """
+
+    def __init__(self, recent: List[Dict[str, str]], evicted: List[Dict[str, str]],
+                 summary: str, summarized_count: int):
+        self.recent = recent
+        self.evicted = evicted
+        self.summary = summary
+        self.summarized_count = summarized_count
+        self.changed = False
+
+    def fold(self, new_summary: str):
+        """Record a summary that now also covers the evicted messages"""
+        self.summary = new_summary
+        self.summarized_count += len(self.evicted)
+        self.evicted = []
+        self.changed = True
+
+    def summary_fields(self) -> Dict[str, Any]:
+        """Fields to persist alongside the turn, empty if the summary is unchanged"""
+        if not self.changed:
+            return {}
+        return {"summary": self.summary, "summarized_count": self.summarized_count}
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Chat messages for the model, with the summary folded into the first user turn"""
+        if not self.summary:
+            return list(self.recent)
+        preamble = f"[Summary of the earlier conversation]\n{self.summary}\n[End of summary]"
+        if self.recent and self.recent[0]['role'] == 'user':
+            first = {'role': 'user', 'content': f"{preamble}\n\n{self.recent[0]['content']}"}
+            return [first] + self.recent[1:]
+        # Keep user/model turns alternating
+        return [{'role': 'user', 'content': preamble}] + list(self.recent)
+
+class ContextManager:
+    """Keeps prompts within a token budget using a rolling summary
+
+    Messages already covered by the stored summary are never re-sent. When
+    the rest of the transcript exceeds the budget, the oldest messages are
+    evicted until it fits `target_ratio` of the budget, so the (paid)
+    summarization call runs every few turns rather than on every turn, and
+    per-turn prompt size stays flat however long the session runs.
+    """
+
+    def __init__(self, token_budget: int = 8000, min_recent_messages: int = 6, target_ratio: float = 0.5):
+        self.token_budget = token_budget
+        self.min_recent_messages = min_recent_messages
+        self.target_ratio = target_ratio
+
+    def plan(self, messages: List[Dict[str, str]], summary: Optional[str] = None,
+             summarized_count: int = 0, offset: int = 0) -> ContextPlan:
+        """Split a transcript into summarized, evicted and recent parts (no I/O)
+
+        `messages` may be the tail of the transcript starting at message
+        number `offset` (at most `summarized_count`); counts stay absolute.
+        """
+        summary = summary or ""
+        summarized_count = min(summarized_count, offset + len(messages))
+        pending = messages[max(0, summarized_count - offset):]
+        budget = self.token_budget - estimate_tokens(summary)
+
+        sizes = [estimate_tokens(msg['content']) for msg in pending]
+        if sum(sizes) <= budget:
+            return ContextPlan(pending, [], summary, summarized_count)
+
+        # Over budget: keep the newest messages that fit the target size
+        target = budget * self.target_ratio
+        keep, used = 0, 0
+        for size in reversed(sizes):
+            if keep >= self.min_recent_messages and used + size > target:
+                break
+            keep += 1
+            used += size
+        split = len(pending) - keep
+        return ContextPlan(pending[split:], pending[:split], summary, summarized_count)
+
+    def prepare(self, messages: List[Dict[str, str]], summary: Optional[str], summarized_count: int,
+                summarize: Callable[[str, List[Dict[str, str]]], Optional[str]], offset: int = 0) -> ContextPlan:
+        """Plan the turn and fold evicted messages into the summary
+
+        `summarize(previous_summary, messages)` returns the updated summary
+        or None on failure; on failure the evicted messages are left out of
+        this turn and folded in on a later one.
+        """
+        plan = self.plan(messages, summary, summarized_count, offset)
+        if plan.evicted:
+            new_summary = summarize(plan.summary, plan.evicted)
+            if new_summary:
+                plan.fold(new_summary)
+        return plan
+
+    async def prepare_async(self, messages: List[Dict[str, str]], summary: Optional[str], summarized_count: int,
+                            summarize: Callable[[str, List[Dict[str, str]]], Awaitable[Optional[str]]],
+                            offset: int = 0) -> ContextPlan:
+        """Async variant of prepare"""
+        plan = self.plan(messages, summary, summarized_count, offset)
+        if plan.evicted:
+            new_summary = await summarize(plan.summary, plan.evicted)
+            if new_summary:
+                plan.fold(new_summary)
+        return plan
+
+# Global context manager instance
+context_manager = ContextManager(
+    token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000")),
+    min_recent_messages=int(os.getenv("CONTEXT_MIN_RECENT_MESSAGES", "6"))
+)
@@ -1,112 +1,404 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from pymongo.database import Database
 from pymongo.collection import Collection
-from typing import Optional, List, Dict, Any
+from pymongo.errors import ConnectionFailure, PyMongoError
+from typing import Optional, List, Dict, Any, Tuple, Callable, Union
 from ..models.user import User
-from ..models.conversation import Conversation
+from ..models.conversation import Conversation, Message
+from ..models.roleplay_session import RoleplaySession
+from . import index_service, message_buckets
+from .connection_monitor import ConnectionMonitor
+from .ttl_cache import TTLCache
+from .circuit_breaker import ServiceUnavailableError, create_circuit_breaker
+from .deadline import DeadlineExceeded, check_deadline, remaining_time
+from contextlib import contextmanager
+from bson import ObjectId
+from datetime import datetime
+import atexit
+import base64
 import os
+import threading
+import time
+
+def encode_conversation_cursor(updated_at: datetime, conversation_id: ObjectId) -> str:
+    """Encode a (updated_at, _id) listing position as an opaque cursor"""
+    raw = f"{updated_at.isoformat()}|{conversation_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_conversation_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a listing cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, conversation_id = raw.split("|", 1)
+        return datetime.fromisoformat(updated_at), ObjectId(conversation_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# A message position: an index into the conversation or a message timestamp
+MessageCursor = Union[int, datetime]
+
+def message_window_pipeline(conversation_id: ObjectId, limit: int = 50,
+                            before: Optional[MessageCursor] = None,
+                            after: Optional[MessageCursor] = None,
+                            since_summary: bool = False) -> List[Dict[str, Any]]:
+    """Aggregation returning a conversation with one range of its messages
+    
+    The range is cut with $slice on the server, so only the selected
+    messages are sent and decoded. Without a cursor the newest `limit`
+    messages are selected; `before`/`after` select up to `limit` messages
+    before/after a message index or timestamp (exclusive). `since_summary`
+    selects every message the rolling summary does not cover yet, which is
+    all a new turn needs. The index of the first selected message is
+    returned as `message_offset`.
+    
+    Bucketed conversations (see message_buckets) have no embedded array:
+    their bounds come from the stored message_count and the messages are
+    read from their buckets afterwards. Timestamp cursors cannot be
+    resolved here for them and are resolved against the buckets instead.
+    """
+    messages = {"$ifNull": ["$messages", []]}
+    
+    def count_where(op: str, timestamp: datetime) -> Dict[str, Any]:
+        # Messages are appended in time order, so this is the index of the boundary
+        return {"$size": {"$filter": {"input": messages, "as": "m", "cond": {op: ["$$m.timestamp", timestamp]}}}}
+    
+    if since_summary:
+        bounds = [{"_start": {"$min": [{"$ifNull": ["$summarized_count", 0]}, "$_total"]}, "_end": "$_total"}]
+    elif after is not None:
+        start = count_where("$lte", after) if isinstance(after, datetime) else {"$min": [after + 1, "$_total"]}
+        bounds = [{"_start": start}, {"_end": {"$min": [{"$add": ["$_start", limit]}, "$_total"]}}]
+    else:
+        if before is None:
+            end = "$_total"
+        elif isinstance(before, datetime):
+            end = count_where("$lt", before)
+        else:
+            end = {"$min": [before, "$_total"]}
+        bounds = [{"_end": end}, {"_start": {"$max": [0, {"$subtract": ["$_end", limit]}]}}]
+    
+    return [
+        {"$match": {"_id": conversation_id}},
+        {"$addFields": {"_total": {"$cond": [
+            {"$eq": ["$" + message_buckets.STORAGE_FIELD, message_buckets.STORAGE_BUCKETS]},
+            {"$ifNull": ["$message_count", 0]},
+            {"$size": messages}
+        ]}}},
+        *({"$addFields": fields} for fields in bounds),
+        {"$project": {
+            "user_id": 1, "title": 1, "summary": 1, "summarized_count": 1, "created_at": 1, "updated_at": 1,
+            "message_count": "$_total",
+            "message_offset": "$_start",
+            "message_end": "$_end",
+            message_buckets.STORAGE_FIELD: 1, "bucket_size": 1, "tail_bucket_seq": 1,
+            "messages": {"$cond": [
+                {"$gt": ["$_end", "$_start"]},
+                {"$slice": [messages, "$_start", {"$subtract": ["$_end", "$_start"]}]},
+                []
+            ]}
+        }}
+    ]
+
+def connection_options() -> Dict[str, Any]:
+    """MongoDB client options, with pool sizing configurable per deployment"""
+    return {
+        # Outer bounds only; requests under with_deadline use their remaining
+        # budget instead (pymongo client-side operation timeout)
+        'serverSelectionTimeoutMS': int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+        'connectTimeoutMS': int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "30000")),
+        'socketTimeoutMS': int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "30000")),
+        'maxPoolSize': int(os.getenv("MONGODB_MAX_POOL_SIZE", "50")),
+        'minPoolSize': int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        'maxIdleTimeMS': int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000")),
+        'waitQueueTimeoutMS': int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+        'retryWrites': True,                # Enable retry writes
+        'retryReads': True,                 # Enable retry reads
+        'tls': True,                        # Enable TLS for Atlas
+        'tlsAllowInvalidCertificates': True, # Allow invalid certificates
+    }
+
+# Shared by the sync and async services: both talk to the same cluster
+mongo_breaker = create_circuit_breaker("mongodb")
+
+# Raised by operations instead of being logged and turned into a default
+PROPAGATED_ERRORS = (ServiceUnavailableError, DeadlineExceeded)
+
+def is_availability_error(error: BaseException) -> bool:
+    """Errors meaning MongoDB is unreachable or too slow, not that the operation was invalid"""
+    if isinstance(error, (ConnectionFailure, ConnectionError)):
+        return True
+    return isinstance(error, PyMongoError) and error.timeout
+
+def deadline_passed(error: BaseException) -> bool:
+    """The request ran out of its own time budget; says nothing about MongoDB"""
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+@contextmanager
+def guarded_operation(connect):
+    """Run one database operation through the MongoDB circuit breaker
+    
+    While the circuit is open this raises ServiceUnavailableError without
+    any network I/O. Availability failures are raised as
+    ServiceUnavailableError (DeadlineExceeded if the request's own deadline
+    is what ran out); other errors propagate unchanged.
+    """
+    try:
+        with mongo_breaker.guard(is_failure=is_availability_error, is_neutral=deadline_passed):
+            connect()
+            yield
+    except PROPAGATED_ERRORS:
+        raise
+    except Exception as e:
+        check_deadline()
+        if is_availability_error(e):
+            raise ServiceUnavailableError("mongodb", str(e)) from e
+        raise
 
 class DatabaseService:
+    """MongoDB access with one pooled client per worker process
+    
+    The client is created lazily on first use, and recreated if the process
+    has forked since (pre-fork servers like gunicorn), because MongoClient is
+    not fork-safe. It is closed only when the process exits.
+    """
+    
     def __init__(self, mongo_uri: Optional[str] = None):
         self.mongo_uri = mongo_uri or os.getenv("MONGODB_URI")
         self.client: Optional[MongoClient] = None
         self.db: Optional[Database] = None
         self.users_collection: Optional[Collection] = None
         self.conversations_collection: Optional[Collection] = None
-        # Auto-connect on initialization
-        self.connect()
+        self.message_buckets_collection: Optional[Collection] = None
+        self.roleplay_sessions_collection: Optional[Collection] = None
+        self._pid: Optional[int] = None
+        self._connect_lock = threading.Lock()
+        self._atexit_registered = False
+        # Connection health is checked in the background instead of per operation
+        self.monitor = self._new_monitor()
+        # Minimum seconds between reconnect attempts while unhealthy
+        self.reconnect_interval = float(os.getenv("MONGODB_RECONNECT_INTERVAL", "5"))
+        self._last_reconnect_attempt = 0.0
+        self._reconnect_lock = threading.Lock()
+        # Read-through cache of User objects by auth0_id; writes invalidate it
+        self.user_cache = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+        )
+        # Called with the auth0_id of every user written by this worker, e.g.
+        # to publish the invalidation to other workers (see invalidate_user)
+        self.user_invalidation_hook: Optional[Callable[[str], None]] = None
+    
+    def _new_monitor(self) -> ConnectionMonitor:
+        return ConnectionMonitor(
+            self._ping,
+            interval=float(os.getenv("MONGODB_HEALTH_CHECK_INTERVAL", "10"))
+        )
+    
+    def _ping(self):
+        if self.client is None:
+            raise ConnectionError("MongoDB client is not initialized")
+        self.client.admin.command('ping')
+    
+    def reset_after_fork(self):
+        """Drop state inherited from the parent process without closing it
+        
+        The parent still owns the client's sockets, and the monitor thread
+        does not survive fork. Also called from the server's post_fork hook
+        (see app/workers.py).
+        """
+        self.client = None
+        self._pid = None
+        self.db = None
+        self.users_collection = None
+        self.conversations_collection = None
+        self.message_buckets_collection = None
+        self.roleplay_sessions_collection = None
+        self.monitor = self._new_monitor()
+        self._connect_lock = threading.Lock()
+        self._reconnect_lock = threading.Lock()
+        self._atexit_registered = False
+        self.user_cache.reset_after_fork()
     
     def connect(self):
         """Connect to MongoDB"""
+        if self._pid is not None and self._pid != os.getpid():
+            self.reset_after_fork()
+        
+        with self._connect_lock:
+            try:
+                if self.client is None:
+                    self._install(MongoClient(self.mongo_uri, **connection_options()))
+                    self.monitor.start()
+                    if not self._atexit_registered:
+                        atexit.register(self.disconnect)
+                        self._atexit_registered = True
+                    
+                    # Test the connection
+                    if self.monitor.check_now():
+                        print("Connected to MongoDB Atlas successfully")
+                        self.ensure_indexes()
+                    else:
+                        print(f"Error connecting to MongoDB: {self.monitor.last_error}")
+            except Exception as e:
+                print(f"Error connecting to MongoDB: {e}")
+                # Don't raise the exception, just log it
+                # This allows the app to start even if MongoDB is not available
+    
+    def _install(self, client: MongoClient):
+        """Point the service at a client's database and collections
+        
+        Requests read these attributes without a lock, so the collections
+        are set before the client that marks the service as connected.
+        """
+        db = client.get_database()
+        self.db = db
+        self.users_collection = db.users
+        self.conversations_collection = db.conversations
+        self.message_buckets_collection = db[message_buckets.BUCKETS_COLLECTION]
+        self.roleplay_sessions_collection = db.roleplay_sessions
+        self._pid = os.getpid()
+        self.client = client
+    
+    def reconnect(self):
+        """Replace the client after the monitor has marked it unhealthy
+        
+        The new client is built first and swapped in under the connect lock,
+        so concurrent requests always see a usable client and collections;
+        the old client is closed afterwards. The monitor keeps running.
+        """
         try:
-            if self.client is None:
-                # MongoDB Atlas connection options
-                connection_options = {
-                    'serverSelectionTimeoutMS': 30000,  # 30 second timeout
-                    'connectTimeoutMS': 30000,          # 30 second connection timeout
-                    'socketTimeoutMS': 30000,           # 30 second socket timeout
-                    'maxPoolSize': 10,                  # Connection pool size
-                    'retryWrites': True,                # Enable retry writes
-                    'retryReads': True,                 # Enable retry reads
-                    'tls': True,                        # Enable TLS for Atlas
-                    'tlsAllowInvalidCertificates': True, # Allow invalid certificates
-                }
-                
-                self.client = MongoClient(self.mongo_uri, **connection_options)
-                self.db = self.client.get_database()
-                self.users_collection = self.db.users
-                self.conversations_collection = self.db.conversations
-                
-                # Test the connection
-                self.client.admin.command('ping')
-                print("Connected to MongoDB Atlas successfully")
+            client = MongoClient(self.mongo_uri, **connection_options())
+            with self._connect_lock:
+                old_client = self.client
+                self._install(client)
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
-            # Don't raise the exception, just log it
-            # This allows the app to start even if MongoDB is not available
+            print(f"Error reconnecting to MongoDB: {e}")
+            return
+        self.monitor.record_reconnect()
+        if old_client is not None:
+            old_client.close()
+        if self.monitor.check_now():
+            print("Reconnected to MongoDB Atlas")
     
     def ensure_connection(self):
-        """Ensure MongoDB connection is active"""
-        try:
-            if self.client is None:
-                self.connect()
-                
-            # Test the connection
-            self.client.admin.command('ping')
-        except Exception as e:
-            print(f"MongoDB connection lost, reconnecting: {e}")
+        """Ensure MongoDB connection is usable, based on the monitor's cached state
+        
+        Raises ConnectionError without touching the network when the
+        connection is known to be down and a reconnect is not yet due.
+        """
+        if self.client is None or self._pid != os.getpid():
             self.connect()
-            
+        
+        if self.monitor.state != ConnectionMonitor.UNHEALTHY:
+            return
+        
+        # Let one caller per interval try to reconnect; everyone else fails fast
+        now = time.monotonic()
+        if now - self._last_reconnect_attempt >= self.reconnect_interval and self._reconnect_lock.acquire(blocking=False):
+            try:
+                self._last_reconnect_attempt = now
+                print("MongoDB connection unhealthy, reconnecting")
+                self.reconnect()
+            finally:
+                self._reconnect_lock.release()
+            if self.monitor.is_healthy:
+                return
+        
+        raise ConnectionError(f"MongoDB is unavailable: {self.monitor.last_error}")
+    
+    def operation(self):
+        """Context manager wrapping one operation (see guarded_operation)"""
+        return guarded_operation(self.ensure_connection)
+    
+    def get_health(self) -> Dict[str, Any]:
+        """Connection health for readiness probes"""
+        health = self.monitor.snapshot()
+        health["connected"] = self.client is not None
+        health["circuit_breaker"] = mongo_breaker.snapshot()
+        return health
     
     def disconnect(self):
-        """Disconnect from MongoDB"""
+        """Disconnect from MongoDB at shutdown (reconnect swaps clients instead)"""
+        self.monitor.stop()
         if self.client:
             self.client.close()
             self.client = None
             self.db = None
             self.users_collection = None
             self.conversations_collection = None
+            self.message_buckets_collection = None
+            self.roleplay_sessions_collection = None
+    
+    def ensure_indexes(self) -> List[str]:
+        """Create the indexes the service's queries depend on (idempotent)"""
+        try:
+            return index_service.ensure_indexes(self.db)
+        except Exception as e:
+            print(f"Error creating MongoDB indexes: {e}")
+            return []
+    
+    def verify_query_plans(self) -> Dict[str, List[str]]:
+        """Explain each service query and report any COLLSCAN or SORT stages"""
+        self.ensure_connection()
+        return index_service.verify_query_plans(self.db)
     
     # User operations
     def create_user(self, user: User) -> bool:
         """Create a new user"""
         try:
-            self.ensure_connection()
-            result = self.users_collection.insert_one(user.to_dict())
-            return result.inserted_id is not None
+            with self.operation():
+                result = self.users_collection.insert_one(user.to_dict())
+                return result.inserted_id is not None
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error creating user: {e}")
             return False
     
+    def invalidate_user(self, auth0_id: str, propagate: bool = True):
+        """Drop a user from the cache
+        
+        With propagate, user_invalidation_hook is told too so other workers
+        can drop their copy; they should call this with propagate=False.
+        """
+        self.user_cache.delete(auth0_id)
+        if propagate and self.user_invalidation_hook is not None:
+            try:
+                self.user_invalidation_hook(auth0_id)
+            except Exception as e:
+                print(f"Error propagating user cache invalidation: {e}")
+    
     def get_user_by_auth0_id(self, auth0_id: str) -> Optional[User]:
-        """Get user by Auth0 ID"""
+        """Get user by Auth0 ID (cached; treat the result as read-only)"""
+        cached_user = self.user_cache.get(auth0_id)
+        if cached_user is not None:
+            return cached_user
+        
         try:
-            self.ensure_connection()
-            user_data = self.users_collection.find_one({"auth0_id": auth0_id})
-            if user_data:
-                return User.from_dict(user_data)
-            return None
+            with self.operation():
+                user_data = self.users_collection.find_one({"auth0_id": auth0_id})
+                if user_data:
+                    user = User.from_dict(user_data)
+                    self.user_cache.set(auth0_id, user)
+                    return user
+                return None
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error getting user: {e}")
-            # Return a mock user when database is unavailable
-            # This allows the API to continue working
-            from datetime import datetime
-            return User(
-                auth0_id=auth0_id,
-                name="User",
-                email="user@example.com",
-                username="user"
-            )
+            return None
     
     def user_exists(self, auth0_id: str) -> bool:
         """Check if user exists in database"""
         try:
-            self.ensure_connection()
-            user_data = self.users_collection.find_one(
-                {"auth0_id": auth0_id}, 
-                {"_id": 1}  # Only get the ID to check existence
-            )
-            return user_data is not None
+            with self.operation():
+                user_data = self.users_collection.find_one(
+                    {"auth0_id": auth0_id}, 
+                    {"_id": 1}  # Only get the ID to check existence
+                )
+                return user_data is not None
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error checking user existence: {e}")
             return False
@@ -114,22 +406,24 @@ class DatabaseService:
     def get_user_status(self, auth0_id: str) -> Dict[str, Any]:
         """Get user status and basic info"""
         try:
-            self.ensure_connection()
-            user_data = self.users_collection.find_one(
-                {"auth0_id": auth0_id},
-                {"auth0_id": 1, "name": 1,"email": 1, "username": 1, "created_at": 1, "updated_at": 1}
-            )
-            if user_data:
-                return {
-                    "exists": True,
-                    "auth0_id": user_data.get("auth0_id"),
-                    "name": user_data.get("name"),
-                    "email": user_data.get("email"),
-                    "username": user_data.get("username"),
-                    "created_at": user_data.get("created_at"),
-                    "updated_at": user_data.get("updated_at")
-                }
-            return {"exists": False}
+            with self.operation():
+                user_data = self.users_collection.find_one(
+                    {"auth0_id": auth0_id},
+                    {"auth0_id": 1, "name": 1,"email": 1, "username": 1, "created_at": 1, "updated_at": 1}
+                )
+                if user_data:
+                    return {
+                        "exists": True,
+                        "auth0_id": user_data.get("auth0_id"),
+                        "name": user_data.get("name"),
+                        "email": user_data.get("email"),
+                        "username": user_data.get("username"),
+                        "created_at": user_data.get("created_at"),
+                        "updated_at": user_data.get("updated_at")
+                    }
+                return {"exists": False}
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error getting user status: {e}")
             return {"exists": False, "error": str(e)}
@@ -137,45 +431,112 @@ class DatabaseService:
     def update_user(self, auth0_id: str, updates: Dict[str, Any]) -> bool:
         """Update user information"""
         try:
-            self.ensure_connection()
-            from datetime import datetime
-            updates["updated_at"] = datetime.utcnow()
-            result = self.users_collection.update_one(
-                {"auth0_id": auth0_id},
-                {"$set": updates}
-            )
-            return result.modified_count > 0
+            with self.operation():
+                from datetime import datetime
+                updates["updated_at"] = datetime.utcnow()
+                result = self.users_collection.update_one(
+                    {"auth0_id": auth0_id},
+                    {"$set": updates}
+                )
+                return result.modified_count > 0
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error updating user: {e}")
             return False
+        finally:
+            self.invalidate_user(auth0_id)
     
     def upsert_user(self, user: User) -> bool:
         """Create or update user (upsert operation)"""
         try:
-            self.ensure_connection()
-            from datetime import datetime
-            user_dict = user.to_dict()
-            user_dict["updated_at"] = datetime.utcnow()
-            
-            result = self.users_collection.update_one(
-                {"auth0_id": user.auth0_id},
-                {"$set": user_dict},
-                upsert=True
-            )
-            return True
+            with self.operation():
+                from datetime import datetime
+                user_dict = user.to_dict()
+                user_dict["updated_at"] = datetime.utcnow()
+                # Keep the original creation time of existing users
+                created_at = user_dict.pop("created_at")
+                
+                result = self.users_collection.update_one(
+                    {"auth0_id": user.auth0_id},
+                    {"$set": user_dict, "$setOnInsert": {"created_at": created_at}},
+                    upsert=True
+                )
+                return result.acknowledged
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error upserting user: {e}")
-            # Return True to prevent the API from failing completely
-            # This allows the frontend to continue working even if DB is down
-            return True
+            return False
+        finally:
+            self.invalidate_user(user.auth0_id)
+    
+    def sync_user(self, user: User) -> Optional[User]:
+        """Create or refresh a user from Auth0 claims in one round trip
+        
+        A hash of the claims is stored with the user; when it matches, the
+        update leaves the document untouched (no write, no updated_at bump).
+        created_at is only set on insert. Returns the stored user, or None
+        on failure.
+        """
+        claims_hash = user.claims_hash()
+        now = datetime.utcnow()
+        # BSON dates have millisecond precision; truncate so `now` compares equal after the round trip
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        changed = {"$ne": [{"$ifNull": ["$claims_hash", None]}, claims_hash]}
+        try:
+            with self.operation():
+                user_data = self.users_collection.find_one_and_update(
+                    {"auth0_id": user.auth0_id},
+                    [{"$set": {
+                        **{
+                            field: {"$cond": [changed, {"$literal": value}, f"${field}"]}
+                            for field, value in user.claims().items()
+                        },
+                        "claims_hash": claims_hash,
+                        "QuestionnaireData": {"$ifNull": ["$QuestionnaireData", {"$literal": {}}]},
+                        "created_at": {"$ifNull": ["$created_at", now]},
+                        "updated_at": {"$cond": [changed, now, "$updated_at"]}
+                    }}],
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                if not user_data:
+                    return None
+                
+                stored_user = User.from_dict(user_data)
+                if user_data.get("updated_at") == now:
+                    # The claims changed: other workers' copies are stale
+                    self.invalidate_user(user.auth0_id)
+                self.user_cache.set(user.auth0_id, stored_user)
+                return stored_user
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error syncing user: {e}")
+            return None
     
     # Conversation operations
     def create_conversation(self, conversation: Conversation) -> str:
-        """Create a new conversation"""
+        """Create a new conversation, stored as MESSAGE_STORAGE_MODE says"""
         try:
-            self.ensure_connection()
-            result = self.conversations_collection.insert_one(conversation.to_dict())
-            return str(result.inserted_id)
+            with self.operation():
+                conversation_data = conversation.to_dict()
+                if message_buckets.storage_mode() != message_buckets.STORAGE_BUCKETS:
+                    result = self.conversations_collection.insert_one(conversation_data)
+                    return str(result.inserted_id)
+                
+                messages = conversation_data.pop("messages", [])
+                bucket_size = message_buckets.default_bucket_size()
+                conversation_data.update(message_buckets.bucketed_conversation_fields(len(messages), bucket_size))
+                result = self.conversations_collection.insert_one(conversation_data)
+                if messages:
+                    self.message_buckets_collection.insert_many(
+                        message_buckets.bucket_documents(result.inserted_id, messages, bucket_size)
+                    )
+                return str(result.inserted_id)
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error creating conversation: {e}")
             return None
@@ -183,57 +544,333 @@ class DatabaseService:
     def get_user_conversations(self, user_id: str) -> List[Conversation]:
         """Get all conversations for a user"""
         try:
-            self.ensure_connection()
-            conversations_data = self.conversations_collection.find(
-                {"user_id": user_id}
-            ).sort("updated_at", -1)
-            
-            return [Conversation.from_dict(conv) for conv in conversations_data]
+            with self.operation():
+                conversations_data = self.conversations_collection.find(
+                    {"user_id": user_id}
+                ).sort("updated_at", -1)
+                
+                return [Conversation.from_dict(conv) for conv in conversations_data]
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error getting conversations: {e}")
             return []
     
+    def get_user_conversation_summaries(self, user_id: str, limit: int = 20,
+                                        cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get one page of conversation summaries (no messages), newest first
+        
+        Pages are keyed on (updated_at, _id) so concurrent updates never skip
+        or repeat entries. Returns the summaries and the cursor of the next
+        page, or None when this is the last page. Raises ValueError for a
+        malformed cursor.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if cursor:
+            updated_at, last_id = decode_conversation_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": last_id}}
+            ]
+        
+        try:
+            with self.operation():
+                conversations_data = list(self.conversations_collection.find(
+                    query,
+                    {
+                        "title": 1,
+                        "created_at": 1,
+                        "updated_at": 1,
+                        # Older documents have no stored count; size the array server-side
+                        "message_count": {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]}
+                    }
+                ).sort([("updated_at", -1), ("_id", -1)]).limit(limit + 1))
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error getting conversation summaries: {e}")
+            return [], None
+        
+        next_cursor = None
+        if len(conversations_data) > limit:
+            conversations_data = conversations_data[:limit]
+            last = conversations_data[-1]
+            next_cursor = encode_conversation_cursor(last["updated_at"], last["_id"])
+        
+        summaries = [
+            {
+                "id": str(conv["_id"]),
+                "title": conv.get("title", "New Conversation"),
+                "created_at": conv.get("created_at"),
+                "updated_at": conv.get("updated_at"),
+                "message_count": conv.get("message_count", 0)
+            }
+            for conv in conversations_data
+        ]
+        return summaries, next_cursor
+    
     def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
         """Get a specific conversation"""
         try:
-            self.ensure_connection()
-            from bson import ObjectId
-            conversation_data = self.conversations_collection.find_one(
-                {"_id": ObjectId(conversation_id)}
-            )
-            if conversation_data:
+            with self.operation():
+                from bson import ObjectId
+                conversation_data = self.conversations_collection.find_one(
+                    {"_id": ObjectId(conversation_id)}
+                )
+                if conversation_data:
+                    if message_buckets.is_bucketed(conversation_data):
+                        conversation_data["messages"] = self._read_bucket_messages(
+                            conversation_data, 0, conversation_data.get("message_count", 0)
+                        )
+                    return Conversation.from_dict(conversation_data)
+                return None
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error getting conversation: {e}")
+            return None
+    
+    def get_conversation_window(self, conversation_id: str, limit: int = 50,
+                                before: Optional[MessageCursor] = None, after: Optional[MessageCursor] = None,
+                                since_summary: bool = False) -> Optional[Conversation]:
+        """Get a conversation holding one range of its messages (see message_window_pipeline)"""
+        try:
+            with self.operation():
+                documents = list(self.conversations_collection.aggregate(
+                    message_window_pipeline(ObjectId(conversation_id), limit, before, after, since_summary)
+                ))
+                if not documents:
+                    return None
+                conversation_data = documents[0]
+                if message_buckets.is_bucketed(conversation_data):
+                    start, end = conversation_data["message_offset"], conversation_data["message_end"]
+                    cursor = after if after is not None else before
+                    if not since_summary and isinstance(cursor, datetime):
+                        position = self._bucket_position(conversation_data["_id"], cursor, inclusive=after is not None)
+                        start, end = message_buckets.timestamp_window(
+                            position, conversation_data["message_count"], limit, after is not None
+                        )
+                    conversation_data["message_offset"] = start
+                    conversation_data["messages"] = self._read_bucket_messages(conversation_data, start, end)
                 return Conversation.from_dict(conversation_data)
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error getting conversation messages: {e}")
             return None
+    
+    def _read_bucket_messages(self, conversation_data: Dict[str, Any], start: int, end: int) -> List[Dict[str, Any]]:
+        """Messages [start, end) of a bucketed conversation, read from the buckets holding them"""
+        if end <= start:
+            return []
+        buckets = self.message_buckets_collection.find(
+            message_buckets.bucket_range_filter(
+                conversation_data["_id"], start, end,
+                conversation_data["bucket_size"], conversation_data.get("tail_bucket_seq")
+            ),
+            {"messages": 1}
+        ).sort("bucket_seq", 1)
+        return message_buckets.messages_in_range(buckets, start, end)
+    
+    def _bucket_position(self, conversation_id: ObjectId, timestamp: datetime, inclusive: bool) -> int:
+        """Number of messages before (or, if inclusive, at or before) a timestamp in a bucketed conversation"""
+        documents = list(self.message_buckets_collection.aggregate(
+            message_buckets.timestamp_position_pipeline(conversation_id, timestamp, inclusive)
+        ))
+        return documents[0]["position"] if documents else 0
+    
+    def get_conversation_meta(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get a conversation's owner, title, updated_at and message_count without its messages"""
+        try:
+            with self.operation():
+                return self.conversations_collection.find_one(
+                    {"_id": ObjectId(conversation_id)},
+                    {"user_id": 1, "title": 1, "updated_at": 1, "message_count": 1}
+                )
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
-            print(f"Error getting conversation: {e}")
+            print(f"Error getting conversation metadata: {e}")
             return None
     
+    def get_conversation_owner(self, conversation_id: str) -> Optional[str]:
+        """Get the user_id owning a conversation without loading its messages"""
+        conversation_data = self.get_conversation_meta(conversation_id)
+        return conversation_data.get("user_id") if conversation_data else None
+    
     def update_conversation(self, conversation_id: str, conversation: Conversation) -> bool:
-        """Update a conversation"""
+        """Update a conversation stored with embedded messages
+        
+        Bucketed conversations are only changed through append_messages.
+        """
         try:
-            self.ensure_connection()
-            from bson import ObjectId
-            result = self.conversations_collection.update_one(
-                {"_id": ObjectId(conversation_id)},
-                {"$set": conversation.to_dict()}
-            )
-            return result.modified_count > 0
+            with self.operation():
+                from bson import ObjectId
+                result = self.conversations_collection.update_one(
+                    {"_id": ObjectId(conversation_id),
+                     message_buckets.STORAGE_FIELD: {"$ne": message_buckets.STORAGE_BUCKETS}},
+                    {"$set": conversation.to_dict()}
+                )
+                return result.modified_count > 0
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error updating conversation: {e}")
             return False
     
-    def delete_conversation(self, conversation_id: str) -> bool:
-        """Delete a conversation"""
+    def append_messages(self, conversation_id: str, messages: List[Message],
+                              set_fields: Optional[Dict[str, Any]] = None) -> bool:
+        """Atomically append messages to a conversation without rewriting earlier ones
+        
+        set_fields are written in the same update (e.g. the rolling summary).
+        The storage MESSAGE_STORAGE_MODE selects is tried first, so while a
+        migration is under way each append costs one extra update at most.
+        """
         try:
-            self.ensure_connection()
-            from bson import ObjectId
-            result = self.conversations_collection.delete_one(
-                {"_id": ObjectId(conversation_id)}
+            with self.operation():
+                new_messages = [msg.to_dict() for msg in messages]
+                attempts = [self._append_embedded, self._append_to_buckets]
+                if message_buckets.storage_mode() == message_buckets.STORAGE_BUCKETS:
+                    attempts.reverse()
+                for attempt in attempts:
+                    appended = attempt(ObjectId(conversation_id), new_messages, set_fields)
+                    if appended is not None:
+                        return appended
+                return False
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error appending messages: {e}")
+            return False
+    
+    def _append_embedded(self, conversation_id: ObjectId, new_messages: List[Dict[str, Any]],
+                         set_fields: Optional[Dict[str, Any]]) -> Optional[bool]:
+        """Push onto the embedded array; None if the conversation is bucketed (or missing)"""
+        now = datetime.utcnow()
+        result = self.conversations_collection.update_one(
+            message_buckets.embedded_append_filter(conversation_id),
+            message_buckets.embedded_append_update(new_messages, set_fields, now)
+        )
+        if result.matched_count == 0:
+            # Documents written before message_count existed
+            result = self.conversations_collection.update_one(
+                message_buckets.embedded_append_filter(conversation_id, counted=False),
+                message_buckets.legacy_embedded_append_update(new_messages, set_fields, now)
             )
-            return result.deleted_count > 0
+        if result.matched_count == 0:
+            return None
+        return result.modified_count > 0
+    
+    def _append_to_buckets(self, conversation_id: ObjectId, new_messages: List[Dict[str, Any]],
+                           set_fields: Optional[Dict[str, Any]]) -> Optional[bool]:
+        """Claim the next message indexes, then write the messages into their buckets
+        
+        None if the conversation is not bucketed (or missing). If the bucket
+        write fails after the claim, the claimed indexes stay empty; readers
+        select messages by index, so later messages keep their positions.
+        """
+        reserved = self.conversations_collection.find_one_and_update(
+            message_buckets.bucketed_filter(conversation_id),
+            message_buckets.reserve_messages_update(len(new_messages), set_fields, datetime.utcnow()),
+            projection=message_buckets.RESERVE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if reserved is None:
+            return None
+        self.message_buckets_collection.bulk_write(
+            message_buckets.reserved_append_operations(conversation_id, new_messages, reserved)
+        )
+        return True
+    
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Delete a conversation, and its message buckets if it is bucketed"""
+        try:
+            with self.operation():
+                from bson import ObjectId
+                conversation_data = self.conversations_collection.find_one(
+                    {"_id": ObjectId(conversation_id)}, {message_buckets.STORAGE_FIELD: 1}
+                )
+                if conversation_data is None:
+                    return False
+                if message_buckets.is_bucketed(conversation_data):
+                    # Buckets first, so a failed delete can be retried without orphaning them
+                    self.message_buckets_collection.delete_many({"conversation_id": ObjectId(conversation_id)})
+                result = self.conversations_collection.delete_one(
+                    {"_id": ObjectId(conversation_id)}
+                )
+                return result.deleted_count > 0
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error deleting conversation: {e}")
             return False
 
+    # Roleplay session operations
+    def create_roleplay_session(self, session: RoleplaySession) -> Optional[str]:
+        """Create a new roleplay session"""
+        try:
+            with self.operation():
+                result = self.roleplay_sessions_collection.insert_one(session.to_dict())
+                return str(result.inserted_id)
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error creating roleplay session: {e}")
+            return None
+    
+    def get_roleplay_session(self, session_id: str) -> Optional[RoleplaySession]:
+        """Get a specific roleplay session"""
+        try:
+            with self.operation():
+                session_data = self.roleplay_sessions_collection.find_one(
+                    {"_id": ObjectId(session_id)}
+                )
+                if session_data:
+                    return RoleplaySession.from_dict(session_data)
+                return None
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error getting roleplay session: {e}")
+            return None
+    
+    def append_roleplay_messages(self, session_id: str, messages: List[Message],
+                                       set_fields: Optional[Dict[str, Any]] = None) -> bool:
+        """Atomically append messages to a roleplay session transcript
+        
+        set_fields are written in the same update (e.g. the rolling summary).
+        """
+        try:
+            with self.operation():
+                result = self.roleplay_sessions_collection.update_one(
+                    {"_id": ObjectId(session_id)},
+                    {
+                        "$push": {"messages": {"$each": [msg.to_dict() for msg in messages]}},
+                        "$set": {**(set_fields or {}), "updated_at": datetime.utcnow()},
+                        "$inc": {"message_count": len(messages)}
+                    }
+                )
+                return result.modified_count > 0
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error appending roleplay messages: {e}")
+            return False
+    
+    def end_roleplay_session(self, session_id: str, critique: str) -> bool:
+        """Mark a roleplay session as ended and store its critique"""
+        try:
+            with self.operation():
+                result = self.roleplay_sessions_collection.update_one(
+                    {"_id": ObjectId(session_id)},
+                    {"$set": {"status": "ended", "critique": critique, "updated_at": datetime.utcnow()}}
+                )
+                return result.modified_count > 0
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error ending roleplay session: {e}")
+            return False
+
 # Global database service instance
-db_service = DatabaseService() 
\ No newline at end of file
+db_service = DatabaseService() 
@@ -0,0 +1,63 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import pymongo
+
+# Time budgets in seconds per route group; override with REQUEST_DEADLINE_<NAME>
+ROUTE_DEADLINES: Dict[str, float] = {
+    'default': 10.0,
+    'chat_message': 30.0,
+    'generate': 30.0,
+    'start_roleplay': 30.0,
+    'continue_roleplay': 20.0,
+    'end_roleplay': 60.0,
+}
+
+# Absolute time.monotonic() deadline of the current request, if any
+_deadline: ContextVar[Optional[float]] = ContextVar('request_deadline', default=None)
+
+class DeadlineExceeded(Exception):
+    """Raised when the current request has used up its time budget"""
+
+def route_deadline(name: str) -> float:
+    """Time budget in seconds for a route group"""
+    return float(os.getenv(f"REQUEST_DEADLINE_{name.upper()}", ROUTE_DEADLINES[name]))
+
+def current_deadline() -> Optional[float]:
+    """Absolute monotonic deadline of the current request, None outside one"""
+    return _deadline.get()
+
+def remaining_time(deadline: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the deadline (default: the current request's)"""
+    deadline = current_deadline() if deadline is None else deadline
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def check_deadline(deadline: Optional[float] = None):
+    """Raise DeadlineExceeded once the deadline has passed"""
+    remaining = remaining_time(deadline)
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Run the block under a deadline `seconds` from now
+
+    Nested scopes never extend an outer deadline. Mongo operations in the
+    block inherit the remaining budget through pymongo's client-side
+    operation timeout.
+    """
+    deadline = time.monotonic() + seconds
+    outer = current_deadline()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        with pymongo.timeout(max(deadline - time.monotonic(), 0.001)):
+            yield deadline
+    finally:
+        _deadline.reset(token)
@@ -1,17 +1,342 @@
-import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
 import os
+import threading
+from contextlib import AsyncExitStack, ExitStack
 
 from dotenv import load_dotenv; load_dotenv()
 
+from .response_cache import create_response_cache
+from .single_flight import create_single_flight
+from .llm_dispatcher import (
+    AsyncHeldStream, HeldStream, LLMOverloadedError, create_llm_dispatcher, is_local_rejection,
+    is_upstream_outage, public_error
+)
+from .deadline import DeadlineExceeded, check_deadline, remaining_time
+from .circuit_breaker import ServiceUnavailableError, create_circuit_breaker
+
+# Raised to the route (503/504 handlers) instead of becoming an error result
+PROPAGATED_ERRORS = (LLMOverloadedError, DeadlineExceeded, ServiceUnavailableError)
+
 class GeminiService:
+    """Gemini access for the chat routes
+    
+    Construction is cheap and offline: the google.generativeai SDK is
+    imported and the model created on first use, and recreated in a forked
+    worker because the SDK's gRPC channels are not fork-safe.
+    """
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY is required")
+        self.model_name = 'gemini-2.5-flash'
+        # Part of the response cache key, so changing settings never serves stale text
+        self.generation_config: Dict[str, Any] = {}
+        self._model = None
+        self._pid: Optional[int] = None
+        self._model_lock = threading.Lock()
+        self.response_cache = create_response_cache()
+        self.single_flight = create_single_flight()
+        self.dispatcher = create_llm_dispatcher()
+        self.breaker = create_circuit_breaker("gemini")
+    
+    @property
+    def model(self):
+        """The GenerativeModel, created on first use in each process"""
+        if self._model is None or self._pid != os.getpid():
+            with self._model_lock:
+                if self._model is None or self._pid != os.getpid():
+                    if not self.api_key:
+                        raise ValueError("GEMINI_API_KEY is required")
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(
+                        model_name=self.model_name, generation_config=self.generation_config or None
+                    )
+                    self._pid = os.getpid()
+        return self._model
+    
+    def reset_after_fork(self):
+        """Rebuild per-process state in a forked worker: model, locks, queues and caches"""
+        self._model = None
+        self._pid = None
+        self._model_lock = threading.Lock()
+        for component in (self.response_cache, self.single_flight, self.dispatcher, self.breaker):
+            component.reset_after_fork()
+    
+    def to_gemini_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Convert stored chat messages to the Gemini content format"""
+        gemini_messages = []
+        for msg in messages:
+            if msg['role'] == 'user':
+                gemini_messages.append({
+                    'role': 'user',
+                    'parts': [msg['content']]
+                })
+            elif msg['role'] == 'assistant':
+                gemini_messages.append({
+                    'role': 'model',
+                    'parts': [msg['content']]
+                })
+        return gemini_messages
+    
+    def build_roleplay_prompt(self, profile: Dict[str, Any]) -> str:
+        """Build the roleplay setup prompt for a comprehensive user profile"""
+        # Create descriptive mappings for better prompts
+        scenario_descriptions = {
+            'salary_negotiation': 'Practice salary discussions and career advancement conversations',
+            'difficult_feedback': 'Learn to deliver constructive criticism professionally',
+            'boundary_setting': 'Practice saying no professionally and managing workload',
+            'conflict_resolution': 'Navigate disagreements and tensions with coworkers',
+            'idea_pitching': 'Present proposals and get buy-in from stakeholders',
+            'performance_discussion': 'Address performance issues constructively',
+            'resource_request': 'Make compelling cases for what your team needs'
+        }
+        
+        relationship_descriptions = {
+            'direct_manager': 'Your direct manager/boss',
+            'senior_leadership': 'Senior leadership (VP, C-suite)',
+            'peer_colleague': 'Peer/colleague at your level',
+            'team_member': 'Someone on your team',
+            'cross_functional': 'Someone from another department',
+            'client_external': 'External client or stakeholder'
+        }
+        
+        communication_style_descriptions = {
+            'supportive_collaborative': 'Listens well, asks questions, generally encouraging',
+            'direct_no_nonsense': 'Gets straight to the point, values efficiency over rapport',
+            'skeptical_analytical': 'Questions everything, wants data and proof points',
+            'busy_impatient': 'Always rushing, interrupts, hard to get their attention',
+            'defensive_territorial': 'Protective of their domain, resistant to change',
+            'unpredictable_moody': 'Hard to read, reactions vary depending on their mood'
+        }
+        
+        prompt = f"""You are an AI roleplay partner for workplace conversation practice. Your job is to roleplay as a specific character and provide an immersive, realistic workplace conversation experience.
+
+ROLEPLAY CHARACTER SETUP:
+- Relationship to user: {relationship_descriptions.get(profile.get('relationship', ''), profile.get('relationship', ''))}
+- Communication style: {profile.get('communication_style', '')} - {communication_style_descriptions.get(profile.get('communication_style', ''), '')}
+- Industry context: {profile.get('industry', '')}
+- Conversation difficulty: {profile.get('challenge_level', '')}
+- Timeline pressure: {profile.get('time_constraint', '')}
+
+USER CONTEXT:
+- Role level: {profile.get('job_level', '')}
+- Scenario type: {profile.get('scenario_type', '')} - {scenario_descriptions.get(profile.get('scenario_type', ''), '')}
+- Specific goal: {profile.get('specific_goal', '')}
+- Stakes level: {profile.get('stakes', '')}
+- User's natural style: {profile.get('personal_style', '')}
+- Past experience: {profile.get('past_experience', '')}
+
+INSTRUCTIONS:
+1. Create a realistic workplace scenario setting (time, place, brief context)
+2. Stay completely in character - be authentic to your communication style
+3. Provide appropriate resistance/support based on the challenge level:
+   - Low challenge: Generally receptive, minor concerns only
+   - Medium challenge: Some pushback, need convincing, ask clarifying questions
+   - High challenge: Significant resistance, skeptical, may interrupt or dismiss initially
+4. Do NOT break character to give coaching advice during the roleplay
+5. Respond as this person would naturally respond in this workplace situation
+6. Keep responses concise and realistic (2-4 sentences typically)
+
+Start by briefly setting the scene (1 sentence) and then make your opening statement as this character. Begin the roleplay now."""
+        return prompt
+    
+    def build_continue_prompt(self, roleplay_context: str, conversation_history: List[Dict[str, str]],
+                              summary: Optional[str] = None) -> str:
+        """Build the prompt used to continue a roleplay from its transcript
+        
+        When the earlier part of a long roleplay has been folded into a
+        rolling summary, only the remaining turns are given verbatim.
+        """
+        parts = [roleplay_context, "\n\n"]
+        if summary:
+            parts.append(f"SUMMARY OF THE CONVERSATION SO FAR:\n{summary}\n\nMOST RECENT EXCHANGES:\n")
+        else:
+            parts.append("CONVERSATION SO FAR:\n")
+        
+        for msg in conversation_history:
+            if msg['role'] == 'user':
+                parts.append(f"USER: {msg['content']}\n")
+            elif msg['role'] == 'assistant':
+                parts.append(f"CHARACTER: {msg['content']}\n")
+        
+        parts.append("\nContinue the roleplay as this character. Stay in character and respond naturally to the user's latest message. Keep your response concise and realistic.")
+        return "".join(parts)
+    
+    def build_summary_prompt(self, previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        """Build the prompt that folds older messages into a rolling summary"""
+        transcript = "".join(
+            f"{'USER' if msg['role'] == 'user' else 'ASSISTANT'}: {msg['content']}\n"
+            for msg in messages
+        )
+        return f"""You maintain a running summary of a workplace communication practice conversation so it can be continued without the full transcript.
+
+CURRENT SUMMARY:
+{previous_summary or '(none yet)'}
+
+NEW MESSAGES TO FOLD IN:
+{transcript}
+Write the updated summary in at most 200 words. Keep names, facts, commitments, positions each side has taken and the emotional tone. Write plain prose without headings or lists."""
+    
+    def build_critique_prompt(self, profile: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> str:
+        """Build the coaching feedback prompt for a finished roleplay"""
+        # Build conversation transcript
+        transcript = ""
+        for msg in conversation_history:
+            if msg['role'] == 'user':
+                transcript += f"USER: {msg['content']}\n"
+            elif msg['role'] == 'assistant' and not msg['content'].startswith('You are an AI roleplay'):
+                transcript += f"CHARACTER: {msg['content']}\n"
+        
+        prompt = f"""You are an expert workplace communication coach. A user just completed a roleplay practice session for: {profile.get('scenario_type', '')} - {profile.get('specific_goal', '')}.
+
+USER CONTEXT:
+- Role level: {profile.get('job_level', '')}
+- Communication goal: {profile.get('specific_goal', '')}
+- Challenge level: {profile.get('challenge_level', '')}
+- Stakes: {profile.get('stakes', '')}
+- User's natural style: {profile.get('personal_style', '')}
+- Past experience: {profile.get('past_experience', '')}
+
+ROLEPLAY TRANSCRIPT:
+{transcript}
+
+Provide comprehensive coaching feedback with the following sections. Use clear formatting but avoid special characters like hashtags or asterisks:
+
+1. Overall Performance Summary:
+[2-3 sentence summary of how the conversation went overall]
+
+2. Score and Rationale:
+Score: [X]/10
+[Detailed explanation of the score considering: clarity of communication, professionalism, effectiveness in achieving their goal, handling of pushback, and overall confidence]
+
+3. What You Did Well:
+- [Specific strength 1 with example from transcript]
+- [Specific strength 2 with example from transcript]
+- [Specific strength 3 with example from transcript]
+
+4. Areas for Improvement:
+- [Specific area 1 with concrete suggestion]
+- [Specific area 2 with concrete suggestion]
+- [Specific area 3 with concrete suggestion]
+
+5. Recommended Next Steps:
+[2-3 specific actionable recommendations for continued improvement]
+
+6. Key Phrases to Practice:
+[3-4 specific phrases or approaches they could use in similar future conversations]
+
+Focus on being constructive, specific, and actionable in your feedback."""
+        return prompt
+    
+    def request_options(self, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Per-call SDK options: the request's remaining time budget as timeout"""
+        remaining = remaining_time(deadline)
+        if remaining is None:
+            return {}
+        return {'timeout': max(remaining, 0.001)}
+    
+    def generate_text(self, contents: Any, endpoint: Optional[str] = None) -> str:
+        """
+        Generate the full text for a prompt
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(model_name='gemini-2.5-flash')
+        Args:
+            contents: A prompt string or a list of Gemini-format messages
+            endpoint: Cache endpoint name; responses are cached only for
+                endpoints enabled in GEMINI_CACHE_ENDPOINTS
+        
+        Concurrent calls with the same prompt fingerprint are coalesced
+        into a single upstream request. Raises DeadlineExceeded once the
+        request deadline has passed.
+        
+        Returns:
+            The generated text
+        """
+        key = self.response_cache.make_key(self.model_name, contents, self.generation_config)
+        cacheable = self.response_cache.is_enabled(endpoint)
+        if cacheable:
+            cached = self.response_cache.get(endpoint, key)
+            if cached is not None:
+                return cached
+        
+        check_deadline()
+        
+        def call() -> str:
+            # An open circuit fails here, before taking a dispatcher slot
+            with self.breaker.guard(is_failure=is_upstream_outage, is_neutral=is_local_rejection):
+                response = self.dispatcher.call(
+                    lambda: self.model.generate_content(contents, request_options=self.request_options())
+                )
+            text = response.text
+            if cacheable:
+                self.response_cache.set(key, text)
+            return text
+        
+        try:
+            # Identical concurrent prompts (double submits, popular scenarios)
+            # share one upstream call
+            return self.single_flight.do(key, call)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            # A call cut short by the request deadline is reported as such
+            check_deadline()
+            raise
+    
+    def stream_text(self, contents: Any, deadline: Optional[float] = None) -> HeldStream:
+        """
+        Stream generated text from Gemini as it is produced
+        
+        Args:
+            contents: A prompt string or a list of Gemini-format messages
+            deadline: Optional monotonic deadline; the stream stops with
+                DeadlineExceeded once it passes
+        
+        The circuit breaker and a dispatcher slot are taken before this
+        returns, so an open circuit or a full queue raises here and the
+        route answers 503 before it starts streaming. Close the stream if
+        it is not read to the end.
+        
+        Returns:
+            An iterator of non-empty text chunks in generation order
+        """
+        check_deadline(deadline)
+        with ExitStack() as held:
+            # An open circuit fails here, before taking a dispatcher slot
+            held.enter_context(self.breaker.guard(is_failure=is_upstream_outage, is_neutral=is_local_rejection))
+            held.enter_context(self.dispatcher.slot())
+            return HeldStream(self._stream_chunks(contents, deadline), held.pop_all())
+    
+    def _stream_chunks(self, contents: Any, deadline: Optional[float]) -> Iterator[str]:
+        response = self.dispatcher.with_retries(
+            lambda: self.model.generate_content(contents, stream=True, request_options=self.request_options(deadline))
+        )
+        for chunk in response:
+            check_deadline(deadline)
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) carry nothing to show
+                continue
+            if text:
+                yield text
+    
+    def stream_response(self, messages: List[Dict[str, str]], deadline: Optional[float] = None) -> HeldStream:
+        """Streaming variant of generate_response"""
+        return self.stream_text(self.to_gemini_messages(messages), deadline)
+    
+    def stream_continue_roleplay(self, roleplay_context: str, conversation_history: List[Dict[str, str]],
+                                 summary: Optional[str] = None, deadline: Optional[float] = None) -> HeldStream:
+        """Streaming variant of continue_roleplay"""
+        return self.stream_text(self.build_continue_prompt(roleplay_context, conversation_history, summary), deadline)
+    
+    def summarize_messages(self, previous_summary: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Fold messages into a rolling conversation summary; None on failure"""
+        try:
+            text = self.generate_text(self.build_summary_prompt(previous_summary, messages))
+            return text.strip()
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
     
     def generate_response(self, messages: List[Dict[str, str]], conversation_id: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -26,33 +351,25 @@ class GeminiService:
         """
         try:
             # Convert messages to Gemini format
-            gemini_messages = []
-            for msg in messages:
-                if msg['role'] == 'user':
-                    gemini_messages.append({
-                        'role': 'user',
-                        'parts': [msg['content']]
-                    })
-                elif msg['role'] == 'assistant':
-                    gemini_messages.append({
-                        'role': 'model',
-                        'parts': [msg['content']]
-                    })
+            gemini_messages = self.to_gemini_messages(messages)
             
             # Generate response
-            response = self.model.generate_content(gemini_messages)
+            text = self.generate_text(gemini_messages)
             
             return {
                 'success': True,
-                'response': response.text,
+                'response': text,
                 'conversation_id': conversation_id,
                 'model': 'gemini-2.5-flash'
             }
             
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
+            print(f"Gemini request failed: {e}")
             return {
                 'success': False,
-                'error': str(e),
+                'error': public_error(e),
                 'conversation_id': conversation_id
             }
     
@@ -67,18 +384,21 @@ class GeminiService:
             Dictionary containing the response and metadata
         """
         try:
-            response = self.model.generate_content(prompt)
+            text = self.generate_text(prompt, endpoint='single_response')
             
             return {
                 'success': True,
-                'response': response.text,
+                'response': text,
                 'model': 'gemini-2.5-flash'
             }
             
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
+            print(f"Gemini request failed: {e}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': public_error(e)
             }
     
     def generate_scenario_and_roleplay(self, profile: Dict[str, Any]) -> Dict[str, Any]:
@@ -103,115 +423,58 @@ class GeminiService:
             Dictionary containing the scenario setup and initial roleplay response
         """
         try:
-            # Create descriptive mappings for better prompts
-            scenario_descriptions = {
-                'salary_negotiation': 'Practice salary discussions and career advancement conversations',
-                'difficult_feedback': 'Learn to deliver constructive criticism professionally',
-                'boundary_setting': 'Practice saying no professionally and managing workload',
-                'conflict_resolution': 'Navigate disagreements and tensions with coworkers',
-                'idea_pitching': 'Present proposals and get buy-in from stakeholders',
-                'performance_discussion': 'Address performance issues constructively',
-                'resource_request': 'Make compelling cases for what your team needs'
-            }
-            
-            relationship_descriptions = {
-                'direct_manager': 'Your direct manager/boss',
-                'senior_leadership': 'Senior leadership (VP, C-suite)',
-                'peer_colleague': 'Peer/colleague at your level',
-                'team_member': 'Someone on your team',
-                'cross_functional': 'Someone from another department',
-                'client_external': 'External client or stakeholder'
-            }
-            
-            communication_style_descriptions = {
-                'supportive_collaborative': 'Listens well, asks questions, generally encouraging',
-                'direct_no_nonsense': 'Gets straight to the point, values efficiency over rapport',
-                'skeptical_analytical': 'Questions everything, wants data and proof points',
-                'busy_impatient': 'Always rushing, interrupts, hard to get their attention',
-                'defensive_territorial': 'Protective of their domain, resistant to change',
-                'unpredictable_moody': 'Hard to read, reactions vary depending on their mood'
-            }
-            
-            prompt = f"""You are an AI roleplay partner for workplace conversation practice. Your job is to roleplay as a specific character and provide an immersive, realistic workplace conversation experience.
-
-ROLEPLAY CHARACTER SETUP:
-- Relationship to user: {relationship_descriptions.get(profile.get('relationship', ''), profile.get('relationship', ''))}
-- Communication style: {profile.get('communication_style', '')} - {communication_style_descriptions.get(profile.get('communication_style', ''), '')}
-- Industry context: {profile.get('industry', '')}
-- Conversation difficulty: {profile.get('challenge_level', '')}
-- Timeline pressure: {profile.get('time_constraint', '')}
-
-USER CONTEXT:
-- Role level: {profile.get('job_level', '')}
-- Scenario type: {profile.get('scenario_type', '')} - {scenario_descriptions.get(profile.get('scenario_type', ''), '')}
-- Specific goal: {profile.get('specific_goal', '')}
-- Stakes level: {profile.get('stakes', '')}
-- User's natural style: {profile.get('personal_style', '')}
-- Past experience: {profile.get('past_experience', '')}
-
-INSTRUCTIONS:
-1. Create a realistic workplace scenario setting (time, place, brief context)
-2. Stay completely in character - be authentic to your communication style
-3. Provide appropriate resistance/support based on the challenge level:
-   - Low challenge: Generally receptive, minor concerns only
-   - Medium challenge: Some pushback, need convincing, ask clarifying questions
-   - High challenge: Significant resistance, skeptical, may interrupt or dismiss initially
-4. Do NOT break character to give coaching advice during the roleplay
-5. Respond as this person would naturally respond in this workplace situation
-6. Keep responses concise and realistic (2-4 sentences typically)
-
-Start by briefly setting the scene (1 sentence) and then make your opening statement as this character. Begin the roleplay now."""
+            prompt = self.build_roleplay_prompt(profile)
 
-            response = self.model.generate_content(prompt)
+            text = self.generate_text(prompt, endpoint='scenario')
             
             return {
                 'success': True,
-                'scenario_and_response': response.text.strip(),
+                'scenario_and_response': text.strip(),
                 'roleplay_prompt': prompt,  # Store for continued conversation
                 'model': 'gemini-2.5-flash'
             }
             
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
+            print(f"Gemini request failed: {e}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': public_error(e)
             }
     
-    def continue_roleplay(self, roleplay_context: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
+    def continue_roleplay(self, roleplay_context: str, conversation_history: List[Dict[str, str]],
+                          summary: Optional[str] = None) -> Dict[str, Any]:
         """
         Continue the roleplay conversation
         
         Args:
             roleplay_context: The original roleplay setup prompt
             conversation_history: List of previous messages in the roleplay
+            summary: Optional rolling summary of messages left out of the history
         
         Returns:
             Dictionary containing the continued roleplay response
         """
         try:
             # Build the full conversation context
-            full_prompt = roleplay_context + "\n\nCONVERSATION SO FAR:\n"
-            
-            for msg in conversation_history:
-                if msg['role'] == 'user':
-                    full_prompt += f"USER: {msg['content']}\n"
-                elif msg['role'] == 'assistant':
-                    full_prompt += f"CHARACTER: {msg['content']}\n"
+            full_prompt = self.build_continue_prompt(roleplay_context, conversation_history, summary)
             
-            full_prompt += "\nContinue the roleplay as this character. Stay in character and respond naturally to the user's latest message. Keep your response concise and realistic."
-            
-            response = self.model.generate_content(full_prompt)
+            text = self.generate_text(full_prompt)
             
             return {
                 'success': True,
-                'response': response.text.strip(),
+                'response': text.strip(),
                 'model': 'gemini-2.5-flash'
             }
             
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
+            print(f"Gemini request failed: {e}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': public_error(e)
             }
     
     def end_roleplay_and_critique(self, profile: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
@@ -226,66 +489,181 @@ Start by briefly setting the scene (1 sentence) and then make your opening state
             Dictionary containing detailed feedback and coaching
         """
         try:
-            # Build conversation transcript
-            transcript = ""
-            for msg in conversation_history:
-                if msg['role'] == 'user':
-                    transcript += f"USER: {msg['content']}\n"
-                elif msg['role'] == 'assistant' and not msg['content'].startswith('You are an AI roleplay'):
-                    transcript += f"CHARACTER: {msg['content']}\n"
-            
-            prompt = f"""You are an expert workplace communication coach. A user just completed a roleplay practice session for: {profile.get('scenario_type', '')} - {profile.get('specific_goal', '')}.
-
-USER CONTEXT:
-- Role level: {profile.get('job_level', '')}
-- Communication goal: {profile.get('specific_goal', '')}
-- Challenge level: {profile.get('challenge_level', '')}
-- Stakes: {profile.get('stakes', '')}
-- User's natural style: {profile.get('personal_style', '')}
-- Past experience: {profile.get('past_experience', '')}
-
-ROLEPLAY TRANSCRIPT:
-{transcript}
-
-Provide comprehensive coaching feedback with the following sections. Use clear formatting but avoid special characters like hashtags or asterisks:
-
-1. Overall Performance Summary:
-[2-3 sentence summary of how the conversation went overall]
-
-2. Score and Rationale:
-Score: [X]/10
-[Detailed explanation of the score considering: clarity of communication, professionalism, effectiveness in achieving their goal, handling of pushback, and overall confidence]
-
-3. What You Did Well:
-- [Specific strength 1 with example from transcript]
-- [Specific strength 2 with example from transcript]
-- [Specific strength 3 with example from transcript]
-
-4. Areas for Improvement:
-- [Specific area 1 with concrete suggestion]
-- [Specific area 2 with concrete suggestion]
-- [Specific area 3 with concrete suggestion]
-
-5. Recommended Next Steps:
-[2-3 specific actionable recommendations for continued improvement]
-
-6. Key Phrases to Practice:
-[3-4 specific phrases or approaches they could use in similar future conversations]
-
-Focus on being constructive, specific, and actionable in your feedback."""
+            prompt = self.build_critique_prompt(profile, conversation_history)
 
-            response = self.model.generate_content(prompt)
+            text = self.generate_text(prompt)
             
             return {
                 'success': True,
-                'critique': response.text.strip(),
+                'critique': text.strip(),
                 'model': 'gemini-2.5-flash'
             }
             
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Gemini request failed: {e}")
+            return {
+                'success': False,
+                'error': public_error(e)
+            }
+    
+    # Async variants used by the ASGI app; they share prompt building and
+    # result shapes with the blocking methods above
+    async def generate_text_async(self, contents: Any, endpoint: Optional[str] = None) -> str:
+        """Async variant of generate_text"""
+        key = self.response_cache.make_key(self.model_name, contents, self.generation_config)
+        cacheable = self.response_cache.is_enabled(endpoint)
+        if cacheable:
+            cached = self.response_cache.get(endpoint, key)
+            if cached is not None:
+                return cached
+        
+        check_deadline()
+        
+        async def call() -> str:
+            with self.breaker.guard(is_failure=is_upstream_outage, is_neutral=is_local_rejection):
+                response = await self.dispatcher.call_async(
+                    lambda: self.model.generate_content_async(contents, request_options=self.request_options())
+                )
+            text = response.text
+            if cacheable:
+                self.response_cache.set(key, text)
+            return text
+        
+        try:
+            return await self.single_flight.do_async(key, call)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            check_deadline()
+            raise
+    
+    async def stream_text_async(self, contents: Any, deadline: Optional[float] = None) -> AsyncHeldStream:
+        """Async variant of stream_text (await it, then iterate the stream)"""
+        check_deadline(deadline)
+        async with AsyncExitStack() as held:
+            held.enter_context(self.breaker.guard(is_failure=is_upstream_outage, is_neutral=is_local_rejection))
+            await held.enter_async_context(self.dispatcher.slot_async())
+            return AsyncHeldStream(self._stream_chunks_async(contents, deadline), held.pop_all())
+    
+    async def _stream_chunks_async(self, contents: Any, deadline: Optional[float]) -> AsyncIterator[str]:
+        response = await self.dispatcher.with_retries_async(
+            lambda: self.model.generate_content_async(contents, stream=True, request_options=self.request_options(deadline))
+        )
+        async for chunk in response:
+            check_deadline(deadline)
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+    
+    async def generate_response_async(self, messages: List[Dict[str, str]], conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Async variant of generate_response"""
+        try:
+            text = await self.generate_text_async(self.to_gemini_messages(messages))
+            return {
+                'success': True,
+                'response': text,
+                'conversation_id': conversation_id,
+                'model': 'gemini-2.5-flash'
+            }
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Gemini request failed: {e}")
+            return {
+                'success': False,
+                'error': public_error(e),
+                'conversation_id': conversation_id
+            }
+    
+    async def generate_single_response_async(self, prompt: str) -> Dict[str, Any]:
+        """Async variant of generate_single_response"""
+        try:
+            text = await self.generate_text_async(prompt, endpoint='single_response')
+            return {
+                'success': True,
+                'response': text,
+                'model': 'gemini-2.5-flash'
+            }
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Gemini request failed: {e}")
+            return {
+                'success': False,
+                'error': public_error(e)
+            }
+    
+    async def generate_scenario_and_roleplay_async(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_scenario_and_roleplay"""
+        try:
+            prompt = self.build_roleplay_prompt(profile)
+            text = await self.generate_text_async(prompt, endpoint='scenario')
+            return {
+                'success': True,
+                'scenario_and_response': text.strip(),
+                'roleplay_prompt': prompt,
+                'model': 'gemini-2.5-flash'
+            }
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Gemini request failed: {e}")
+            return {
+                'success': False,
+                'error': public_error(e)
+            }
+    
+    async def summarize_messages_async(self, previous_summary: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Async variant of summarize_messages"""
+        try:
+            text = await self.generate_text_async(self.build_summary_prompt(previous_summary, messages))
+            return text.strip()
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
+    
+    async def continue_roleplay_async(self, roleplay_context: str, conversation_history: List[Dict[str, str]],
+                                      summary: Optional[str] = None) -> Dict[str, Any]:
+        """Async variant of continue_roleplay"""
+        try:
+            full_prompt = self.build_continue_prompt(roleplay_context, conversation_history, summary)
+            text = await self.generate_text_async(full_prompt)
+            return {
+                'success': True,
+                'response': text.strip(),
+                'model': 'gemini-2.5-flash'
+            }
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Gemini request failed: {e}")
+            return {
+                'success': False,
+                'error': public_error(e)
+            }
+    
+    async def end_roleplay_and_critique_async(self, profile: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Async variant of end_roleplay_and_critique"""
+        try:
+            prompt = self.build_critique_prompt(profile, conversation_history)
+            text = await self.generate_text_async(prompt)
+            return {
+                'success': True,
+                'critique': text.strip(),
+                'model': 'gemini-2.5-flash'
+            }
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
+            print(f"Gemini request failed: {e}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': public_error(e)
             }
     
     # Keep the old method for backward compatibility
@@ -330,18 +708,21 @@ Provide the following sections in your feedback. Do not use any special formatti
 
 Format your output clearly, using simple line breaks for separation between sections and bullet points.
 """
-            response = self.model.generate_content(prompt)
+            text = self.generate_text(prompt)
             
             return {
                 'success': True,
-                'critique': response.text.strip(),
+                'critique': text.strip(),
                 'model': 'gemini-2.5-flash'
             }
             
+        except PROPAGATED_ERRORS:
+            raise
         except Exception as e:
+            print(f"Gemini request failed: {e}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': public_error(e)
             }
     
     def get_model_info(self) -> Dict[str, Any]:
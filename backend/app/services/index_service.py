@@ -0,0 +1,140 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.database import Database
+from bson import ObjectId
+from datetime import datetime
+from typing import Any, Dict, List
+import os
+
+# Roleplay sessions are deleted this long after their last update
+ROLEPLAY_SESSION_TTL_SECONDS = int(float(os.getenv("ROLEPLAY_SESSION_TTL_DAYS", "30")) * 86400)
+
+# Indexes every query issued by DatabaseService relies on, plus TTL cleanup, per collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    'users': [
+        IndexModel([("auth0_id", ASCENDING)], name="auth0_id_unique", unique=True),
+    ],
+    'conversations': [
+        # Serves the per-user listing sorted by recency; _id breaks ties for
+        # the (updated_at, _id) pagination cursor
+        IndexModel(
+            [("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_id_updated_at_id"
+        ),
+    ],
+    'roleplay_sessions': [
+        # Abandoned and finished sessions expire instead of accumulating
+        IndexModel(
+            [("updated_at", ASCENDING)],
+            name="updated_at_ttl", expireAfterSeconds=ROLEPLAY_SESSION_TTL_SECONDS
+        ),
+    ],
+    'message_buckets': [
+        # One bucket per (conversation, sequence number); serves bucket range
+        # reads, appends, timestamp lookups and deletes
+        IndexModel(
+            [("conversation_id", ASCENDING), ("bucket_seq", ASCENDING)],
+            name="conversation_id_bucket_seq_unique", unique=True
+        ),
+    ],
+}
+
+# Plan stages that mean a query is not served by an index
+BAD_PLAN_STAGES = {"COLLSCAN", "SORT"}
+
+def query_shapes() -> List[Dict[str, Any]]:
+    """Representative instances of every query DatabaseService runs
+
+    Values are placeholders; only the shape matters to the planner.
+    """
+    auth0_id = "auth0|query-plan-check"
+    now = datetime.utcnow()
+    return [
+        {
+            "name": "users.find_by_auth0_id",
+            "collection": "users",
+            "filter": {"auth0_id": auth0_id},
+        },
+        {
+            "name": "conversations.find_by_id",
+            "collection": "conversations",
+            "filter": {"_id": ObjectId()},
+        },
+        {
+            "name": "roleplay_sessions.find_by_id",
+            "collection": "roleplay_sessions",
+            "filter": {"_id": ObjectId()},
+        },
+        {
+            "name": "conversations.list_by_user",
+            "collection": "conversations",
+            "filter": {"user_id": auth0_id},
+            "sort": [("updated_at", DESCENDING), ("_id", DESCENDING)],
+            "limit": 21,
+        },
+        {
+            "name": "conversations.list_by_user_after_cursor",
+            "collection": "conversations",
+            "filter": {
+                "user_id": auth0_id,
+                "$or": [
+                    {"updated_at": {"$lt": now}},
+                    {"updated_at": now, "_id": {"$lt": ObjectId()}},
+                ],
+            },
+            "sort": [("updated_at", DESCENDING), ("_id", DESCENDING)],
+            "limit": 21,
+        },
+        {
+            "name": "message_buckets.range",
+            "collection": "message_buckets",
+            "filter": {"conversation_id": ObjectId(), "bucket_seq": {"$gte": 0, "$lte": 1}},
+            "sort": [("bucket_seq", ASCENDING)],
+        },
+        {
+            "name": "message_buckets.by_conversation",
+            "collection": "message_buckets",
+            "filter": {"conversation_id": ObjectId()},
+        },
+    ]
+
+def ensure_indexes(db: Database) -> List[str]:
+    """Create any missing indexes; returns the index names per collection"""
+    created = []
+    for collection_name, indexes in INDEXES.items():
+        created.extend(
+            f"{collection_name}.{name}"
+            for name in db[collection_name].create_indexes(indexes)
+        )
+    return created
+
+def find_bad_stages(plan: Any) -> List[str]:
+    """Collect COLLSCAN/SORT stages anywhere in an explain plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if plan.get("stage") in BAD_PLAN_STAGES:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(find_bad_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(find_bad_stages(item))
+    return stages
+
+def verify_query_plans(db: Database) -> Dict[str, List[str]]:
+    """Explain every query shape and report those whose winning plan scans or sorts
+
+    Returns a mapping of query name to offending stages; empty when all
+    queries are index-backed.
+    """
+    problems = {}
+    for shape in query_shapes():
+        cursor = db[shape["collection"]].find(shape["filter"])
+        if "sort" in shape:
+            cursor = cursor.sort(shape["sort"])
+        if "limit" in shape:
+            cursor = cursor.limit(shape["limit"])
+        explain = cursor.explain()
+        bad_stages = find_bad_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        if bad_stages:
+            problems[shape["name"]] = bad_stages
+    return problems
@@ -0,0 +1,368 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+from .circuit_breaker import ServiceUnavailableError
+from .deadline import DeadlineExceeded, remaining_time
+
+# Upstream statuses worth retrying: rate limited and temporarily unavailable
+RETRYABLE_STATUS_CODES = {429, 503}
+
+# Failures to reach the provider at all (no HTTP status): refused, reset, timed out
+TRANSPORT_ERRORS = (ConnectionError, TimeoutError, asyncio.TimeoutError)
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call is shed: the wait queue is full, the wait
+    timed out, or the provider kept rejecting us for quota/availability.
+
+    `retry_after` is a hint in seconds for the client's Retry-After header.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def upstream_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error (google.api_core exceptions carry .code)"""
+    code = getattr(error, "code", None)
+    try:
+        return int(code) if code is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_hint(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After or RetryInfo"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        try:
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+    try:
+        details = getattr(error, "details", None) or []
+    except Exception:
+        details = []
+    for detail in details:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+def is_local_rejection(error: BaseException) -> bool:
+    """Calls we gave up on ourselves (deadline, full queue); says nothing about the provider"""
+    if isinstance(error, DeadlineExceeded):
+        return True
+    return isinstance(error, LLMOverloadedError) and error.__cause__ is None
+
+def is_upstream_outage(error: BaseException) -> bool:
+    """Failures meaning the provider is down or refusing us, as opposed to a bad
+    request or a local error (e.g. a missing API key)"""
+    if isinstance(error, (LLMOverloadedError,) + TRANSPORT_ERRORS):
+        return True
+    status = upstream_status(error)
+    return status is not None and (status >= 500 or status == 429)
+
+def public_error(error: BaseException) -> str:
+    """Client-safe description of a failed LLM call; details belong in the log"""
+    if isinstance(error, DeadlineExceeded):
+        return "The request took too long. Please try again."
+    if isinstance(error, ServiceUnavailableError):
+        return "The AI service is temporarily unavailable. Please try again shortly."
+    if isinstance(error, LLMOverloadedError) or upstream_status(error) in RETRYABLE_STATUS_CODES:
+        return "The AI service is busy. Please try again shortly."
+    return "The AI service could not complete the request."
+
+class HeldStream:
+    """Iterator over a response stream that owns what was acquired for it
+
+    `held` (a circuit breaker call, a dispatcher slot) is entered before the
+    stream is handed out, so admission fails before a response has started.
+    It is exited when the stream ends, fails or is closed, even if it is
+    closed before its first chunk. Failures reach `held` with their exception;
+    a close before the end counts as GeneratorExit.
+    """
+
+    def __init__(self, chunks: Iterator[Any], held: ExitStack):
+        self._chunks = chunks
+        self._held = held
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self._held.close()
+            raise
+        except BaseException:
+            self._held.__exit__(*sys.exc_info())
+            raise
+
+    def close(self):
+        self._chunks.close()
+        self._held.__exit__(GeneratorExit, GeneratorExit(), None)
+
+class AsyncHeldStream:
+    """Async variant of HeldStream"""
+
+    def __init__(self, chunks: AsyncIterator[Any], held: AsyncExitStack):
+        self._chunks = chunks
+        self._held = held
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            await self._held.aclose()
+            raise
+        except BaseException:
+            await self._held.__aexit__(*sys.exc_info())
+            raise
+
+    async def aclose(self):
+        await self._chunks.aclose()
+        await self._held.__aexit__(GeneratorExit, GeneratorExit(), None)
+
+class _Waiter:
+    """A queued caller; `granted` is set when a released slot is handed to it"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+class LLMDispatcher:
+    """Admission control and retries for upstream LLM calls
+
+    At most `max_in_flight` calls run at once, shared by threads and
+    coroutines in this process. Up to `max_queue` further callers wait in
+    FIFO order for at most `queue_timeout` seconds; beyond that callers are
+    shed immediately with LLMOverloadedError so the route can answer 503
+    instead of piling up threads. Calls rejected with 429/503 are retried
+    with full-jitter exponential backoff, honoring retry-after hints.
+    Queue waits and retries never outlast the current request deadline.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 32, queue_timeout: float = 10.0,
+                 max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 max_retry_after: float = 10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._waiters: "deque[_Waiter]" = deque()
+        self._in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    # Slot accounting (callers hold self._lock)
+    def _try_admit(self) -> bool:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return True
+        return False
+
+    def _enqueue(self, waiter: _Waiter):
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LLMOverloadedError("LLM wait queue is full")
+        self._waiters.append(waiter)
+
+    def _record_wait(self, waited: float):
+        self.admitted += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+
+    def _release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter; in_flight is unchanged
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._in_flight -= 1
+
+    def _queue_wait(self) -> float:
+        """How long a caller may wait for a slot: the queue timeout or the request's remaining budget"""
+        remaining = remaining_time()
+        if remaining is None:
+            return self.queue_timeout
+        return max(0.0, min(self.queue_timeout, remaining))
+
+    def _wait_expired(self) -> Exception:
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            return DeadlineExceeded("Request deadline exceeded while waiting for an LLM slot")
+        return LLMOverloadedError("Timed out waiting for an LLM slot")
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; True if a slot was granted to it meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.timeouts += 1
+            return False
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the duration of the block"""
+        started = time.monotonic()
+        with self._lock:
+            admitted = self._try_admit()
+            if not admitted:
+                waiter = _Waiter()
+                self._enqueue(waiter)
+        if not admitted:
+            waiter.event.wait(self._queue_wait())
+            if not waiter.granted and not self._abandon(waiter):
+                raise self._wait_expired()
+        with self._lock:
+            self._record_wait(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """Async variant of slot"""
+        started = time.monotonic()
+        with self._lock:
+            admitted = self._try_admit()
+            if not admitted:
+                waiter = _Waiter(asyncio.get_running_loop())
+                self._enqueue(waiter)
+        if not admitted:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self._queue_wait())
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._wait_expired()
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self._release()
+                raise
+        with self._lock:
+            self._record_wait(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # Retries
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """Delay before the next attempt; raises when retrying is pointless"""
+        hint = retry_after_hint(error)
+        if attempt >= self.max_retries or (hint is not None and hint > self.max_retry_after):
+            raise LLMOverloadedError("LLM provider is rejecting requests", retry_after=hint or 1.0) from error
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if hint is not None:
+            delay = max(delay, hint)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            # The retry could not finish in time anyway
+            raise DeadlineExceeded("Request deadline exceeded before the LLM retry") from error
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def with_retries(self, fn: Callable[[], Any]) -> Any:
+        """Run fn, retrying 429/503 responses with backoff"""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if upstream_status(e) not in RETRYABLE_STATUS_CODES:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    async def with_retries_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of with_retries"""
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                if upstream_status(e) not in RETRYABLE_STATUS_CODES:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run fn in an in-flight slot with retries"""
+        with self.slot():
+            return self.with_retries(fn)
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of call"""
+        async with self.slot_async():
+            return await self.with_retries_async(fn)
+
+    def reset_after_fork(self):
+        """Drop the parent's slots and waiters (their threads did not survive fork)"""
+        self.__init__(self.max_in_flight, self.max_queue, self.queue_timeout, self.max_retries,
+                      self.base_delay, self.max_delay, self.max_retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "max_queue": self.max_queue,
+                "queue_depth": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "retries": self.retries,
+                "wait_time_avg_ms": round(self.wait_time_total / self.admitted * 1000, 2) if self.admitted else None,
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 2),
+            }
+
+def create_llm_dispatcher() -> LLMDispatcher:
+    """Build the dispatcher from GEMINI_* concurrency and retry settings"""
+    return LLMDispatcher(
+        max_in_flight=int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8")),
+        max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT", "10")),
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+        base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8")),
+        max_retry_after=float(os.getenv("GEMINI_MAX_RETRY_AFTER", "10")),
+    )
@@ -0,0 +1,198 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+
+BUCKETS_COLLECTION = "message_buckets"
+
+# Conversation documents say where their messages live
+STORAGE_FIELD = "storage"
+STORAGE_EMBEDDED = "embedded"  # a `messages` array in the conversation (documents without the field too)
+STORAGE_BUCKETS = "buckets"    # fixed-size documents in the message_buckets collection
+
+STORAGE_MODES = (STORAGE_EMBEDDED, STORAGE_BUCKETS)
+
+def storage_mode() -> str:
+    """Where new conversations keep their messages (MESSAGE_STORAGE_MODE)"""
+    mode = os.getenv("MESSAGE_STORAGE_MODE", STORAGE_EMBEDDED)
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown MESSAGE_STORAGE_MODE '{mode}' (expected one of: {', '.join(STORAGE_MODES)})")
+    return mode
+
+def default_bucket_size() -> int:
+    """Messages per bucket for newly bucketed conversations (MESSAGE_BUCKET_SIZE)
+
+    Stored on each conversation, so changing it never affects existing ones.
+    """
+    return int(os.getenv("MESSAGE_BUCKET_SIZE", "100"))
+
+def is_bucketed(conversation_data: Dict[str, Any]) -> bool:
+    return conversation_data.get(STORAGE_FIELD) == STORAGE_BUCKETS
+
+def tail_bucket_seq(message_count: int, bucket_size: int) -> int:
+    """Sequence number of the bucket holding the newest message"""
+    return max(0, message_count - 1) // bucket_size
+
+def bucketed_conversation_fields(message_count: int, bucket_size: int) -> Dict[str, Any]:
+    """Fields marking a conversation document as bucketed, with its tail pointer"""
+    return {
+        STORAGE_FIELD: STORAGE_BUCKETS,
+        "message_count": message_count,
+        "bucket_size": bucket_size,
+        "tail_bucket_seq": tail_bucket_seq(message_count, bucket_size),
+    }
+
+def _chunks(messages: List[Dict[str, Any]], first_index: int, bucket_size: int):
+    """(bucket_seq, messages tagged with their index) for consecutive messages"""
+    chunk: List[Dict[str, Any]] = []
+    seq = first_index // bucket_size
+    for index, message in enumerate(messages, start=first_index):
+        if index // bucket_size != seq:
+            yield seq, chunk
+            chunk, seq = [], index // bucket_size
+        chunk.append({**message, "index": index})
+    if chunk:
+        yield seq, chunk
+
+def bucket_documents(conversation_id: ObjectId, messages: List[Dict[str, Any]], bucket_size: int,
+                     first_index: int = 0) -> List[Dict[str, Any]]:
+    """Complete bucket documents for a transcript (new conversations, migration)"""
+    return [
+        {
+            "conversation_id": conversation_id,
+            "bucket_seq": seq,
+            "start_index": seq * bucket_size,
+            "count": len(chunk),
+            "messages": chunk,
+        }
+        for seq, chunk in _chunks(messages, first_index, bucket_size)
+    ]
+
+def bucket_replace_operations(conversation_id: ObjectId, messages: List[Dict[str, Any]],
+                              bucket_size: int) -> List[ReplaceOne]:
+    """Idempotent writes of a whole transcript's buckets (re-running overwrites them)"""
+    return [
+        ReplaceOne({"conversation_id": conversation_id, "bucket_seq": bucket["bucket_seq"]}, bucket, upsert=True)
+        for bucket in bucket_documents(conversation_id, messages, bucket_size)
+    ]
+
+def bucket_append_operations(conversation_id: ObjectId, messages: List[Dict[str, Any]],
+                             first_index: int, bucket_size: int) -> List[UpdateOne]:
+    """Upserts appending messages at first_index onwards to the buckets that hold them
+
+    Each bucket's array is kept sorted by index, so concurrent appends that
+    land out of order still read back in order.
+    """
+    return [
+        UpdateOne(
+            {"conversation_id": conversation_id, "bucket_seq": seq},
+            {
+                "$push": {"messages": {"$each": chunk, "$sort": {"index": 1}}},
+                "$inc": {"count": len(chunk)},
+                "$setOnInsert": {"start_index": seq * bucket_size},
+            },
+            upsert=True
+        )
+        for seq, chunk in _chunks(messages, first_index, bucket_size)
+    ]
+
+def embedded_append_filter(conversation_id: ObjectId, counted: bool = True) -> Dict[str, Any]:
+    """Conversations keeping their messages embedded; `counted` requires message_count"""
+    query = {"_id": conversation_id, STORAGE_FIELD: {"$ne": STORAGE_BUCKETS}}
+    if counted:
+        query["message_count"] = {"$exists": True}
+    return query
+
+def embedded_append_update(new_messages: List[Dict[str, Any]], set_fields: Optional[Dict[str, Any]],
+                           now: datetime) -> Dict[str, Any]:
+    """Update pushing messages onto the embedded array and bumping message_count"""
+    return {
+        "$push": {"messages": {"$each": new_messages}},
+        "$set": {**(set_fields or {}), "updated_at": now},
+        "$inc": {"message_count": len(new_messages)}
+    }
+
+def legacy_embedded_append_update(new_messages: List[Dict[str, Any]], set_fields: Optional[Dict[str, Any]],
+                                  now: datetime) -> List[Dict[str, Any]]:
+    """Pipeline update for documents written before message_count existed
+
+    Appends to the array and backfills the counter from its size in one update.
+    """
+    return [
+        {"$set": {
+            **{field: {"$literal": value} for field, value in (set_fields or {}).items()},
+            "messages": {"$concatArrays": [{"$ifNull": ["$messages", []]}, {"$literal": new_messages}]},
+            "updated_at": now
+        }},
+        {"$set": {
+            "message_count": {"$size": "$messages"}
+        }}
+    ]
+
+def bucketed_filter(conversation_id: ObjectId) -> Dict[str, Any]:
+    """The conversation, if it keeps its messages in buckets"""
+    return {"_id": conversation_id, STORAGE_FIELD: STORAGE_BUCKETS}
+
+# What find_one_and_update returns for reserve_messages_update
+RESERVE_PROJECTION = {"message_count": 1, "bucket_size": 1}
+
+def reserved_append_operations(conversation_id: ObjectId, new_messages: List[Dict[str, Any]],
+                               reserved: Dict[str, Any]) -> List[UpdateOne]:
+    """Bucket writes for messages whose indexes reserve_messages_update just claimed
+
+    `reserved` is the conversation document it returned (RESERVE_PROJECTION).
+    """
+    first_index = reserved["message_count"] - len(new_messages)
+    return bucket_append_operations(conversation_id, new_messages, first_index, reserved["bucket_size"])
+
+def reserve_messages_update(count: int, set_fields: Optional[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    """Pipeline update claiming the next `count` message indexes of a bucketed conversation
+
+    Run with find_one_and_update (returning the new message_count) so
+    concurrent appends never claim the same indexes; it also moves the
+    tail pointer and writes set_fields in the same update.
+    """
+    return [
+        {"$set": {
+            **{field: {"$literal": value} for field, value in (set_fields or {}).items()},
+            "message_count": {"$add": [{"$ifNull": ["$message_count", 0]}, count]},
+            "updated_at": now
+        }},
+        {"$set": {
+            "tail_bucket_seq": {"$toInt": {"$floor": {"$divide": [{"$subtract": ["$message_count", 1]}, "$bucket_size"]}}}
+        }}
+    ]
+
+def bucket_range_filter(conversation_id: ObjectId, start: int, end: int, bucket_size: int,
+                        tail_seq: Optional[int] = None) -> Dict[str, Any]:
+    """Buckets holding messages [start, end); the tail pointer bounds the scan"""
+    last = (end - 1) // bucket_size
+    if tail_seq is not None:
+        last = min(last, tail_seq)
+    return {"conversation_id": conversation_id, "bucket_seq": {"$gte": start // bucket_size, "$lte": last}}
+
+def messages_in_range(buckets: Iterable[Dict[str, Any]], start: int, end: int) -> List[Dict[str, Any]]:
+    """Messages [start, end) from buckets sorted by bucket_seq"""
+    return [
+        message
+        for bucket in buckets
+        for message in bucket.get("messages", [])
+        if start <= message.get("index", -1) < end
+    ]
+
+def timestamp_window(position: int, total: int, limit: int, after: bool) -> Tuple[int, int]:
+    """[start, end) of up to `limit` messages after/before the boundary index `position`"""
+    if after:
+        return position, min(position + limit, total)
+    return max(0, position - limit), position
+
+def timestamp_position_pipeline(conversation_id: ObjectId, timestamp: datetime, inclusive: bool) -> List[Dict[str, Any]]:
+    """Aggregation counting messages before (or at, if inclusive) a timestamp, on the server"""
+    op = "$lte" if inclusive else "$lt"
+    return [
+        {"$match": {"conversation_id": conversation_id}},
+        {"$group": {"_id": None, "position": {"$sum": {"$size": {"$filter": {
+            "input": "$messages", "as": "m", "cond": {op: ["$$m.timestamp", timestamp]}
+        }}}}}}
+    ]
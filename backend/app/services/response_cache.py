@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from .ttl_cache import TTLCache
+
+class InMemoryCacheBackend:
+    """Per-process TTL + LRU cache backend"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: str, ttl: float):
+        self.cache.set(key, value, ttl=ttl)
+
+    def reset_after_fork(self):
+        self.cache.reset_after_fork()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+class RedisCacheBackend:
+    """Cache backend shared by all workers, stored in Redis
+
+    Redis expires entries by TTL and evicts by its own maxmemory policy
+    (configure allkeys-lru for LRU behaviour); eviction counts come from
+    the server's INFO stats.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "gemini:response:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("GEMINI_CACHE_BACKEND=redis requires the 'redis' package") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            # A cache outage must never fail the request
+            print(f"Response cache read failed: {e}")
+            self._count("errors")
+            return None
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value.decode()
+
+    def set(self, key: str, value: str, ttl: float):
+        try:
+            self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+            self._count("errors")
+
+    def reset_after_fork(self):
+        # redis-py replaces pooled connections itself when it sees a new pid
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+        try:
+            stats["evictions"] = self.client.info("stats").get("evicted_keys")
+        except Exception:
+            stats["evictions"] = None
+        return stats
+
+class ResponseCache:
+    """Content-addressed cache of model responses
+
+    Keys hash the model name, the final prompt and the generation settings,
+    so any change to the prompt template or the settings is a natural miss.
+    Only endpoints listed in `endpoints` are cached.
+    """
+
+    def __init__(self, backend, ttl: float = 3600, endpoints: Iterable[str] = ()):
+        self.backend = backend
+        self.ttl = ttl
+        self.endpoints = set(endpoints)
+        self.endpoint_stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def is_enabled(self, endpoint: Optional[str]) -> bool:
+        return endpoint is not None and endpoint in self.endpoints
+
+    @staticmethod
+    def make_key(model_name: str, contents: Any, settings: Optional[Dict[str, Any]] = None) -> str:
+        payload = json.dumps(
+            {"model": model_name, "contents": contents, "settings": settings or {}},
+            sort_keys=True, default=str, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _record(self, endpoint: str, outcome: str):
+        with self._lock:
+            counters = self.endpoint_stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, endpoint: str, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        self._record(endpoint, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str):
+        self.backend.set(key, value, self.ttl)
+
+    def reset_after_fork(self):
+        """Give a forked child its own lock and (for the in-memory backend) its own entries"""
+        self._lock = threading.Lock()
+        self.endpoint_stats = {}
+        self.backend.reset_after_fork()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {name: dict(counters) for name, counters in self.endpoint_stats.items()}
+        return {
+            "backend": self.backend.name,
+            "enabled_endpoints": sorted(self.endpoints),
+            "ttl": self.ttl,
+            "endpoints": endpoints,
+            **self.backend.stats(),
+        }
+
+def create_response_cache() -> ResponseCache:
+    """Build the response cache from GEMINI_CACHE_* environment settings"""
+    ttl = float(os.getenv("GEMINI_CACHE_TTL", "3600"))
+    endpoints = [name.strip() for name in os.getenv("GEMINI_CACHE_ENDPOINTS", "scenario").split(",") if name.strip()]
+    if os.getenv("GEMINI_CACHE_BACKEND", "memory") == "redis":
+        backend = RedisCacheBackend(os.getenv("GEMINI_CACHE_URL", "redis://localhost:6379/0"))
+    else:
+        backend = InMemoryCacheBackend(maxsize=int(os.getenv("GEMINI_CACHE_MAXSIZE", "1024")), ttl=ttl)
+    return ResponseCache(backend, ttl=ttl, endpoints=endpoints)
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .deadline import DeadlineExceeded, check_deadline, remaining_time
+
+class _Call:
+    """One in-flight execution that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        # The leader failed for reasons of its own request; followers retry
+        self.abandoned = False
+
+# Set as the result of an async call whose leader's request failed on its own
+_ABANDONED = object()
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and receive the same result or
+    exception, but never past their own request deadline. If the leader
+    fails because of its own request (its deadline passed, it was
+    cancelled), followers do not inherit that: they retry and one of them
+    leads a new call. Nothing is remembered once the call finishes -
+    caching completed results is the response cache's job.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    self.leaders += 1
+                    leader = True
+                else:
+                    self.coalesced += 1
+                    leader = False
+
+            if leader:
+                break
+            if not call.done.wait(self._wait_budget()):
+                raise DeadlineExceeded("Request deadline exceeded while waiting for a coalesced call")
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            call.abandoned = self._is_leader_failure(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of do; coalesces callers on the running event loop
+        
+        Coalescing here is within this worker only: the async path never
+        calls _lead, so the Redis backend's cross-worker lock (a blocking
+        client) is not used for it.
+        """
+        while True:
+            with self._lock:
+                future = self._async_calls.get(key)
+                if future is None:
+                    future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+                    self.leaders += 1
+                    leader = True
+                else:
+                    self.coalesced += 1
+                    leader = False
+
+            if leader:
+                break
+            # shield: a cancelled follower must not cancel the shared call
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self._wait_budget())
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request deadline exceeded while waiting for a coalesced call")
+            if result is not _ABANDONED:
+                return result
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if self._is_leader_failure(e):
+                future.set_result(_ABANDONED)
+            else:
+                future.set_exception(e)
+                # Retrieve it here so asyncio does not warn when no follower awaited it
+                future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    def _lead(self, key: str, fn: Callable[[], Any]) -> Any:
+        return fn()
+
+    @staticmethod
+    def _is_leader_failure(error: BaseException) -> bool:
+        """The leader's own request failed (deadline, cancellation); says nothing about the call"""
+        if isinstance(error, (DeadlineExceeded, asyncio.CancelledError)):
+            return True
+        # e.g. an SDK timeout set from the leader's remaining budget
+        remaining = remaining_time()
+        return remaining is not None and remaining <= 0
+
+    @staticmethod
+    def _wait_budget() -> Optional[float]:
+        """How long a follower may wait: the request's remaining time (None: no deadline)"""
+        remaining = remaining_time()
+        return None if remaining is None else max(remaining, 0.0)
+
+    def reset_after_fork(self):
+        """Forget the parent's in-flight calls and take a fresh lock in a forked child"""
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "local",
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+class RedisSingleFlight(SingleFlight):
+    """SingleFlight that also coalesces across worker processes via Redis
+
+    Within a process callers coalesce as in SingleFlight. The process leader
+    then takes a short Redis lock for the key; if another worker holds it,
+    it polls for that worker's published result instead of calling upstream.
+    If the other worker dies or times out, the caller runs the call itself.
+    Polling stops at the request deadline. Results must be strings.
+    Only the blocking path (do) coordinates across workers; do_async
+    coalesces within the worker as in SingleFlight.
+    """
+
+    def __init__(self, url: str, lock_ttl: float = 60.0, result_ttl: float = 30.0,
+                 prefix: str = "gemini:inflight:"):
+        super().__init__()
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("GEMINI_SINGLE_FLIGHT_BACKEND=redis requires the 'redis' package") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.prefix = prefix
+        self.remote_coalesced = 0
+
+    def _lead(self, key: str, fn: Callable[[], Any]) -> Any:
+        lock_key = f"{self.prefix}lock:{key}"
+        result_key = f"{self.prefix}result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            # Coordination is an optimisation; never fail the call over it
+            print(f"Single-flight lock failed: {e}")
+            return fn()
+
+        if not acquired:
+            result = self._wait_for_result(lock_key, result_key)
+            if result is not None:
+                with self._lock:
+                    self.remote_coalesced += 1
+                return result
+            # Polling may have used up the request's budget
+            check_deadline()
+            return fn()
+
+        try:
+            result = fn()
+            try:
+                self.client.set(result_key, result, ex=max(1, int(self.result_ttl)))
+            except Exception as e:
+                print(f"Single-flight publish failed: {e}")
+            return result
+        finally:
+            try:
+                # Release only our own lock
+                if self.client.get(lock_key) == token.encode():
+                    self.client.delete(lock_key)
+            except Exception:
+                pass
+
+    def _wait_for_result(self, lock_key: str, result_key: str) -> Optional[str]:
+        wait = self.lock_ttl
+        budget = self._wait_budget()
+        if budget is not None:
+            wait = min(wait, budget)
+        deadline = time.monotonic() + wait
+        delay = 0.05
+        while time.monotonic() < deadline:
+            try:
+                value = self.client.get(result_key)
+                if value is not None:
+                    return value.decode()
+                if not self.client.exists(lock_key):
+                    # Leader finished without publishing (it failed) or died
+                    value = self.client.get(result_key)
+                    return value.decode() if value is not None else None
+            except Exception as e:
+                print(f"Single-flight poll failed: {e}")
+                return None
+            time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+            delay = min(delay * 2, 0.5)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["backend"] = "redis"
+        stats["remote_coalesced"] = self.remote_coalesced
+        return stats
+
+def create_single_flight() -> SingleFlight:
+    """Build the coalescer from GEMINI_SINGLE_FLIGHT_* environment settings"""
+    if os.getenv("GEMINI_SINGLE_FLIGHT_BACKEND", "local") == "redis":
+        url = os.getenv("GEMINI_SINGLE_FLIGHT_URL") or os.getenv("GEMINI_CACHE_URL", "redis://localhost:6379/0")
+        return RedisSingleFlight(url, lock_ttl=float(os.getenv("GEMINI_SINGLE_FLIGHT_LOCK_TTL", "60")))
+    return SingleFlight()
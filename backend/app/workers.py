@@ -0,0 +1,16 @@
+def reset_after_fork():
+    """Give a forked worker its own copy of every process-wide resource
+
+    Needed when the app was imported before forking (gunicorn preload_app):
+    clients, sockets, locks and queues inherited from the parent must not
+    be shared. Without preloading each worker builds its singletons on
+    import and this is a no-op.
+    """
+    from .middleware.auth_middleware import token_cache
+    from .middleware.jwks_store import jwks_store
+    from .services.database_service import db_service, mongo_breaker
+    from .services.async_database_service import async_db_service
+    from .services.gemini_service import gemini_service
+
+    for resource in (token_cache, jwks_store, mongo_breaker, db_service, async_db_service, gemini_service):
+        resource.reset_after_fork()
@@ -0,0 +1,4 @@
+from app import create_asgi_app
+
+# ASGI application instance, e.g. `hypercorn asgi:app`
+app = create_asgi_app()
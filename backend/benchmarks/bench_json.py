@@ -0,0 +1,100 @@
+"""Compare JSON response encoding: Flask's default provider vs FastJSONProvider
+
+Encodes a synthetic conversation (the GET /api/chat/conversations/<id>
+payload) and a conversation listing page through each provider's
+response(), plus the streaming encoder for the full conversation.
+
+Usage (from backend/):
+    python benchmarks/bench_json.py [--messages 500] [--number 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app import json_provider
+from app.json_provider import FastJSONProvider, iter_encode
+
+def conversation_payload(message_count: int):
+    start = datetime(2025, 7, 19, 12, 0, 0)
+    return {
+        "conversation": {
+            "id": str(ObjectId()),
+            "title": "Salary negotiation practice",
+            "messages": [
+                {
+                    "content": f"Message {i}: " + "I'd like to talk about my compensation. " * 8,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "timestamp": start + timedelta(seconds=i * 17, microseconds=i)
+                }
+                for i in range(message_count)
+            ],
+            "created_at": start,
+            "updated_at": start + timedelta(hours=1)
+        }
+    }
+
+def listing_payload(page_size: int = 20):
+    now = datetime.utcnow()
+    return {
+        "conversations": [
+            {
+                "id": ObjectId(),
+                "title": f"Conversation {i}",
+                "created_at": now - timedelta(days=i),
+                "updated_at": now - timedelta(hours=i),
+                "message_count": i * 3
+            }
+            for i in range(page_size)
+        ],
+        "next_cursor": "MjAyNS0wNy0xOVQxMjowMDowMHw2NjlhMDAwMDAwMDAwMDAwMDAwMDAwMDA="
+    }
+
+def as_default_payload(payload):
+    """Flask's default provider cannot encode ObjectId; give it the string the routes used to build"""
+    for conv in payload.get("conversations", []):
+        conv["id"] = str(conv["id"])
+    return payload
+
+def bench(label: str, fn, number: int):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<34} {seconds * 1e6:10.1f} us")
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500, help="messages in the conversation payload")
+    parser.add_argument("--number", type=int, default=200, help="encodings per timing run")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    backend = "orjson" if json_provider.orjson is not None else "stdlib json (orjson not installed)"
+    print(f"FastJSONProvider backend: {backend}")
+
+    cases = [
+        (f"conversation ({args.messages} messages)", lambda: conversation_payload(args.messages)),
+        ("conversation listing (20 items)", listing_payload),
+    ]
+    with app.app_context():
+        for name, build in cases:
+            payload = build()
+            default_payload = as_default_payload(build())
+            print(f"\n{name}")
+            slow = bench("DefaultJSONProvider.response", lambda: default_provider.response(default_payload), args.number)
+            fast = bench("FastJSONProvider.response", lambda: fast_provider.response(payload), args.number)
+            print(f"  {'speedup':<34} {slow / fast:10.1f} x")
+
+        payload = cases[0][1]()
+        print(f"\nstreaming encoder, {cases[0][0]}")
+        bench("iter_encode (all chunks)", lambda: b"".join(iter_encode(payload)), args.number)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Cold-boot budget check for the backend
+
+Starts a fresh interpreter that imports the app and builds it (no
+requests served), several times, and fails if the median wall time goes
+over the budget. A separate run under `python -X importtime` lists the
+slowest imports, and the check also fails if a module that must stay
+lazy (Gemini SDK, Motor, redis) is imported during boot.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py [--target wsgi|asgi] [--budget-ms 1500] [--runs 5]
+
+The budget defaults to STARTUP_BUDGET_MS (1500 ms) so CI can tighten it.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT_CODE = {
+    'wsgi': "from app import create_app; create_app()",
+    'asgi': "from app import create_asgi_app; create_asgi_app()",
+}
+
+# Imported on first use only; seeing them at boot is a regression
+LAZY_MODULES = ('google.generativeai', 'motor', 'redis')
+
+def boot(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(args, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"App failed to boot:\n{result.stderr}")
+    return result
+
+def parse_importtime(stderr: str):
+    """(cumulative_us, self_us, module) for every line of -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return imports
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=sorted(BOOT_CODE), default='wsgi')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '1500')))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    args = parser.parse_args()
+    code = BOOT_CODE[args.target]
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        boot(code)
+        timings.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(timings)
+
+    imports = parse_importtime(boot(code, importtime=True).stderr)
+    print(f"Slowest imports ({args.target}, cumulative):")
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    eager = sorted({name.strip() for _, _, name in imports
+                    if any(name.strip() == lazy or name.strip().startswith(lazy + '.') for lazy in LAZY_MODULES)})
+    if eager:
+        failures.append(f"modules that should load lazily were imported at boot: {', '.join(eager)}")
+    if median > args.budget_ms:
+        failures.append(f"median cold boot {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    print(f"\nCold boot ({args.target}): median {median:.0f} ms, "
+          f"min {min(timings):.0f} ms, max {max(timings):.0f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.0f} ms)")
+    if failures:
+        for failure in failures:
+            print(f"FAIL  {failure}", file=sys.stderr)
+        raise SystemExit(1)
+    print("ok")
+
+if __name__ == '__main__':
+    main()
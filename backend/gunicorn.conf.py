@@ -0,0 +1,60 @@
+"""Production server configuration: `gunicorn -c gunicorn.conf.py` (from backend/)
+
+Traffic is I/O bound: a chat request spends seconds waiting on Gemini and
+milliseconds on CPU, so concurrency comes from threads (or green threads /
+the event loop), not from processes. See "Production Server" in the README
+for the load profile behind these defaults.
+
+Settings (environment):
+    GUNICORN_WORKER_CLASS   gthread (default) | gevent | uvicorn
+    GUNICORN_WORKERS        worker processes (default: CPU count)
+    GUNICORN_THREADS        threads per gthread worker (default: 16)
+    GUNICORN_WORKER_CONNECTIONS  concurrent requests per gevent worker (default: 256)
+    GUNICORN_BIND, GUNICORN_KEEPALIVE, GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT
+    GUNICORN_MAX_REQUESTS   recycle a worker after this many requests (0 = never)
+    GUNICORN_PRELOAD        import the app once in the master before forking
+"""
+import multiprocessing
+import os
+
+# gthread: Flask app, a thread per in-flight request
+# gevent:  Flask app on green threads (pip install gevent); cheap idle SSE streams
+# uvicorn: ASGI app (async chat routes on the event loop, the rest in a thread
+#          pool; pip install uvicorn)
+WORKER_CLASSES = {
+    'gthread': ('gthread', 'wsgi:app'),
+    'gevent': ('gevent', 'wsgi:app'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'asgi:app'),
+}
+
+worker_type = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_type not in WORKER_CLASSES:
+    raise ValueError(f"Unknown GUNICORN_WORKER_CLASS '{worker_type}' (expected one of: {', '.join(WORKER_CLASSES)})")
+worker_class, wsgi_app = WORKER_CLASSES[worker_type]
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('FLASK_PORT') or 5000}")
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count())))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "256"))
+
+# Keep idle client connections open between requests (behind a proxy that reuses them)
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Worker heartbeat timeout; above the longest route deadline (end_roleplay, 60 s)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "90"))
+# On SIGHUP / SIGTERM, workers finish in-flight requests for this long
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# Off by default: each worker then imports the app (cheap, nothing connects at
+# import) and builds its own singletons. With preloading, post_fork resets them.
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+accesslog = "-"
+errorlog = "-"
+
+def post_fork(server, worker):
+    """Per-worker MongoDB/Gemini clients, locks and caches when the app was preloaded"""
+    if server.cfg.preload_app:
+        from app.workers import reset_after_fork
+        reset_after_fork()
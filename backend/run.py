@@ -1,21 +1,12 @@
 from app import create_app
-from app.services.database_service import db_service
 import os
 
 # Create the Flask app instance
 app = create_app()
 
-# Initialize database connection when app starts
-try:
-    db_service.connect()
-    print("Database connected successfully")
-except Exception as e:
-    print(f"Failed to connect to database: {e}")
-
-@app.teardown_appcontext
-def close_database(error):
-    """Close database connection when app context ends"""
-    db_service.disconnect()
+# Services connect on first use (and again in each forked worker), so
+# starting the app never waits on MongoDB or the Gemini SDK (unless
+# MONGODB_VERIFY_QUERY_PLANS asks create_app to check query plans)
 
 if __name__ == "__main__":
     port = int(app.config.get('PORT', 5000))
@@ -0,0 +1,144 @@
+"""Move embedded conversation messages into the message_buckets collection
+
+Walks the conversations collection in _id order, a page of ids at a time,
+and loads one conversation at a time, so memory stays bounded by the
+largest document. For each conversation it writes the buckets (idempotent
+upserts keyed by (conversation_id, bucket_seq)) and then, in a single
+conditional update, marks the conversation as bucketed and drops its
+`messages` array. That update only applies if no message was appended
+in the meantime, otherwise the conversation is retried, so the migration
+can run against live traffic.
+
+Progress is checkpointed in the `migrations` collection after every page;
+a rerun resumes after the last checkpoint (--restart scans from the start,
+skipping conversations that are already bucketed).
+
+Usage (from backend/):
+    python scripts/migrate_message_buckets.py [--batch-size 100] [--bucket-size 100]
+                                              [--limit N] [--dry-run] [--restart]
+
+Set MESSAGE_STORAGE_MODE=buckets before (or while) migrating so new
+conversations are created bucketed too.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import ASCENDING, MongoClient
+from app.config import Config
+from app.services import index_service, message_buckets
+from app.services.database_service import connection_options
+
+CHECKPOINT_ID = "message_buckets"
+# Attempts per conversation when appends keep racing the migration
+MAX_ATTEMPTS = 5
+
+def load_checkpoint(db):
+    checkpoint = db.migrations.find_one({"_id": CHECKPOINT_ID})
+    return checkpoint.get("last_id") if checkpoint else None
+
+def save_checkpoint(db, last_id, migrated: int):
+    db.migrations.update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}, "$inc": {"migrated": migrated}},
+        upsert=True
+    )
+
+def id_pages(db, after_id, batch_size: int):
+    """Pages of ids of conversations that still embed their messages, in _id order"""
+    while True:
+        query = {message_buckets.STORAGE_FIELD: {"$ne": message_buckets.STORAGE_BUCKETS}}
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        ids = [doc["_id"] for doc in db.conversations.find(query, {"_id": 1}).sort("_id", ASCENDING).limit(batch_size)]
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+def migrate_conversation(db, conversation_id, bucket_size: int, dry_run: bool):
+    """Bucket one conversation; returns its message count, or None if it was skipped"""
+    for _ in range(MAX_ATTEMPTS):
+        conversation_data = db.conversations.find_one(
+            {"_id": conversation_id, message_buckets.STORAGE_FIELD: {"$ne": message_buckets.STORAGE_BUCKETS}},
+            {"messages": 1}
+        )
+        if conversation_data is None:
+            return None  # Deleted, or bucketed by a concurrent run
+        messages = conversation_data.get("messages") or []
+        if dry_run:
+            return len(messages)
+
+        if messages:
+            db[message_buckets.BUCKETS_COLLECTION].bulk_write(
+                message_buckets.bucket_replace_operations(conversation_id, messages, bucket_size), ordered=False
+            )
+        unchanged = {"messages": {"$size": len(messages)}} if messages else {"$or": [
+            {"messages": {"$exists": False}}, {"messages": {"$size": 0}}
+        ]}
+        result = db.conversations.update_one(
+            {"_id": conversation_id, message_buckets.STORAGE_FIELD: {"$ne": message_buckets.STORAGE_BUCKETS}, **unchanged},
+            {
+                "$set": message_buckets.bucketed_conversation_fields(len(messages), bucket_size),
+                "$unset": {"messages": ""}
+            }
+        )
+        if result.matched_count:
+            return len(messages)
+        # Messages were appended since the read: rewrite the buckets from the new transcript
+    raise RuntimeError(f"Conversation {conversation_id} kept changing during migration")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=100, help='conversation ids per page (and checkpoint)')
+    parser.add_argument('--bucket-size', type=int, default=message_buckets.default_bucket_size())
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many conversations')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be migrated, write nothing')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint')
+    args = parser.parse_args()
+
+    client = MongoClient(Config.MONGODB_URI, **connection_options())
+    db = client.get_database()
+    if not args.dry_run:
+        index_service.ensure_indexes(db)
+
+    after_id = None if args.restart else load_checkpoint(db)
+    if after_id is not None:
+        print(f"Resuming after conversation {after_id}")
+
+    started = time.perf_counter()
+    conversations = messages = skipped = 0
+    try:
+        for ids in id_pages(db, after_id, args.batch_size):
+            if args.limit is not None:
+                if conversations + skipped >= args.limit:
+                    break
+                ids = ids[:args.limit - conversations - skipped]
+            page_migrated = 0
+            for conversation_id in ids:
+                count = migrate_conversation(db, conversation_id, args.bucket_size, args.dry_run)
+                if count is None:
+                    skipped += 1
+                    continue
+                conversations += 1
+                page_migrated += 1
+                messages += count
+            if not args.dry_run:
+                save_checkpoint(db, ids[-1], page_migrated)
+
+            elapsed = time.perf_counter() - started
+            print(f"{conversations} conversations, {messages} messages "
+                  f"({conversations / elapsed:.1f} conversations/s), last id {ids[-1]}")
+    finally:
+        client.close()
+
+    verb = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{verb} {conversations} conversations ({messages} messages) "
+          f"in {time.perf_counter() - started:.1f} s; {skipped} skipped")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import json
+import pytest
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CircuitBreaker, ServiceUnavailableError
+from app.services.llm_dispatcher import LLMOverloadedError, is_local_rejection, is_upstream_outage
+from app.services.deadline import DeadlineExceeded
+
+class Clock:
+    """Stand-in for time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+def fail(breaker, error=None):
+    with pytest.raises(ConnectionError):
+        with breaker.guard():
+            raise error or ConnectionError("down")
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("db", failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        fail(breaker)
+    assert breaker.state == CircuitBreaker.CLOSED
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["times_opened"] == 1
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("db", failure_threshold=2)
+    fail(breaker)
+    breaker.call(lambda: "ok")
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_open_circuit_rejects_without_calling(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1, recovery_timeout=30)
+    fail(breaker)
+    clock.now += 10
+    calls = []
+    with pytest.raises(ServiceUnavailableError) as error:
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+    assert error.value.service == "db"
+    assert error.value.retry_after == pytest.approx(20)
+    assert breaker.snapshot()["rejected"] == 1
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1, recovery_timeout=30)
+    fail(breaker)
+    clock.now += 30
+    with breaker.guard():
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(ServiceUnavailableError):
+            breaker.before_call()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("db", failure_threshold=3, recovery_timeout=30)
+    for _ in range(3):
+        fail(breaker)
+    clock.now += 30
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == clock.now
+    assert breaker.snapshot()["retry_in_seconds"] == 30
+
+def test_neutral_errors_free_the_probe_without_a_verdict(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1, recovery_timeout=30)
+    fail(breaker)
+    clock.now += 30
+    with pytest.raises(DeadlineExceeded):
+        with breaker.guard(is_neutral=lambda e: isinstance(e, DeadlineExceeded)):
+            raise DeadlineExceeded()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.call(lambda: "ok")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_non_failure_errors_count_as_success(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1)
+    with pytest.raises(ValueError):
+        with breaker.guard(is_failure=lambda e: isinstance(e, ConnectionError)):
+            raise ValueError("bad request")
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+
+def test_reset_after_fork_closes(clock):
+    breaker = CircuitBreaker("db", failure_threshold=1)
+    fail(breaker)
+    breaker.reset_after_fork()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+@pytest.mark.parametrize("error, outage", [
+    (UpstreamError(500), True),
+    (UpstreamError(503), True),
+    (UpstreamError(429), True),
+    (UpstreamError(400), False),
+    (UpstreamError(403), False),
+    (ConnectionResetError("reset"), True),
+    (TimeoutError("timed out"), True),
+    (ValueError("GEMINI_API_KEY is required"), False),
+    (LLMOverloadedError("provider rejecting"), True),
+])
+def test_gemini_outage_classification(error, outage):
+    assert is_upstream_outage(error) is outage
+
+def test_local_rejections_are_neutral():
+    assert is_local_rejection(DeadlineExceeded())
+    assert is_local_rejection(LLMOverloadedError("queue full"))
+    shed_by_provider = LLMOverloadedError("provider rejecting")
+    shed_by_provider.__cause__ = UpstreamError(429)
+    assert not is_local_rejection(shed_by_provider)
+
+def test_stream_persistence_failure_is_reported_as_degraded():
+    from app.routes.chat import persistence_error_event
+    event = persistence_error_event(ServiceUnavailableError("mongodb"), response="generated reply")
+    name, data = event.strip().split("\n")
+    body = json.loads(data[len("data: "):])
+    assert name == "event: error"
+    assert body["degraded"] is True and body["service"] == "mongodb"
+    assert body["response"] == "generated reply"
+
+def test_unsaved_reply_is_returned_with_the_failure():
+    from app.routes.chat import message_not_saved
+    body = message_not_saved("generated reply", conversation_id="c1")
+    assert body["success"] is False and body["error"]
+    assert body["response"] == "generated reply" and body["conversation_id"] == "c1"
@@ -0,0 +1,92 @@
+import asyncio
+from app.services.context_manager import ContextManager, estimate_tokens
+
+def transcript(count, size=40):
+    """Alternating user/assistant messages of `size` characters each"""
+    return [
+        {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"{i:03d}" + "x" * (size - 3)}
+        for i in range(count)
+    ]
+
+def test_under_budget_sends_everything():
+    messages = transcript(4)
+    plan = ContextManager(token_budget=1000).plan(messages)
+    assert plan.recent == messages
+    assert plan.evicted == []
+    assert plan.summary_fields() == {}
+
+def test_summarized_messages_are_not_resent():
+    messages = transcript(10)
+    plan = ContextManager(token_budget=1000).plan(messages, "earlier", summarized_count=6)
+    assert plan.recent == messages[6:]
+    assert plan.summarized_count == 6
+
+def test_offset_window_keeps_absolute_counts():
+    messages = transcript(10)
+    # Only messages 6.. were loaded; the summary covers the first 8
+    plan = ContextManager(token_budget=1000).plan(messages[6:], "earlier", summarized_count=8, offset=6)
+    assert plan.recent == messages[8:]
+    assert plan.summarized_count == 8
+
+def test_over_budget_evicts_oldest_down_to_target():
+    messages = transcript(20)
+    size = estimate_tokens(messages[0]['content'])
+    # Room for 12 messages (plus the empty summary's estimate); 6 fit the target
+    manager = ContextManager(token_budget=size * 12 + estimate_tokens(""), min_recent_messages=2, target_ratio=0.5)
+    plan = manager.plan(messages)
+    assert len(plan.recent) == 6
+    assert plan.evicted + plan.recent == messages
+
+def test_min_recent_messages_are_always_kept():
+    messages = transcript(8, size=400)
+    plan = ContextManager(token_budget=10, min_recent_messages=3).plan(messages)
+    assert plan.recent == messages[-3:]
+    assert plan.evicted == messages[:-3]
+
+def test_prepare_folds_evicted_messages_into_summary():
+    messages = transcript(20)
+    calls = []
+
+    def summarize(previous, evicted):
+        calls.append((previous, evicted))
+        return "new summary"
+
+    manager = ContextManager(token_budget=100, min_recent_messages=2)
+    plan = manager.prepare(messages, "old summary", 0, summarize)
+    assert calls[0][0] == "old summary"
+    assert calls[0][1] + plan.recent == messages
+    assert plan.evicted == []
+    assert plan.summary_fields() == {"summary": "new summary", "summarized_count": 20 - len(plan.recent)}
+
+def test_failed_summary_leaves_stored_summary_unchanged():
+    plan = ContextManager(token_budget=100, min_recent_messages=2).prepare(
+        transcript(20), "old summary", 0, lambda previous, evicted: None
+    )
+    assert plan.summary_fields() == {}
+    assert plan.summarized_count == 0
+    assert plan.evicted
+
+def test_prepare_async_matches_prepare():
+    async def summarize(previous, evicted):
+        return "async summary"
+
+    manager = ContextManager(token_budget=100, min_recent_messages=2)
+    plan = asyncio.run(manager.prepare_async(transcript(20), "", 0, summarize))
+    expected = manager.prepare(transcript(20), "", 0, lambda previous, evicted: "async summary")
+    assert plan.recent == expected.recent
+    assert plan.summary_fields() == expected.summary_fields()
+
+def test_summary_is_folded_into_first_user_turn():
+    plan = ContextManager().plan(transcript(2), "the story so far", summarized_count=0)
+    messages = plan.messages()
+    assert len(messages) == 2
+    assert messages[0]['role'] == 'user'
+    assert "the story so far" in messages[0]['content']
+    assert messages[0]['content'].endswith(transcript(1)[0]['content'])
+
+def test_summary_gets_its_own_turn_before_an_assistant_message():
+    messages = transcript(3)[1:]
+    plan = ContextManager().plan(messages, "the story so far")
+    sent = plan.messages()
+    assert [msg['role'] for msg in sent] == ['user', 'assistant', 'user']
+    assert "the story so far" in sent[0]['content']
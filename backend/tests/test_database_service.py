@@ -0,0 +1,57 @@
+from app.services import database_service
+from app.services.connection_monitor import ConnectionMonitor
+from app.services.database_service import DatabaseService
+
+class FakeDatabase:
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return (self.client, name)
+
+    def __getitem__(self, name):
+        return (self.client, name)
+
+class FakeClient:
+    """MongoClient stand-in that records whether it was closed"""
+
+    def __init__(self, uri=None, **options):
+        self.closed = False
+        self.admin = self
+
+    def get_database(self):
+        return FakeDatabase(self)
+
+    def command(self, name):
+        if self.closed:
+            raise ConnectionError("client closed")
+
+    def close(self):
+        self.closed = True
+
+def test_reconnect_swaps_in_the_new_client_before_closing_the_old(monkeypatch):
+    monkeypatch.setattr(database_service, "MongoClient", FakeClient)
+    service = DatabaseService(mongo_uri="mongodb://unused")
+    service.ensure_indexes = lambda: []
+    service.connect()
+    old_client = service.client
+    service.monitor.state = ConnectionMonitor.UNHEALTHY
+
+    seen = []
+    original_install = service._install
+
+    def install(client):
+        # Requests running during the swap still see the old, open client
+        seen.append((service.conversations_collection, old_client.closed))
+        original_install(client)
+
+    service._install = install
+    service.reconnect()
+
+    assert seen == [((old_client, "conversations"), False)]
+    assert old_client.closed
+    assert service.client is not old_client
+    assert service.conversations_collection == (service.client, "conversations")
+    assert service.monitor.is_healthy
+    assert service.monitor.reconnect_count == 1
+    service.monitor.stop()
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import threading
+import pytest
+from app.services import llm_dispatcher
+from app.services.circuit_breaker import ServiceUnavailableError
+from app.services.deadline import DeadlineExceeded, deadline_scope
+from app.services.gemini_service import GeminiService
+from app.services.llm_dispatcher import LLMDispatcher, LLMOverloadedError
+
+class UpstreamError(Exception):
+    """Provider error carrying an HTTP status, like google.api_core exceptions"""
+
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+def hold_slot(dispatcher):
+    """Take a slot in a thread until the returned event is set"""
+    release, held = threading.Event(), threading.Event()
+
+    def hold():
+        with dispatcher.slot():
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    return release, thread
+
+def test_calls_within_capacity_are_admitted():
+    dispatcher = LLMDispatcher(max_in_flight=2)
+    assert dispatcher.call(lambda: "ok") == "ok"
+    assert dispatcher.stats()["admitted"] == 1
+    assert dispatcher.stats()["in_flight"] == 0
+
+def test_full_queue_sheds_immediately():
+    dispatcher = LLMDispatcher(max_in_flight=1, max_queue=0)
+    release, thread = hold_slot(dispatcher)
+    with pytest.raises(LLMOverloadedError):
+        dispatcher.call(lambda: "ok")
+    assert dispatcher.stats()["rejected"] == 1
+    release.set()
+    thread.join(5)
+
+def test_queued_caller_gets_the_released_slot():
+    dispatcher = LLMDispatcher(max_in_flight=1, max_queue=1, queue_timeout=5)
+    release, thread = hold_slot(dispatcher)
+    threading.Timer(0.05, release.set).start()
+    assert dispatcher.call(lambda: "queued") == "queued"
+    thread.join(5)
+    stats = dispatcher.stats()
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    assert stats["wait_time_max_ms"] > 0
+
+def test_queue_wait_times_out():
+    dispatcher = LLMDispatcher(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    release, thread = hold_slot(dispatcher)
+    with pytest.raises(LLMOverloadedError):
+        dispatcher.call(lambda: "ok")
+    assert dispatcher.stats()["timeouts"] == 1
+    assert dispatcher.stats()["queue_depth"] == 0
+    release.set()
+    thread.join(5)
+
+def test_queue_wait_stops_at_the_request_deadline():
+    dispatcher = LLMDispatcher(max_in_flight=1, max_queue=1, queue_timeout=5)
+    release, thread = hold_slot(dispatcher)
+    with pytest.raises(DeadlineExceeded):
+        with deadline_scope(0.05):
+            dispatcher.call(lambda: "ok")
+    release.set()
+    thread.join(5)
+
+def test_async_callers_share_the_same_slots():
+    dispatcher = LLMDispatcher(max_in_flight=1, max_queue=4, queue_timeout=5)
+    running, peak = 0, 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.call_async(call) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["ok"] * 3
+    assert peak == 1
+    assert dispatcher.stats()["in_flight"] == 0
+
+def test_rate_limited_calls_are_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_dispatcher.time, "sleep", delays.append)
+    dispatcher = LLMDispatcher(max_retries=3, base_delay=0.5, max_delay=8)
+    attempts = iter([UpstreamError(429), UpstreamError(503), "ok"])
+
+    def flaky():
+        result = next(attempts)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert dispatcher.call(flaky) == "ok"
+    assert len(delays) == 2
+    # Full jitter: each delay is within the exponential cap for its attempt
+    assert 0 <= delays[0] <= 0.5 and 0 <= delays[1] <= 1.0
+    assert dispatcher.stats()["retries"] == 2
+
+def test_retries_give_up_as_overloaded(monkeypatch):
+    monkeypatch.setattr(llm_dispatcher.time, "sleep", lambda delay: None)
+    dispatcher = LLMDispatcher(max_retries=2)
+
+    def rate_limited():
+        raise UpstreamError(429)
+
+    with pytest.raises(LLMOverloadedError) as error:
+        dispatcher.call(rate_limited)
+    assert isinstance(error.value.__cause__, UpstreamError)
+
+def test_long_retry_after_hint_is_not_waited_out(monkeypatch):
+    monkeypatch.setattr(llm_dispatcher, "retry_after_hint", lambda error: 60.0)
+    dispatcher = LLMDispatcher(max_retry_after=10)
+
+    def rate_limited():
+        raise UpstreamError(429)
+
+    with pytest.raises(LLMOverloadedError) as error:
+        dispatcher.call(rate_limited)
+    assert error.value.retry_after == 60.0
+
+def test_retry_after_cap_is_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("GEMINI_MAX_RETRY_AFTER", "90")
+    assert llm_dispatcher.create_llm_dispatcher().max_retry_after == 90.0
+
+def test_other_errors_are_not_retried():
+    dispatcher = LLMDispatcher()
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise UpstreamError(400)
+
+    with pytest.raises(UpstreamError):
+        dispatcher.call(bad_request)
+    assert len(attempts) == 1
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def generate_content(self, contents, stream=False, request_options=None):
+        return iter([Chunk("Hello"), Chunk(" world")])
+
+def fake_gemini(max_in_flight=1, max_queue=0):
+    service = GeminiService(api_key="test")
+    service.dispatcher = LLMDispatcher(max_in_flight=max_in_flight, max_queue=max_queue)
+    service._model, service._pid = FakeModel(), os.getpid()
+    return service
+
+def test_stream_is_admitted_before_it_is_read():
+    service = fake_gemini()
+    stream = service.stream_text("prompt")
+    assert service.dispatcher.stats()["in_flight"] == 1
+    # The second stream is shed when it is created, not when it is read
+    with pytest.raises(LLMOverloadedError):
+        service.stream_text("prompt")
+    assert list(stream) == ["Hello", " world"]
+    assert service.dispatcher.stats()["in_flight"] == 0
+
+def test_closing_an_unread_stream_releases_its_slot():
+    service = fake_gemini()
+    service.stream_text("prompt").close()
+    assert service.dispatcher.stats()["in_flight"] == 0
+    assert service.breaker.snapshot()["state"] == "closed"
+
+def test_open_circuit_rejects_a_stream_without_taking_a_slot():
+    service = fake_gemini()
+    for _ in range(service.breaker.failure_threshold):
+        service.breaker.record_failure(ConnectionError("down"))
+    with pytest.raises(ServiceUnavailableError):
+        service.stream_text("prompt")
+    assert service.dispatcher.stats()["in_flight"] == 0
@@ -0,0 +1,297 @@
+import copy
+import importlib.util
+import os
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from pymongo import ReplaceOne
+from app.models.conversation import Message
+from app.services import message_buckets
+from app.services.database_service import DatabaseService
+
+def messages(count, first=0):
+    start = datetime(2025, 1, 1)
+    return [
+        {"content": f"message {i}", "role": "user", "timestamp": start + timedelta(minutes=i)}
+        for i in range(first, first + count)
+    ]
+
+def contents(items):
+    return [message["content"] for message in items]
+
+# Bucket layout
+
+def test_tail_bucket_seq():
+    assert message_buckets.tail_bucket_seq(0, 10) == 0
+    assert message_buckets.tail_bucket_seq(10, 10) == 0
+    assert message_buckets.tail_bucket_seq(11, 10) == 1
+
+def test_bucket_documents_roll_over_at_bucket_size():
+    buckets = message_buckets.bucket_documents(ObjectId(), messages(25), bucket_size=10)
+    assert [(b["bucket_seq"], b["start_index"], b["count"]) for b in buckets] == [(0, 0, 10), (1, 10, 10), (2, 20, 5)]
+    assert [m["index"] for m in buckets[1]["messages"]] == list(range(10, 20))
+
+def test_append_operations_split_at_the_bucket_boundary():
+    operations = message_buckets.bucket_append_operations(ObjectId(), messages(4, first=8), first_index=8, bucket_size=10)
+    assert [op._filter["bucket_seq"] for op in operations] == [0, 1]
+    assert [m["index"] for m in operations[0]._doc["$push"]["messages"]["$each"]] == [8, 9]
+    assert [m["index"] for m in operations[1]._doc["$push"]["messages"]["$each"]] == [10, 11]
+    assert operations[1]._doc["$setOnInsert"] == {"start_index": 10}
+
+def test_reserved_append_starts_at_the_first_claimed_index():
+    reserved = {"message_count": 12, "bucket_size": 10}
+    operations = message_buckets.reserved_append_operations(ObjectId(), messages(3), reserved)
+    assert [m["index"] for op in operations for m in op._doc["$push"]["messages"]["$each"]] == [9, 10, 11]
+
+def test_legacy_embedded_append_only_skips_the_counter_check():
+    conversation_id = ObjectId()
+    counted = message_buckets.embedded_append_filter(conversation_id)
+    legacy = message_buckets.embedded_append_filter(conversation_id, counted=False)
+    assert counted == {**legacy, "message_count": {"$exists": True}}
+
+def test_range_filter_is_bounded_by_the_tail():
+    conversation_id = ObjectId()
+    assert message_buckets.bucket_range_filter(conversation_id, 15, 35, 10)["bucket_seq"] == {"$gte": 1, "$lte": 3}
+    assert message_buckets.bucket_range_filter(conversation_id, 15, 35, 10, tail_seq=2)["bucket_seq"] == {"$gte": 1, "$lte": 2}
+
+def test_messages_in_range_trims_partial_buckets():
+    buckets = message_buckets.bucket_documents(ObjectId(), messages(25), bucket_size=10)
+    assert contents(message_buckets.messages_in_range(buckets[1:3], 15, 22)) == [f"message {i}" for i in range(15, 22)]
+
+def test_timestamp_window():
+    assert message_buckets.timestamp_window(5, 20, 3, after=True) == (5, 8)
+    assert message_buckets.timestamp_window(19, 20, 3, after=True) == (19, 20)
+    assert message_buckets.timestamp_window(5, 20, 3, after=False) == (2, 5)
+    assert message_buckets.timestamp_window(1, 20, 3, after=False) == (0, 1)
+
+def test_storage_mode_is_validated(monkeypatch):
+    monkeypatch.setenv("MESSAGE_STORAGE_MODE", "sharded")
+    with pytest.raises(ValueError):
+        message_buckets.storage_mode()
+
+# In-memory stand-in for the collections DatabaseService and the migration use
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, option) for option in condition):
+                return False
+            continue
+        value = document.get(key)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$exists" and (key in document) != operand:
+                    return False
+                if op == "$size" and (not isinstance(value, list) or len(value) != operand):
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+class FakeCursor(list):
+    def sort(self, key, direction=1):
+        return FakeCursor(sorted(self, key=lambda doc: doc[key], reverse=direction < 0))
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.calls = []
+
+    def _find(self, query):
+        return [doc for doc in self.documents if matches(doc, query)]
+
+    def insert_one(self, document):
+        document = {"_id": ObjectId(), **copy.deepcopy(document)}
+        self.documents.append(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def insert_many(self, documents):
+        for document in documents:
+            self.insert_one(document)
+
+    def find(self, query, projection=None):
+        return FakeCursor(copy.deepcopy(self._find(query)))
+
+    def find_one(self, query, projection=None):
+        found = self._find(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    def find_one_and_update(self, query, pipeline, projection=None, return_document=None):
+        # Only reserve_messages_update's pipeline: claim indexes, move the tail
+        found = self._find(query)
+        if not found:
+            return None
+        document = found[0]
+        count = pipeline[0]["$set"]["message_count"]["$add"][1]
+        document["message_count"] = document.get("message_count", 0) + count
+        document["tail_bucket_seq"] = message_buckets.tail_bucket_seq(document["message_count"], document["bucket_size"])
+        return copy.deepcopy(document)
+
+    def update_one(self, query, update, upsert=False):
+        found = self._find(query)
+        if not found:
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0)
+            found = [{key: value for key, value in query.items() if not isinstance(value, dict)}]
+            self.documents.append(found[0])
+            for field, value in update.get("$setOnInsert", {}).items():
+                found[0][field] = value
+        document = found[0]
+        for field, value in update.get("$set", {}).items():
+            document[field] = copy.deepcopy(value)
+        for field in update.get("$unset", {}):
+            document.pop(field, None)
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+        for field, value in update.get("$push", {}).items():
+            document.setdefault(field, []).extend(copy.deepcopy(value["$each"]))
+            if "$sort" in value:
+                document[field].sort(key=lambda item: item["index"])
+        return SimpleNamespace(matched_count=1, modified_count=1)
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            if isinstance(operation, ReplaceOne):
+                self.documents = [doc for doc in self.documents if not matches(doc, operation._filter)]
+                self.insert_one(operation._doc)
+            else:
+                self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+    def delete_one(self, query):
+        found = self._find(query)
+        if found:
+            self.documents.remove(found[0])
+        return SimpleNamespace(deleted_count=len(found[:1]))
+
+    def delete_many(self, query):
+        self.calls.append(("delete_many", query))
+        found = self._find(query)
+        self.documents = [doc for doc in self.documents if doc not in found]
+        return SimpleNamespace(deleted_count=len(found))
+
+@pytest.fixture
+def db_service():
+    service = DatabaseService(mongo_uri="mongodb://unused")
+    service.conversations_collection = FakeCollection()
+    service.message_buckets_collection = FakeCollection()
+    service.operation = nullcontext
+    return service
+
+def bucketed_conversation(db_service, count, bucket_size=10):
+    conversation_id = db_service.conversations_collection.insert_one({
+        "user_id": "auth0|user", "title": "Bucketed",
+        **message_buckets.bucketed_conversation_fields(count, bucket_size),
+    }).inserted_id
+    if count:
+        db_service.message_buckets_collection.insert_many(
+            message_buckets.bucket_documents(conversation_id, messages(count), bucket_size)
+        )
+    return conversation_id
+
+def test_append_rolls_over_into_a_new_bucket(db_service, monkeypatch):
+    monkeypatch.setenv("MESSAGE_STORAGE_MODE", "buckets")
+    conversation_id = bucketed_conversation(db_service, 9)
+    new = [Message(f"message {i}", "user") for i in (9, 10, 11)]
+    assert db_service.append_messages(str(conversation_id), new)
+
+    conversation = db_service.conversations_collection.find_one({"_id": conversation_id})
+    assert conversation["message_count"] == 12
+    assert conversation["tail_bucket_seq"] == 1
+    buckets = db_service.message_buckets_collection.find({"conversation_id": conversation_id}).sort("bucket_seq")
+    assert [(b["bucket_seq"], b["count"]) for b in buckets] == [(0, 10), (1, 2)]
+    assert contents(db_service._read_bucket_messages(conversation, 8, 12)) == [f"message {i}" for i in range(8, 12)]
+
+def test_append_to_embedded_conversation_falls_through_from_buckets(db_service, monkeypatch):
+    monkeypatch.setenv("MESSAGE_STORAGE_MODE", "buckets")
+    conversation_id = db_service.conversations_collection.insert_one(
+        {"user_id": "auth0|user", "messages": messages(2), "message_count": 2}
+    ).inserted_id
+    assert db_service.append_messages(str(conversation_id), [Message("message 2", "user")])
+    conversation = db_service.conversations_collection.find_one({"_id": conversation_id})
+    assert conversation["message_count"] == 3
+    assert db_service.message_buckets_collection.documents == []
+
+def test_delete_skips_buckets_for_embedded_conversations(db_service):
+    conversation_id = db_service.conversations_collection.insert_one(
+        {"user_id": "auth0|user", "messages": messages(2), "message_count": 2}
+    ).inserted_id
+    assert db_service.delete_conversation(str(conversation_id))
+    assert db_service.message_buckets_collection.calls == []
+
+def test_delete_removes_buckets_of_bucketed_conversations(db_service):
+    conversation_id = bucketed_conversation(db_service, 25)
+    assert db_service.delete_conversation(str(conversation_id))
+    assert db_service.conversations_collection.documents == []
+    assert db_service.message_buckets_collection.documents == []
+
+def test_delete_of_a_missing_conversation(db_service):
+    assert not db_service.delete_conversation(str(ObjectId()))
+    assert db_service.message_buckets_collection.calls == []
+
+# Migration
+
+def load_migration():
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts", "migrate_message_buckets.py")
+    spec = importlib.util.spec_from_file_location("migrate_message_buckets", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class FakeDatabase(dict):
+    def __getattr__(self, name):
+        return self.setdefault(name, FakeCollection())
+
+    def __getitem__(self, name):
+        return self.setdefault(name, FakeCollection())
+
+def test_migration_moves_messages_into_buckets():
+    migration = load_migration()
+    db = FakeDatabase()
+    conversation_id = db.conversations.insert_one({"user_id": "auth0|user", "messages": messages(25)}).inserted_id
+
+    assert migration.migrate_conversation(db, conversation_id, bucket_size=10, dry_run=False) == 25
+    conversation = db.conversations.find_one({"_id": conversation_id})
+    assert "messages" not in conversation
+    assert message_buckets.is_bucketed(conversation)
+    assert (conversation["message_count"], conversation["tail_bucket_seq"]) == (25, 2)
+    buckets = db[message_buckets.BUCKETS_COLLECTION].find({"conversation_id": conversation_id}).sort("bucket_seq")
+    assert contents(message_buckets.messages_in_range(buckets, 0, 25)) == contents(messages(25))
+
+    # Already bucketed: a rerun skips it
+    assert migration.migrate_conversation(db, conversation_id, bucket_size=10, dry_run=False) is None
+
+def test_migration_dry_run_writes_nothing():
+    migration = load_migration()
+    db = FakeDatabase()
+    conversation_id = db.conversations.insert_one({"user_id": "auth0|user", "messages": messages(3)}).inserted_id
+    assert migration.migrate_conversation(db, conversation_id, bucket_size=10, dry_run=True) == 3
+    assert not message_buckets.is_bucketed(db.conversations.find_one({"_id": conversation_id}))
+    assert db[message_buckets.BUCKETS_COLLECTION].documents == []
+
+def test_migration_retries_when_messages_are_appended_meanwhile():
+    migration = load_migration()
+    db = FakeDatabase()
+    conversation_id = db.conversations.insert_one({"user_id": "auth0|user", "messages": messages(3)}).inserted_id
+    conversations = db.conversations
+    bulk_write = db[message_buckets.BUCKETS_COLLECTION].bulk_write
+    appended = []
+
+    def racing_bulk_write(operations, ordered=True):
+        bulk_write(operations, ordered)
+        if not appended:
+            # A live append lands between the read and the conditional update
+            conversations.documents[0]["messages"].append(messages(1, first=3)[0])
+            appended.append(True)
+
+    db[message_buckets.BUCKETS_COLLECTION].bulk_write = racing_bulk_write
+    assert migration.migrate_conversation(db, conversation_id, bucket_size=10, dry_run=False) == 4
+    buckets = db[message_buckets.BUCKETS_COLLECTION].find({"conversation_id": conversation_id})
+    assert contents(message_buckets.messages_in_range(buckets, 0, 4)) == contents(messages(4))
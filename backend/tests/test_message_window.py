@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.models.conversation import Conversation
+from app.routes.chat import parse_message_cursor
+from app.services import message_buckets
+from app.services.database_service import (
+    decode_conversation_cursor, encode_conversation_cursor, message_window_pipeline
+)
+
+# A minimal evaluator for the aggregation operators message_window_pipeline uses,
+# standing in for MongoDB
+
+def evaluate(expr, doc, variables):
+    if isinstance(expr, str) and expr.startswith("$$"):
+        name, *path = expr[2:].split(".")
+        value = variables[name]
+        for key in path:
+            value = value.get(key)
+        return value
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:])
+    if isinstance(expr, list):
+        return [evaluate(item, doc, variables) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    (op, args), = expr.items()
+    if op == "$filter":
+        items = evaluate(args["input"], doc, variables)
+        return [item for item in items if evaluate(args["cond"], doc, {**variables, args["as"]: item})]
+    values = evaluate(args, doc, variables)
+    if op == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if op == "$cond":
+        return values[1] if values[0] else values[2]
+    if op == "$slice":
+        items, start, count = values
+        return items[start:start + count]
+    return {
+        "$size": lambda: len(values),
+        "$eq": lambda: values[0] == values[1],
+        "$gt": lambda: values[0] > values[1],
+        "$lt": lambda: values[0] < values[1],
+        "$lte": lambda: values[0] <= values[1],
+        "$min": lambda: min(values),
+        "$max": lambda: max(values),
+        "$add": lambda: sum(values),
+        "$subtract": lambda: values[0] - values[1],
+    }[op]()
+
+def aggregate(document, pipeline):
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            if any(document.get(key) != value for key, value in spec.items()):
+                return None
+        elif name == "$addFields":
+            document = {**document, **{field: evaluate(expr, document, {}) for field, expr in spec.items()}}
+        elif name == "$project":
+            projected = {"_id": document["_id"]}
+            for field, expr in spec.items():
+                if expr == 1:
+                    if field in document:
+                        projected[field] = document[field]
+                else:
+                    projected[field] = evaluate(expr, document, {})
+            document = projected
+    return document
+
+START = datetime(2025, 1, 1)
+
+def conversation_document(count, **fields):
+    return {
+        "_id": ObjectId(),
+        "user_id": "auth0|user",
+        "messages": [
+            {"content": f"message {i}", "role": "user", "timestamp": START + timedelta(minutes=i)}
+            for i in range(count)
+        ],
+        **fields,
+    }
+
+def window(document, **kwargs):
+    result = aggregate(document, message_window_pipeline(document["_id"], **kwargs))
+    contents = [int(msg["content"].split()[1]) for msg in result["messages"]]
+    return result, contents
+
+def test_newest_messages_by_default():
+    result, contents = window(conversation_document(10), limit=3)
+    assert contents == [7, 8, 9]
+    assert result["message_offset"] == 7
+    assert result["message_count"] == 10
+
+def test_short_conversation_returns_everything():
+    result, contents = window(conversation_document(2), limit=50)
+    assert contents == [0, 1]
+    assert result["message_offset"] == 0
+
+def test_empty_conversation():
+    result, contents = window(conversation_document(0), limit=5)
+    assert contents == []
+    assert result["message_offset"] == 0
+
+def test_page_before_an_index():
+    result, contents = window(conversation_document(10), limit=3, before=7)
+    assert contents == [4, 5, 6]
+    assert result["message_offset"] == 4
+
+def test_page_before_the_start_is_clamped():
+    _, contents = window(conversation_document(10), limit=5, before=2)
+    assert contents == [0, 1]
+
+def test_page_after_an_index():
+    result, contents = window(conversation_document(10), limit=3, after=2)
+    assert contents == [3, 4, 5]
+    assert result["message_offset"] == 3
+
+def test_page_after_the_end_is_empty():
+    _, contents = window(conversation_document(10), limit=3, after=9)
+    assert contents == []
+
+def test_timestamp_cursors_are_exclusive():
+    document = conversation_document(10)
+    _, before = window(document, limit=2, before=START + timedelta(minutes=5))
+    _, after = window(document, limit=2, after=START + timedelta(minutes=5))
+    assert before == [3, 4]
+    assert after == [6, 7]
+
+def test_since_summary_selects_unsummarized_messages():
+    result, contents = window(conversation_document(10, summarized_count=6), since_summary=True)
+    assert contents == [6, 7, 8, 9]
+    assert result["message_offset"] == 6
+
+def test_since_summary_without_a_summary_selects_everything():
+    _, contents = window(conversation_document(4), since_summary=True)
+    assert contents == [0, 1, 2, 3]
+
+def test_bucketed_conversation_gets_bounds_from_message_count():
+    document = conversation_document(0, message_count=250, bucket_size=100, tail_bucket_seq=2,
+                                     **{message_buckets.STORAGE_FIELD: message_buckets.STORAGE_BUCKETS})
+    del document["messages"]
+    result = aggregate(document, message_window_pipeline(document["_id"], limit=20, before=120))
+    assert (result["message_offset"], result["message_end"]) == (100, 120)
+    assert result["messages"] == []
+
+def test_window_flags_neighbouring_pages():
+    document = conversation_document(10)
+    result, _ = window(document, limit=3, before=7)
+    conversation = Conversation.from_dict(result)
+    assert conversation.has_more_before
+    assert conversation.has_more_after
+    assert conversation.loaded_count() == 3
+
+def test_conversation_cursor_round_trip():
+    updated_at, conversation_id = datetime(2025, 5, 1, 12, 30, 0, 123000), ObjectId()
+    cursor = encode_conversation_cursor(updated_at, conversation_id)
+    assert decode_conversation_cursor(cursor) == (updated_at, conversation_id)
+
+def test_malformed_conversation_cursor():
+    with pytest.raises(ValueError):
+        decode_conversation_cursor("not-a-cursor")
+
+def test_message_cursor_parsing():
+    assert parse_message_cursor(None) is None
+    assert parse_message_cursor("42") == 42
+    # Aware timestamps become naive UTC, like the stored ones
+    assert parse_message_cursor("2025-01-01T02:00:00+02:00") == datetime(2025, 1, 1)
+    assert parse_message_cursor("2025-01-01T00:00:00Z") == datetime(2025, 1, 1)
+    with pytest.raises(ValueError):
+        parse_message_cursor("yesterday")
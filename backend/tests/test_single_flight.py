@@ -0,0 +1,245 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.services.deadline import DeadlineExceeded, deadline_scope
+from app.services.single_flight import RedisSingleFlight, SingleFlight
+
+def start_leader(single_flight, key, release, result="leader result"):
+    """Run a call in a thread that holds `key` until `release` is set"""
+    started = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        return result
+
+    thread = threading.Thread(target=single_flight.do, args=(key, fn))
+    thread.start()
+    started.wait(5)
+    return thread
+
+def test_concurrent_callers_share_one_call():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    leader = start_leader(single_flight, "key", release)
+    results = []
+    followers = [
+        threading.Thread(target=lambda: results.append(single_flight.do("key", lambda: "own call")))
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == ["leader result"] * 3
+    assert single_flight.stats()["leaders"] == 1
+    assert single_flight.stats()["coalesced"] == 3
+    assert single_flight.stats()["in_flight"] == 0
+
+def test_leader_error_reaches_followers():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("upstream failed")
+
+    def run(fn):
+        try:
+            single_flight.do("key", fn)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run, args=(failing,))
+    leader.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=run, args=(lambda: "own call",))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert [str(e) for e in errors] == ["upstream failed"] * 2
+
+def test_nothing_is_remembered_after_the_call():
+    single_flight = SingleFlight()
+    assert single_flight.do("key", lambda: 1) == 1
+    assert single_flight.do("key", lambda: 2) == 2
+
+def test_follower_stops_waiting_at_its_deadline():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    leader = start_leader(single_flight, "key", release)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with deadline_scope(0.1):
+            single_flight.do("key", lambda: "own call")
+    assert time.monotonic() - started < 1
+    release.set()
+    leader.join(5)
+
+def test_async_callers_share_one_call():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(single_flight.do_async("key", fn) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["result"] * 4
+    assert len(calls) == 1
+
+def test_async_follower_stops_waiting_at_its_deadline():
+    single_flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "late"
+
+    async def follower():
+        await asyncio.sleep(0.01)
+        with deadline_scope(0.05):
+            return await single_flight.do_async("key", slow)
+
+    async def main():
+        leader = asyncio.ensure_future(single_flight.do_async("key", slow))
+        with pytest.raises(DeadlineExceeded):
+            await follower()
+        leader.cancel()
+
+    asyncio.run(main())
+
+class FakeRedis:
+    """The subset of the redis client RedisSingleFlight uses"""
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def exists(self, key):
+        return int(key in self.values)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+def redis_single_flight(client, lock_ttl=60.0):
+    # Skip __init__, which connects to a real server
+    single_flight = RedisSingleFlight.__new__(RedisSingleFlight)
+    SingleFlight.__init__(single_flight)
+    single_flight.client = client
+    single_flight.lock_ttl = lock_ttl
+    single_flight.result_ttl = 30.0
+    single_flight.prefix = "test:"
+    single_flight.remote_coalesced = 0
+    return single_flight
+
+def test_redis_leader_publishes_result_and_releases_lock():
+    client = FakeRedis()
+    assert redis_single_flight(client).do("key", lambda: "text") == "text"
+    assert client.get("test:result:key") == b"text"
+    assert client.get("test:lock:key") is None
+
+def test_redis_waits_for_another_workers_result():
+    client = FakeRedis()
+    client.set("test:lock:key", "other-worker")
+    single_flight = redis_single_flight(client)
+    threading.Timer(0.05, lambda: client.set("test:result:key", "theirs")).start()
+    assert single_flight.do("key", lambda: "ours") == "theirs"
+    assert single_flight.stats()["remote_coalesced"] == 1
+
+def test_redis_poll_stops_at_the_deadline():
+    client = FakeRedis()
+    client.set("test:lock:key", "other-worker")
+    single_flight = redis_single_flight(client, lock_ttl=60.0)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with deadline_scope(0.1):
+            single_flight.do("key", lambda: "ours")
+    assert time.monotonic() - started < 1
+
+def test_followers_retry_when_the_leaders_deadline_passes():
+    single_flight = SingleFlight()
+    leader_errors, results = [], []
+
+    def leader_call():
+        time.sleep(0.1)
+        raise TimeoutError("SDK timeout from the leader's budget")
+
+    def lead():
+        try:
+            with deadline_scope(0.05):
+                single_flight.do("key", leader_call)
+        except Exception as e:
+            leader_errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    time.sleep(0.02)
+    follower = threading.Thread(target=lambda: results.append(single_flight.do("key", lambda: "follower call")))
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+
+    assert [type(e) for e in leader_errors] == [TimeoutError]
+    assert results == ["follower call"]
+    assert single_flight.stats()["leaders"] == 2
+
+def test_async_followers_retry_when_the_leader_is_cancelled():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.ensure_future(single_flight.do_async("key", fn))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(single_flight.do_async("key", fn))
+        await asyncio.sleep(0.01)
+        # The leader's client disconnects
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "result"
+    assert len(calls) == 2
+
+def test_async_followers_retry_when_the_leaders_deadline_passes():
+    single_flight = SingleFlight()
+
+    async def leader_fn():
+        await asyncio.sleep(0.02)
+        raise DeadlineExceeded("leader out of time")
+
+    async def follower_fn():
+        return "follower call"
+
+    async def main():
+        leader = asyncio.ensure_future(single_flight.do_async("key", leader_fn))
+        await asyncio.sleep(0.005)
+        result = await single_flight.do_async("key", follower_fn)
+        with pytest.raises(DeadlineExceeded):
+            await leader
+        return result
+
+    assert asyncio.run(main()) == "follower call"
@@ -101,9 +101,21 @@ export class ApiService {
     return response.data;
   }
 
-  // Get user conversations
-  static async getUserConversations(token: string): Promise<any> {
+  // Get a page of user conversations (pass next_cursor from the previous page)
+  static async getUserConversations(token: string, cursor?: string, limit?: number): Promise<any> {
     const response = await apiClient.get('/chat/conversations', {
+      params: { cursor, limit },
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+    return response.data;
+  }
+
+  // Get a conversation with its newest messages; pass before_cursor (or after_cursor as `after`) for neighbouring pages
+  static async getConversation(token: string, conversationId: string, before?: number | string, limit?: number, after?: number | string): Promise<any> {
+    const response = await apiClient.get(`/chat/conversations/${conversationId}`, {
+      params: { before, after, limit },
       headers: {
         Authorization: `Bearer ${token}`,
       },
@@ -109,6 +109,7 @@ const Onboarding: React.FC = () => {
 
   // State for roleplay
   const [roleplayContext, setRoleplayContext] = useState('');
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [conversationHistory, setConversationHistory] = useState<{ role: string; content: string }[]>([]);
   const [userInput, setUserInput] = useState('');
   const [loading, setLoading] = useState(false);
@@ -174,6 +175,7 @@ const Onboarding: React.FC = () => {
 
       if (data.success) {
         setRoleplayContext(data.roleplay_prompt);
+        setSessionId(data.session_id || null);
         setConversationHistory([{ role: 'assistant', content: data.scenario_and_response }]);
         setCurrentStep(totalSteps + 1); // Move to roleplay step
       } else {
@@ -207,10 +209,12 @@ const Onboarding: React.FC = () => {
       const response = await fetch(`${API_BASE_URL}/api/chat/continue_roleplay`, {
         method: 'POST',
         headers,
-        body: JSON.stringify({
-          roleplay_context: roleplayContext,
-          conversation_history: updatedHistory
-        }),
+        // With a server-side session only the new message is sent
+        body: JSON.stringify(
+          sessionId
+            ? { session_id: sessionId, message: userInput }
+            : { roleplay_context: roleplayContext, conversation_history: updatedHistory }
+        ),
       });
 
       if (!response.ok) {
@@ -242,10 +246,11 @@ const Onboarding: React.FC = () => {
       const response = await fetch(`${API_BASE_URL}/api/chat/end_roleplay`, {
         method: 'POST',
         headers,
-        body: JSON.stringify({
-          profile: formData,
-          conversation_history: conversationHistory
-        }),
+        body: JSON.stringify(
+          sessionId
+            ? { session_id: sessionId }
+            : { profile: formData, conversation_history: conversationHistory }
+        ),
       });
 
       if (!response.ok) {
@@ -609,6 +614,7 @@ const Onboarding: React.FC = () => {
             });
             setConversationHistory([]);
             setRoleplayContext('');
+            setSessionId(null);
             setSessionComplete(false);
             setFinalCritique('');
           }}